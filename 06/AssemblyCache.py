@@ -0,0 +1,135 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import hashlib
+import os
+import typing
+from Code import Code
+from SymbolTable import SymbolTable
+
+
+class AssemblyCache:
+    """A local on-disk cache of assembled programs.
+    Entries are keyed by a hash of the source text, the output options and
+    the assembler's instruction and symbol tables, so editing a table
+    invalidates every entry. The cache is bounded in bytes: evict() removes
+    the least recently used entries beyond the bound (every hit refreshes
+    the entry's modification time). Listing the directory is linear in the
+    number of entries, so put() does not evict, and a batch evicts once,
+    when it is done.
+    """
+    VERSION = "1"
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+    TEMP_SUFFIX = ".tmp"
+
+    def __init__(self, cache_dir: str,
+                 max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """Opens (and creates if needed) the cache directory.
+
+        Args:
+            cache_dir (str): the directory holding the entries.
+            max_bytes (int): the maximal total size of the entries.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def tables_fingerprint() -> bytes:
+        """
+        Returns:
+            bytes: a digest of everything, apart from the source, that
+            affects the assembler output.
+        """
+        tables = (AssemblyCache.VERSION, Code.dest_table, Code.comp_table,
+                  Code.jump_table, SymbolTable().symbol_table)
+        return hashlib.sha256(repr(tables).encode()).digest()
+
+    def key(self, source: bytes, options: str) -> str:
+        """
+        Args:
+            source (bytes): the content of the .asm file.
+            options (str): the output options (format, byte order).
+
+        Returns:
+            str: the key of the entry of this source.
+        """
+        digest = hashlib.sha256(self.tables_fingerprint())
+        digest.update(options.encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> typing.Optional[bytes]:
+        """Looks up an entry, refreshing its last use time.
+
+        Args:
+            key (str): the entry key.
+
+        Returns:
+            typing.Optional[bytes]: the cached output, or None.
+        """
+        entry_path = os.path.join(self.cache_dir, key)
+        try:
+            with open(entry_path, 'rb') as entry_file:
+                data = entry_file.read()
+            os.utime(entry_path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Stores an entry. The size bound is enforced by evict().
+
+        Args:
+            key (str): the entry key.
+            data (bytes): the assembled output.
+        """
+        entry_path = os.path.join(self.cache_dir, key)
+        temp_path = f"{entry_path}.{os.getpid()}{self.TEMP_SUFFIX}"
+        with open(temp_path, 'wb') as entry_file:
+            entry_file.write(data)
+        os.replace(temp_path, entry_path)
+
+    def entries(self) -> typing.List[typing.Tuple[float, int, str]]:
+        """
+        Returns:
+            typing.List[typing.Tuple[float, int, str]]: (last use time, size,
+            path) of every entry, least recently used first.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(self.TEMP_SUFFIX):
+                continue
+            try:
+                entry_stat = entry.stat()
+            except OSError:  # evicted meanwhile by another process
+                continue
+            entries.append(
+                (entry_stat.st_mtime, entry_stat.st_size, entry.path))
+        return sorted(entries)
+
+    def size(self) -> int:
+        """
+        Returns:
+            int: the total size of the entries, in bytes.
+        """
+        return sum(entry_size for _, entry_size, _ in self.entries())
+
+    def evict(self) -> None:
+        """Removes least recently used entries until the cache fits in
+        max_bytes.
+        """
+        entries = self.entries()
+        total_size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, entry_path in entries:
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+            total_size -= entry_size
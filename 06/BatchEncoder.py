@@ -0,0 +1,207 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import functools
+import typing
+from Code import Code
+from Parser import Parser
+from PeepholeOptimizer import PeepholeOptimizer
+from RomImage import RomImage
+from SymbolTable import SymbolTable
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, encode() falls back to arrays
+    numpy = None
+
+
+class BatchEncoder:
+    """Assembles a whole program in two stages: the first one classifies
+    every command into parallel arrays of opcode, comp, dest and jump table
+    indices (and the A-command values), and the second one computes all the
+    machine words at once with NumPy bit operations, writing the image with
+    a single tofile() call. Without NumPy the second stage runs on arrays.
+    """
+    A_OPCODE = 0
+    C_OPCODE = 1
+    SHIFT_OPCODE = 2
+    OPCODE_BITS = (0, int(Code.C_CODE, 2), int(Code.SHIFT_CODE, 2))
+    OPCODE_SHIFT = 13
+    COMP_SHIFT = 6
+    DEST_SHIFT = 3
+    INDEX_TYPE_CODE = "B"
+    WORD_TYPE_CODE = "H"
+    WORD_BITS = 16
+    NEW_LINE = ord("\n")
+    ZERO = ord("0")
+
+    comp_mnemonics = list(Code.comp_table)
+    dest_mnemonics = list(Code.dest_table)
+    jump_mnemonics = list(Code.jump_table)
+    comp_codes = [int(code, 2) for code in Code.comp_table.values()]
+    dest_codes = [int(code, 2) for code in Code.dest_table.values()]
+    jump_codes = [int(code, 2) for code in Code.jump_table.values()]
+
+    def __init__(self, input_file: typing.Iterable[str],
+                 optimizer: typing.Optional[PeepholeOptimizer] = None) -> None:
+        """Classifies the whole program (first stage).
+
+        Args:
+            input_file (typing.Iterable[str]): the program to assemble.
+            optimizer (typing.Optional[PeepholeOptimizer]): if given, runs
+                over the parsed program before its labels are resolved.
+        """
+        self.opcodes = array.array(self.INDEX_TYPE_CODE)
+        self.comps = array.array(self.INDEX_TYPE_CODE)
+        self.dests = array.array(self.INDEX_TYPE_CODE)
+        self.jumps = array.array(self.INDEX_TYPE_CODE)
+        self.values = array.array(self.WORD_TYPE_CODE)
+        self.symbol_table = SymbolTable()
+        self.__classify(input_file, optimizer)
+
+    def __classify(self, input_file: typing.Iterable[str],
+                   optimizer: typing.Optional[PeepholeOptimizer]) -> None:
+        """
+        fills the index arrays, resolving symbols as in Main.assemble
+        :param input_file: the program to assemble.
+        :param optimizer: optional peephole optimizer.
+        """
+        parser = Parser(input_file)
+        instructions = parser.instructions()
+        if optimizer is not None:
+            instructions = optimizer.optimize(instructions)
+        opcodes_append, values_append = self.opcodes.append, \
+            self.values.append
+        comps_append, dests_append, jumps_append = self.comps.append, \
+            self.dests.append, self.jumps.append
+
+        for instruction in instructions:
+            c_type = instruction.command_type
+            if c_type == parser.L_COMMAND:
+                self.symbol_table.add_entry(instruction.symbol,
+                                            len(self.opcodes))
+                continue
+            if c_type == parser.A_COMMAND:
+                opcode, comp, dest, jump = self.A_OPCODE, 0, 0, 0
+                values_append(self.symbol_table.a_command(
+                    instruction.symbol, len(self.values)))
+            else:
+                opcode, comp, dest, jump = self.classify_c_command(
+                    instruction.dest, instruction.comp, instruction.jump)
+                values_append(SymbolTable.UNRESOLVED)
+            opcodes_append(opcode)
+            comps_append(comp)
+            dests_append(dest)
+            jumps_append(jump)
+        self.symbol_table.resolve(self.values)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=Code.C_CACHE_SIZE)
+    def classify_c_command(dest: str, comp: str, jump: str) -> \
+            typing.Tuple[int, int, int, int]:
+        """
+        Args:
+            dest (str): the dest mnemonic ("null" if none).
+            comp (str): the comp mnemonic.
+            jump (str): the jump mnemonic ("null" if none).
+
+        Returns:
+            typing.Tuple[int, int, int, int]: the opcode (C_OPCODE or
+            SHIFT_OPCODE) and the comp, dest and jump table indices.
+        """
+        opcode = BatchEncoder.SHIFT_OPCODE if Code.LEFT_SHIFT in comp or \
+            Code.RIGHT_SHIFT in comp else BatchEncoder.C_OPCODE
+        return (opcode,
+                BatchEncoder.__table_index(comp, BatchEncoder.comp_mnemonics),
+                BatchEncoder.__table_index(dest, BatchEncoder.dest_mnemonics),
+                BatchEncoder.jump_mnemonics.index(jump))
+
+    @staticmethod
+    def __table_index(mnemonic: str, mnemonics: typing.List[str]) -> int:
+        if mnemonic not in mnemonics:
+            return mnemonics.index(mnemonic[::-1])  # support reverse
+        return mnemonics.index(mnemonic)
+
+    def encode(self) -> typing.Union[array.array, "numpy.ndarray"]:
+        """Computes all the machine words (second stage).
+
+        Returns:
+            typing.Union[array.array, numpy.ndarray]: the uint16 words of the
+            program, a NumPy array when NumPy is available.
+        """
+        if numpy is None:
+            return self.__encode_arrays()
+        opcodes = numpy.frombuffer(self.opcodes, dtype=numpy.uint8)
+        words = numpy.array(self.OPCODE_BITS, dtype=numpy.uint16)[opcodes]
+        words <<= self.OPCODE_SHIFT
+        words |= numpy.array(self.comp_codes, dtype=numpy.uint16)[
+                     numpy.frombuffer(self.comps, dtype=numpy.uint8)] << \
+            self.COMP_SHIFT
+        words |= numpy.array(self.dest_codes, dtype=numpy.uint16)[
+                     numpy.frombuffer(self.dests, dtype=numpy.uint8)] << \
+            self.DEST_SHIFT
+        words |= numpy.array(self.jump_codes, dtype=numpy.uint16)[
+            numpy.frombuffer(self.jumps, dtype=numpy.uint8)]
+        return numpy.where(opcodes == self.A_OPCODE,
+                           numpy.frombuffer(self.values, dtype=numpy.uint16),
+                           words).astype(numpy.uint16)
+
+    def __encode_arrays(self) -> array.array:
+        """
+        the second stage without NumPy
+        :return: the words of the program
+        """
+        opcode_bits = [bits << self.OPCODE_SHIFT for bits in self.OPCODE_BITS]
+        comp_bits = [code << self.COMP_SHIFT for code in self.comp_codes]
+        dest_bits = [code << self.DEST_SHIFT for code in self.dest_codes]
+        jump_bits = self.jump_codes
+        return array.array(self.WORD_TYPE_CODE, [
+            value if opcode == self.A_OPCODE else
+            opcode_bits[opcode] | comp_bits[comp] | dest_bits[dest] |
+            jump_bits[jump]
+            for opcode, comp, dest, jump, value in zip(
+                self.opcodes, self.comps, self.dests, self.jumps,
+                self.values)])
+
+    def write(self, output_file: typing.BinaryIO,
+              output_format: str = RomImage.TEXT_FORMAT,
+              byteorder: str = RomImage.LITTLE_ENDIAN) -> None:
+        """Writes the encoded program.
+
+        Args:
+            output_file (typing.BinaryIO): the output file, opened in binary
+                mode (with NumPy it must be a real file, for tofile()).
+            output_format (str): "hack" for text, or "binary" for a packed
+                uint16 image.
+            byteorder (str): byte order of the words in a binary image.
+        """
+        words = self.encode()
+        if numpy is None:
+            if output_format == RomImage.TEXT_FORMAT:
+                output_file.write("".join(
+                    f"{word:016b}\n" for word in words).encode())
+            else:
+                RomImage.write(words, output_file, byteorder)
+            return
+
+        if output_format == RomImage.TEXT_FORMAT:
+            # one row per word: 16 ASCII digits and a new line
+            bit_positions = numpy.arange(self.WORD_BITS - 1, -1, -1,
+                                         dtype=numpy.uint16)
+            lines = numpy.empty((len(words), self.WORD_BITS + 1),
+                                dtype=numpy.uint8)
+            lines[:, :self.WORD_BITS] = \
+                (words[:, None] >> bit_positions) & 1
+            lines[:, :self.WORD_BITS] += self.ZERO
+            lines[:, self.WORD_BITS] = self.NEW_LINE
+            lines.tofile(output_file)
+        else:
+            byteorder_char = "<" if byteorder == RomImage.LITTLE_ENDIAN \
+                else ">"
+            words.astype(numpy.dtype(numpy.uint16).newbyteorder(
+                byteorder_char)).tofile(output_file)
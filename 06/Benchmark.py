@@ -0,0 +1,198 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+from Code import Code
+from Instruction import Instruction
+from BatchEncoder import BatchEncoder, numpy
+from PeepholeOptimizer import PeepholeOptimizer
+from Main import assemble_file
+from RomImage import RomImage
+
+SCHEMA_VERSION = 1
+SHIFT_COMPS = [comp for comp in Code.comp_table
+               if Code.LEFT_SHIFT in comp or Code.RIGHT_SHIFT in comp]
+PLAIN_COMPS = [comp for comp in Code.comp_table if comp not in SHIFT_COMPS]
+DESTS = [dest for dest in Code.dest_table if dest != Code.NULL]
+JUMPS = [jump for jump in Code.jump_table if jump != Code.NULL]
+
+# name -> (assemble_file keyword arguments, binary output file)
+MODES = {
+    "two-pass": ({}, False),
+    "single-pass": ({"single_pass": True}, False),
+    "binary": ({"single_pass": True,
+                "output_format": RomImage.BINARY_FORMAT}, True),
+    "vectorized": ({"vectorized": True}, True),
+    "optimized": ({"optimizer": PeepholeOptimizer}, False),
+}
+
+
+def generate_program(output_file: typing.TextIO, lines: int = 100000,
+                     label_density: float = 0.05, variables: int = 100,
+                     shift_ratio: float = 0.05, seed: int = 0) -> None:
+    """Writes a synthetic Hack assembly program.
+
+    Args:
+        output_file (typing.TextIO): the .asm file to write.
+        lines (int): number of commands (labels included).
+        label_density (float): fraction of the commands that are labels.
+        variables (int): number of distinct variables referenced.
+        shift_ratio (float): fraction of the C-commands using the shift
+            extension of Code.comp_table.
+        seed (int): seed of the random generator, for reproducible programs.
+    """
+    rand = random.Random(seed)
+    labels = max(1, int(lines * label_density))
+    defined_labels = 0
+    for line_idx in range(lines):
+        kind = rand.random()
+        if kind < label_density and defined_labels < labels:
+            output_file.write(f"(LABEL_{defined_labels})\n")
+            defined_labels += 1
+        elif kind < 0.5:
+            target = rand.random()
+            if target < 0.3:
+                output_file.write(f"@{rand.randrange(32768)}\n")
+            elif target < 0.6:
+                output_file.write(f"@var_{rand.randrange(max(1, variables))}\n")
+            elif target < 0.8:
+                output_file.write(f"@LABEL_{rand.randrange(labels)}\n")
+            else:
+                output_file.write(f"@R{rand.randrange(16)}\n")
+        else:
+            if rand.random() < shift_ratio:
+                comp = rand.choice(SHIFT_COMPS)
+            else:
+                comp = rand.choice(PLAIN_COMPS)
+            command = comp
+            if rand.random() < 0.8:
+                command = rand.choice(DESTS) + "=" + command
+            if rand.random() < 0.15:
+                command += ";" + rand.choice(JUMPS)
+            if rand.random() < 0.05:
+                command += "  // comment"
+            output_file.write(command + "\n")
+    # labels that were referenced but not reached yet
+    for label_idx in range(defined_labels, labels):
+        output_file.write(f"(LABEL_{label_idx})\n")
+
+
+def clear_caches() -> None:
+    """Empties the instruction caches, so every run starts cold."""
+    Code.c_command.cache_clear()
+    Instruction.split_c_command.cache_clear()
+    BatchEncoder.classify_c_command.cache_clear()
+
+
+def run_mode(mode: str, input_path: str, output_path: str) -> None:
+    """
+    assembles the input once in the given mode
+    :param mode: a key of MODES
+    :param input_path: the .asm file
+    :param output_path: the output file
+    """
+    kwargs, binary_output = MODES[mode]
+    kwargs = dict(kwargs)
+    if "optimizer" in kwargs:
+        kwargs["optimizer"] = kwargs["optimizer"]()
+    with open(input_path, 'r') as input_file, \
+            open(output_path, 'wb' if binary_output else 'w') as output_file:
+        assemble_file(input_file, output_file, **kwargs)
+
+
+def benchmark(input_path: str, modes: typing.Iterable[str],
+              repeat: int = 3) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Times the given modes on one program.
+
+    Args:
+        input_path (str): the .asm file.
+        modes (typing.Iterable[str]): names of MODES to run.
+        repeat (int): timed runs per mode, the best one is reported.
+
+    Returns:
+        typing.List[typing.Dict[str, typing.Any]]: per mode: the best time,
+        the lines per second, and the peak traced Python memory (measured
+        in a separate run, since tracing slows the assembler down).
+    """
+    with open(input_path, 'r') as input_file:
+        lines = sum(1 for _ in input_file)
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, "output")
+        for mode in modes:
+            times = []
+            for _ in range(repeat):
+                clear_caches()
+                start_time = time.perf_counter()
+                run_mode(mode, input_path, output_path)
+                times.append(time.perf_counter() - start_time)
+            clear_caches()
+            tracemalloc.start()
+            run_mode(mode, input_path, output_path)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            best_time = min(times)
+            results.append({"mode": mode, "seconds": best_time,
+                            "lines_per_second": lines / best_time,
+                            "peak_bytes": peak_bytes,
+                            "output_bytes": os.path.getsize(output_path)})
+    return results
+
+
+if "__main__" == __name__:
+    arg_parser = argparse.ArgumentParser(
+        description="Benchmarks the assembler on synthetic programs and "
+                    "prints the results as JSON.")
+    arg_parser.add_argument("--lines", type=int, default=100000)
+    arg_parser.add_argument("--label-density", type=float, default=0.05)
+    arg_parser.add_argument("--variables", type=int, default=100)
+    arg_parser.add_argument("--shift-ratio", type=float, default=0.05)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--modes", default=",".join(MODES),
+                            help="comma separated modes to run")
+    arg_parser.add_argument("--input",
+                            help="benchmark this .asm file instead of a "
+                                 "generated one")
+    arg_parser.add_argument("--output", help="write the JSON here")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as program_dir:
+        program_path = args.input
+        program = {"input": args.input}
+        if program_path is None:
+            program_path = os.path.join(program_dir, "Synthetic.asm")
+            with open(program_path, 'w') as program_file:
+                generate_program(program_file, args.lines,
+                                 args.label_density, args.variables,
+                                 args.shift_ratio, args.seed)
+            program = {"lines": args.lines,
+                       "label_density": args.label_density,
+                       "variables": args.variables,
+                       "shift_ratio": args.shift_ratio, "seed": args.seed}
+        program["bytes"] = os.path.getsize(program_path)
+        report = {"schema": SCHEMA_VERSION,
+                  "python": platform.python_version(),
+                  "numpy": numpy is not None,
+                  "program": program,
+                  "results": benchmark(program_path, args.modes.split(","),
+                                       args.repeat)}
+    report_text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report_text + "\n")
+    else:
+        sys.stdout.write(report_text + "\n")
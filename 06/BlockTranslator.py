@@ -0,0 +1,249 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import time
+import typing
+from HackEmulator import HackEmulator
+
+
+class BlockTranslator(HackEmulator):
+    """A HackEmulator that translates the basic blocks of the ROM into
+    Python functions and runs those instead of single instructions.
+
+    A block starts at the address the execution reaches and runs up to and
+    including the first command that may jump (or MAX_BLOCK_SIZE commands).
+    It becomes a function of (ram, a, d) that returns the new (a, d, pc):
+    A and D are locals, A-commands are folded into the following commands,
+    so "@17 D=M" reads ram[17] directly, and comps are inlined as Python
+    expressions. Blocks are translated on first use and cached by their
+    entry address, and load() drops the cache with the old ROM.
+
+    The number of times every block ran is kept, see hits and report().
+    """
+    MAX_BLOCK_SIZE = 256
+    # comps whose value is already a 16-bit word and needs no mask
+    UNMASKED_COMPS = {"0", "1", "D", "A", "M"}
+    # jump bits -> the condition on the unsigned result "o"
+    jump_conditions = {1: "0 < o < 32768", 2: "o == 0", 3: "o < 32768",
+                       4: "o >= 32768", 5: "o != 0",
+                       6: "o == 0 or o >= 32768"}
+
+    def load(self, words: typing.Iterable[int]) -> None:
+        """Loads a program into the ROM and drops the translated blocks.
+
+        Args:
+            words (typing.Iterable[int]): the ROM words, from address 0.
+        """
+        super().load(words)
+        # entry address -> (function, number of commands, ends in a halt loop)
+        self.blocks = [None] * self.ROM_SIZE
+        # entry address -> number of times the block ran
+        self.hits = [0] * self.ROM_SIZE
+        self.translated = 0
+
+    def run(self, max_cycles: int, stop_at_halt: bool = True) -> int:
+        """Executes instructions, a block at a time. A block that is longer
+        than the remaining cycles, or ends in a halt loop, runs in single
+        steps.
+
+        Args:
+            max_cycles (int): the most instructions to execute.
+            stop_at_halt (bool): if True, stops when the program enters a
+                halt loop, "(LOOP) @LOOP 0;JMP", and sets halted.
+
+        Returns:
+            int: the number of instructions executed.
+        """
+        blocks = self.blocks
+        hits = self.hits
+        ram = self.ram
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+        while executed < max_cycles:
+            block = blocks[pc]
+            if block is None:
+                block = blocks[pc] = self.__translate(pc)
+            function, size, halt = block
+            if executed + size > max_cycles or halt and stop_at_halt:
+                # single steps detect the halt loop like HackEmulator does
+                self.a, self.d, self.pc = a, d, pc
+                steps = super().run(min(size, max_cycles - executed),
+                                    stop_at_halt)
+                # counted in cycles with the rest, below
+                self.cycles -= steps
+                executed += steps
+                a, d, pc = self.a, self.d, self.pc
+                if self.halted:
+                    break
+                continue
+            hits[pc] += 1
+            a, d, pc = function(ram, a, d)
+            executed += size
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+    def __translate(self, entry: int) -> typing.Tuple[
+            typing.Callable[[typing.List[int], int, int],
+                            typing.Tuple[int, int, int]], int, bool]:
+        """
+        translates the block that starts at an address
+        :param entry: the entry address
+        :return: the function of the block, its number of commands, and True
+            if it ends in a halt loop
+        """
+        words = self.words
+        namespace = {}
+        lines = []
+        # the value of A when it is known at translation time
+        a_known = None
+        address = entry
+        exit_pc = None
+        while exit_pc is None:
+            word = words[address] if address < len(words) else 0
+            address += 1
+            if not word & self.SIGN_BIT:
+                a_known = word
+            else:
+                a_known, exit_pc = self.__translate_c_command(
+                    word, a_known, address, lines, namespace)
+            if exit_pc is None and (address - entry >= self.MAX_BLOCK_SIZE
+                                    or address == self.ROM_SIZE):
+                exit_pc = str(address % self.ROM_SIZE)
+        size = address - entry
+        a_value = "a" if a_known is None else str(a_known)
+        lines.append(f"return {a_value}, d, {exit_pc}")
+        source = "def block(ram, a, d):\n" + "".join(
+            f"    {line}\n" for line in lines)
+        exec(compile(source, f"<block {entry}>", "exec"), namespace)
+        last = self.program[address - 1]
+        halt = last.__class__ is tuple and last[4]
+        self.translated += 1
+        return namespace["block"], size, halt
+
+    def __translate_c_command(
+            self, word: int, a_known: typing.Optional[int], address: int,
+            lines: typing.List[str],
+            namespace: typing.Dict[str, typing.Any]) \
+            -> typing.Tuple[typing.Optional[int], typing.Optional[str]]:
+        """
+        translates a C-command into Python statements
+        :param word: the command
+        :param a_known: the value of A, if known at translation time
+        :param address: the address after the command
+        :param lines: the statements of the block, appended to
+        :param namespace: the globals of the block, for ALU functions that
+            have no mnemonic
+        :return: the value of A after the command if it is known, and the
+            expression of the next PC if the command may jump
+        """
+        compute, reads_m, dest, jump, halt = self.decode(word)
+        if a_known is None:
+            a_value, m_address = "a", "a & 32767"
+        else:
+            a_value = str(a_known)
+            m_address = str(a_known & self.ADDRESS_MASK)
+        y = f"ram[{m_address}]" if reads_m else a_value
+        expression = self.__comp_expression(word, y, compute, namespace)
+        targets = []
+        if dest & 1:
+            targets.append(f"ram[{m_address}]")
+        if dest & 2:
+            targets.append("d")
+        jump_target = a_value if a_known is None else \
+            str(a_known & self.ADDRESS_MASK)
+        if dest & 4:
+            if jump and a_known is None:
+                lines.append("t = a")
+                jump_target = "t"
+            targets.append("a")
+            a_known = None
+        if jump_target in {"a", "t"}:
+            jump_target += " & 32767"
+        if not jump:
+            if len(targets) == 1:
+                lines.append(f"{targets[0]} = {expression}")
+            elif targets:
+                lines.append(f"o = {expression}")
+                lines.extend(f"{target} = o" for target in targets)
+            return a_known, None
+        a_value = "a" if a_known is None else str(a_known)
+        if jump == self.JUMP_ALWAYS:
+            if targets:
+                lines.append(f"o = {expression}")
+                lines.extend(f"{target} = o" for target in targets)
+            return a_known, jump_target
+        lines.append(f"o = {expression}")
+        lines.extend(f"{target} = o" for target in targets)
+        lines.append(f"if {self.jump_conditions[jump]}:")
+        lines.append(f"    return {a_value}, d, {jump_target}")
+        return a_known, str(address % self.ROM_SIZE)
+
+    def __comp_expression(self, word: int, y: str,
+                          compute: typing.Callable[[int, int], int],
+                          namespace: typing.Dict[str, typing.Any]) -> str:
+        """
+        :param word: a C-command
+        :param y: the expression of its y input, A or M
+        :param compute: its comp function, used when it has no mnemonic
+        :param namespace: the globals of the block
+        :return: the Python expression of its comp, of d and y
+        """
+        if not word & self.ALU_BIT:
+            value = "d" if word & self.SHIFT_X_BIT else f"({y})"
+            if word & self.SHIFT_LEFT_BIT:
+                return f"({value} << 1) & 65535"
+            return f"({value} >> 1) | ({value} & 32768)"
+        comp_bits = (word >> self.COMP_SHIFT) & self.COMP_MASK
+        mnemonic = self.alu_mnemonics.get(comp_bits)
+        if mnemonic is None:
+            name = f"alu_{comp_bits}"
+            namespace[name] = compute
+            return f"{name}(d, {y})"
+        expression = mnemonic.replace("D", "d").replace("!", "~")
+        for register in ("A", "M"):
+            expression = expression.replace(register, f"({y})")
+        if mnemonic in self.UNMASKED_COMPS:
+            return expression
+        return f"({expression}) & 65535"
+
+    def report(self, limit: int = 10) -> str:
+        """
+        Args:
+            limit (int): the number of blocks to list.
+
+        Returns:
+            str: the number of translated blocks, and the most run ones.
+        """
+        ranked = sorted((hits, entry) for entry, hits in enumerate(self.hits)
+                        if hits)[::-1][:limit]
+        return f"{self.translated} blocks translated" + "".join(
+            f"\n  {entry:5d}: {hits} runs of {self.blocks[entry][1]} "
+            f"commands" for hits, entry in ranked)
+
+
+if "__main__" == __name__:
+    arg_parser = argparse.ArgumentParser(
+        prog="BlockTranslator",
+        description="Runs a Hack program, translating its basic blocks to "
+                    "Python.")
+    arg_parser.add_argument("path", help="a .hack, .asm or binary image file")
+    arg_parser.add_argument("--cycles", type=int, default=10000000,
+                            help="the most instructions to run")
+    arg_parser.add_argument("--blocks", type=int, default=10,
+                            help="the number of most run blocks to list")
+    args = arg_parser.parse_args()
+    translator = BlockTranslator()
+    translator.load_file(args.path)
+    start_time = time.perf_counter()
+    executed = translator.run(args.cycles)
+    seconds = time.perf_counter() - start_time
+    print(f"{executed} instructions in {seconds:.3f}s "
+          f"({executed / max(seconds, 1e-9):,.0f} per second)"
+          f"{', halted' if translator.halted else ''}")
+    print(translator.report(args.blocks))
@@ -5,13 +5,20 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
-
+import functools
 from typing import Dict
 
 
 class Code:
     """Translates Hack assembly language mnemonics into binary codes."""
 
+    NULL = "null"
+    LEFT_SHIFT = "<<"
+    RIGHT_SHIFT = ">>"
+    SHIFT_CODE = "101"
+    C_CODE = "111"
+    C_CACHE_SIZE = 4096
+
     dest_table = {"null": "000", "M": "001", "D": "010", "DM": "011",
                   "A": "100", "AM": "101", "AD": "110", "AMD": "111",
                   "ADM": "111", "MAD": "111"}
@@ -65,6 +72,36 @@ class Code:
         """
         return Code.jump_table[mnemonic]
 
+    @staticmethod
+    @functools.lru_cache(maxsize=C_CACHE_SIZE)
+    def c_command(dest: str, comp: str, jump: str) -> int:
+        """Encodes a whole C-command. Programs reuse a small set of distinct
+        C-commands, so the results are kept in a bounded LRU cache (see
+        cache_info()).
+
+        Args:
+            dest (str): the dest mnemonic ("null" if none).
+            comp (str): the comp mnemonic.
+            jump (str): the jump mnemonic ("null" if none), e.g. the fields
+                of an Instruction record.
+
+        Returns:
+            int: the 16-bit code of the command.
+        """
+        full_command = Code.comp(comp) + Code.dest(dest) + Code.jump(jump)
+        if Code.LEFT_SHIFT in comp or Code.RIGHT_SHIFT in comp:
+            return int(Code.SHIFT_CODE + full_command, 2)
+        return int(Code.C_CODE + full_command, 2)
+
+    @staticmethod
+    def cache_info() -> functools._CacheInfo:
+        """
+        Returns:
+            functools._CacheInfo: hits, misses, maxsize and current size of
+            the C-command cache.
+        """
+        return Code.c_command.cache_info()
+
     @staticmethod
     def __fetch_from_table(mnemonic: str, table: Dict[str, str]) -> str:
         if mnemonic not in table:
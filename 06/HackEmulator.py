@@ -0,0 +1,301 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import time
+import typing
+from Code import Code
+from RomImage import RomImage
+
+
+class HackEmulator:
+    """Runs Hack machine code, including the shift extension of the CPU
+    (05/CpuMul.hdl with 05/ExtendAlu.hdl).
+
+    Every ROM word is decoded once, when the program is loaded, into an
+    entry of a dispatch table indexed by address: an A-command becomes its
+    value, and a C-command becomes a tuple of the function that computes
+    its comp, whether it reads M, its dest bits, its jump bits, and whether
+    it is a halt loop. The run loop only indexes the table.
+
+    A C-command is an ALU command when its bit 14 is set (as in the "111"
+    prefix), and a shift otherwise (as in the "101" prefix of
+    Code.SHIFT_CODE): CpuMul wires bits 15 and 14 into the selector of the
+    output multiplexer of ExtendAlu, and bit 13 is not read. A shift
+    moves x (D) if bit 10 is set and y (A or M) otherwise, to the left if
+    bit 11 is set and otherwise to the right, keeping the sign bit.
+
+    The RAM holds unsigned 16-bit values, and M is RAM[A & 0x7FFF].
+    """
+    ROM_SIZE = 32768
+    RAM_SIZE = 32768
+    SCREEN = 16384
+    KBD = 24576
+    WORD_MASK = 0xFFFF
+    ADDRESS_MASK = 0x7FFF
+    SIGN_BIT = 0x8000
+    ALU_BIT = 0x4000
+    A_BIT = 0x1000
+    SHIFT_LEFT_BIT = 0x800
+    SHIFT_X_BIT = 0x400
+    COMP_SHIFT = 6
+    COMP_MASK = 0x3F
+    DEST_SHIFT = 3
+    DEST_MASK = 0x7
+    JUMP_MASK = 0x7
+    JUMP_ALWAYS = 7
+    HACK_EXTENSION = ".hack"
+    ASM_EXTENSION = ".asm"
+    # comp bits -> ALU mnemonic of Code.comp_table
+    alu_mnemonics = {int(code[1:], 2): mnemonic
+                     for mnemonic, code in Code.comp_table.items()
+                     if Code.LEFT_SHIFT not in mnemonic and
+                     Code.RIGHT_SHIFT not in mnemonic}
+    # comp bits -> the function of x (D) and y (A or M), built on first use
+    alu_functions = {}
+    # (left, shifts x) -> the function of x (D) and y (A or M)
+    shift_functions = {
+        (True, True): lambda x, y: (x << 1) & 0xFFFF,
+        (True, False): lambda x, y: (y << 1) & 0xFFFF,
+        (False, True): lambda x, y: (x >> 1) | (x & 0x8000),
+        (False, False): lambda x, y: (y >> 1) | (y & 0x8000)}
+
+    def __init__(self, words: typing.Iterable[int] = ()) -> None:
+        """Creates a computer with the given program in its ROM and a
+        cleared RAM.
+
+        Args:
+            words (typing.Iterable[int]): the ROM words, from address 0.
+        """
+        self.ram = [0] * self.RAM_SIZE
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        # instructions executed since the program was loaded
+        self.cycles = 0
+        self.halted = False
+        self.words = []
+        self.program = []
+        self.load(words)
+
+    def load(self, words: typing.Iterable[int]) -> None:
+        """Loads a program into the ROM, decoding every word, and resets the
+        CPU. The RAM is kept.
+
+        Args:
+            words (typing.Iterable[int]): the ROM words, from address 0.
+        """
+        words = list(words)
+        if len(words) > self.ROM_SIZE:
+            raise ValueError(f"program of {len(words)} words does not fit in "
+                             f"the ROM")
+        decoded = {}
+        program = []
+        for address, word in enumerate(words):
+            if not word & self.SIGN_BIT:
+                program.append(word)
+                continue
+            entry = decoded.get(word)
+            if entry is None:
+                entry = decoded[word] = self.decode(word)
+            if entry[3] == self.JUMP_ALWAYS and not entry[2] and \
+                    address > 0 and words[address - 1] == address - 1:
+                # "(LOOP) @LOOP 0;JMP": nothing changes once it is entered
+                entry = entry[:4] + (True,)
+            program.append(entry)
+        # the rest of the ROM is zeros, which are "@0" commands
+        program.extend([0] * (self.ROM_SIZE - len(program)))
+        self.program = program
+        self.words = words
+        self.cycles = 0
+        self.reset()
+
+    def load_file(self, path: str) -> None:
+        """Loads a .hack text image, an .asm program (assembled first), or a
+        packed binary image (any other extension).
+
+        Args:
+            path (str): the program file.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension == self.HACK_EXTENSION:
+            with open(path, 'r') as rom_file:
+                self.load(int(line, 2) for line in rom_file if line.strip())
+        elif extension == self.ASM_EXTENSION:
+            from Main import assemble
+            with open(path, 'r') as input_file:
+                self.load(assemble(input_file)[0])
+        else:
+            self.load(RomImage.load(path))
+
+    def reset(self) -> None:
+        """Sets the PC to 0, as the reset input of the CPU does."""
+        self.pc = 0
+        self.halted = False
+
+    @classmethod
+    def decode(cls, word: int) -> typing.Tuple[
+            typing.Callable[[int, int], int], bool, int, int, bool]:
+        """Decodes a C-command.
+
+        Args:
+            word (int): the machine word.
+
+        Returns:
+            typing.Tuple[typing.Callable[[int, int], int], bool, int, int,
+            bool]: the comp function of x (D) and y (A or M), True if y is
+            M, the dest bits, the jump bits, and False (set by load() for a
+            halt loop).
+        """
+        if word & cls.ALU_BIT:
+            comp_bits = (word >> cls.COMP_SHIFT) & cls.COMP_MASK
+            compute = cls.alu_functions.get(comp_bits)
+            if compute is None:
+                compute = cls.alu_functions[comp_bits] = \
+                    cls.__alu_function(comp_bits)
+        else:
+            compute = cls.shift_functions[
+                bool(word & cls.SHIFT_LEFT_BIT),
+                bool(word & cls.SHIFT_X_BIT)]
+        return (compute, bool(word & cls.A_BIT),
+                (word >> cls.DEST_SHIFT) & cls.DEST_MASK,
+                word & cls.JUMP_MASK, False)
+
+    @staticmethod
+    def __alu_function(comp_bits: int) -> typing.Callable[[int, int], int]:
+        """
+        returns the ALU function of comp bits: the expression of the
+        mnemonic, or the ALU itself for bits no mnemonic uses
+        :param comp_bits: zx, nx, zy, ny, f, no, from the high bit down
+        :return: the function of x and y
+        """
+        mnemonic = HackEmulator.alu_mnemonics.get(comp_bits)
+        if mnemonic is not None:
+            expression = mnemonic.replace("D", "x").replace("A", "y") \
+                .replace("M", "y").replace("!", "~")
+            return eval(f"lambda x, y: ({expression}) & "
+                        f"{HackEmulator.WORD_MASK}")
+        zx, nx, zy, ny, f, no = (bool(comp_bits & (1 << bit))
+                                 for bit in range(5, -1, -1))
+        mask = HackEmulator.WORD_MASK
+
+        def compute(x: int, y: int) -> int:
+            if zx:
+                x = 0
+            if nx:
+                x ^= mask
+            if zy:
+                y = 0
+            if ny:
+                y ^= mask
+            out = (x + y) & mask if f else x & y
+            return out ^ mask if no else out
+        return compute
+
+    def run(self, max_cycles: int, stop_at_halt: bool = True) -> int:
+        """Executes instructions.
+
+        Args:
+            max_cycles (int): the most instructions to execute.
+            stop_at_halt (bool): if True, stops when the program enters a
+                halt loop, "(LOOP) @LOOP 0;JMP", and sets halted.
+
+        Returns:
+            int: the number of instructions executed.
+        """
+        program = self.program
+        ram = self.ram
+        a, d, pc = self.a, self.d, self.pc
+        address_mask = self.ADDRESS_MASK
+        sign_bit = self.SIGN_BIT
+        rom_size = self.ROM_SIZE
+        executed = 0
+        while executed < max_cycles:
+            entry = program[pc]
+            executed += 1
+            if entry.__class__ is int:
+                a = entry
+                pc += 1
+                if pc == rom_size:
+                    pc = 0
+                continue
+            compute, reads_m, dest, jump, halt = entry
+            out = compute(d, ram[a & address_mask] if reads_m else a)
+            target = a
+            if dest:
+                if dest & 1:
+                    ram[a & address_mask] = out
+                if dest & 2:
+                    d = out
+                if dest & 4:
+                    a = out
+            if jump and jump & (4 if out & sign_bit else
+                                2 if not out else 1):
+                if halt and target == pc - 1 and stop_at_halt:
+                    self.halted = True
+                    break
+                pc = target & address_mask
+            else:
+                pc += 1
+                if pc == rom_size:
+                    pc = 0
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+    def step(self) -> None:
+        """Executes a single instruction."""
+        self.run(1, stop_at_halt=False)
+
+    def read(self, address: int) -> int:
+        """
+        Args:
+            address (int): a RAM address.
+
+        Returns:
+            int: the signed value of RAM[address].
+        """
+        value = self.ram[address]
+        return value - ((value & self.SIGN_BIT) << 1)
+
+    def write(self, address: int, value: int) -> None:
+        """
+        Args:
+            address (int): a RAM address.
+            value (int): a signed or unsigned 16-bit value.
+        """
+        self.ram[address] = value & self.WORD_MASK
+
+
+if "__main__" == __name__:
+    arg_parser = argparse.ArgumentParser(
+        prog="HackEmulator", description="Runs a Hack program.")
+    arg_parser.add_argument("path", help="a .hack, .asm or binary image file")
+    arg_parser.add_argument("--cycles", type=int, default=10000000,
+                            help="the most instructions to run")
+    arg_parser.add_argument(
+        "--set", action="append", default=[], metavar="ADDRESS=VALUE",
+        help="set a RAM value before running")
+    arg_parser.add_argument(
+        "--print", action="append", default=[], type=int, metavar="ADDRESS",
+        help="print a RAM value after running")
+    args = arg_parser.parse_args()
+    emulator = HackEmulator()
+    emulator.load_file(args.path)
+    for assignment in args.set:
+        address, value = assignment.split("=")
+        emulator.write(int(address), int(value))
+    start_time = time.perf_counter()
+    executed = emulator.run(args.cycles)
+    seconds = time.perf_counter() - start_time
+    print(f"{executed} instructions in {seconds:.3f}s "
+          f"({executed / max(seconds, 1e-9):,.0f} per second)"
+          f"{', halted' if emulator.halted else ''}")
+    print(f"A={emulator.a} D={emulator.d} PC={emulator.pc}")
+    for address in args.print:
+        print(f"RAM[{address}]={emulator.read(address)}")
@@ -0,0 +1,114 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import functools
+import typing
+
+
+class Instruction:
+    """A parsed assembly command. The Parser builds one record per command,
+    once, and every later stage (label scan, encoding, optimization) reads
+    its fields instead of splitting the command text again.
+    """
+    __slots__ = ("command_type", "text", "symbol", "dest", "comp", "jump",
+                 "address", "line_number")
+    A_COMMAND = "A_COMMAND"
+    C_COMMAND = "C_COMMAND"
+    L_COMMAND = "L_COMMAND"
+    NULL = "null"
+    EMPTY = ""
+    NOT_FOUND = -1
+    COMMENT = "//"
+    C_CACHE_SIZE = 4096
+
+    def __init__(self, command_type: str, text: str, symbol: str, dest: str,
+                 comp: str, jump: str, address: int,
+                 line_number: int) -> None:
+        """Creates a new instruction record.
+
+        Args:
+            command_type (str): "A_COMMAND", "C_COMMAND" or "L_COMMAND".
+            text (str): the command, without white space and comments.
+            symbol (str): the symbol or decimal of an A_COMMAND or
+                L_COMMAND, empty otherwise.
+            dest (str): the dest mnemonic of a C_COMMAND ("null" if none).
+            comp (str): the comp mnemonic of a C_COMMAND.
+            jump (str): the jump mnemonic of a C_COMMAND ("null" if none).
+            address (int): the ROM address of the command; for an L_COMMAND,
+                the address of the command that follows it.
+            line_number (int): the (1-based) line of the command in the input.
+        """
+        self.command_type = command_type
+        self.text = text
+        self.symbol = symbol
+        self.dest = dest
+        self.comp = comp
+        self.jump = jump
+        self.address = address
+        self.line_number = line_number
+
+    @staticmethod
+    def clean(line: str) -> str:
+        """
+        Args:
+            line (str): a line of assembly code.
+
+        Returns:
+            str: the command on the line, without white space and comments
+            (empty if there is none).
+        """
+        comment_idx = line.find(Instruction.COMMENT)
+        if comment_idx != Instruction.NOT_FOUND:
+            line = line[:comment_idx]
+        return Instruction.EMPTY.join(line.split())
+
+    @classmethod
+    def parse(cls, text: str, address: int,
+              line_number: int) -> "Instruction":
+        """Parses a command into a record.
+
+        Args:
+            text (str): the command, without white space and comments.
+            address (int): the ROM address of the command; for a label, the
+                address of the command that follows it.
+            line_number (int): the (1-based) line of the command in the
+                input.
+
+        Returns:
+            Instruction: the record of the command.
+        """
+        first_char = text[0]
+        if first_char == "(":
+            return cls(cls.L_COMMAND, text, text[1:-1], cls.EMPTY, cls.EMPTY,
+                       cls.EMPTY, address, line_number)
+        if first_char == "@":
+            return cls(cls.A_COMMAND, text, text[1:], cls.EMPTY, cls.EMPTY,
+                       cls.EMPTY, address, line_number)
+        dest, comp, jump = cls.split_c_command(text)
+        return cls(cls.C_COMMAND, text, cls.EMPTY, dest, comp, jump, address,
+                   line_number)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=C_CACHE_SIZE)
+    def split_c_command(text: str) -> typing.Tuple[str, str, str]:
+        """
+        Args:
+            text (str): a dest=comp;jump command, without white space and
+            comments.
+
+        Returns:
+            typing.Tuple[str, str, str]: the dest, comp and jump mnemonics of
+            the command ("null" for a missing dest or jump).
+        """
+        dest_idx = text.find("=")
+        dest = Instruction.NULL if dest_idx == Instruction.NOT_FOUND else \
+            text[0:dest_idx]
+        comp, _, jump = text[dest_idx + 1:].partition(";")
+        return dest, comp, jump or Instruction.NULL
+
+    def __repr__(self) -> str:
+        return f"Instruction({self.text!r}, line {self.line_number})"
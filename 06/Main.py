@@ -5,46 +5,223 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import array
+import concurrent.futures
+import functools
+import io
 import os
 import sys
+import time
 import typing
 from SymbolTable import SymbolTable
 from Parser import Parser
 from Code import Code
+from RomImage import RomImage
+from AssemblyCache import AssemblyCache
+from BatchEncoder import BatchEncoder
+from PeepholeOptimizer import PeepholeOptimizer
 
-INITIAL_ADDRESS = 16
-ZERO_FILL = 15
-NOT_FOUND = -1
-LEFT_SHIFT = "<<"
-RIGHT_SHIFT = ">>"
-SHIFT_CODE = "101"
-C_CODE = "111"
-A_CODE = "0"
+SOURCE_MAP_TYPE_CODE = "L"
+TEXT_EXTENSION = ".hack"
+INPUT_EXTENSION = ".asm"
+STATUS_OK = "ok"
+STATUS_CACHED = "cached"
+STATUS_ERROR = "error"
+WORD_FORMAT = "{:016b}\n"
 
 
 def assemble_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+        input_file: typing.TextIO, output_file: typing.IO,
+        single_pass: bool = False, output_format: str = RomImage.TEXT_FORMAT,
+        byteorder: str = RomImage.LITTLE_ENDIAN,
+        vectorized: bool = False,
+        optimizer: typing.Optional[PeepholeOptimizer] = None) -> None:
     """Assembles a single file.
 
     Args:
         input_file (typing.TextIO): the file to assemble.
-        output_file (typing.TextIO): writes all output to this file.
+        output_file (typing.IO): writes all output to this file. Must be
+            opened in binary mode when output_format is "binary" or
+            vectorized is True.
+        single_pass (bool): if this is True, the input is read only once and
+            forward references to labels are backpatched at the end.
+        output_format (str): "hack" for the text format, one 16 characters
+            line per word, or "binary" for a packed uint16 image.
+        byteorder (str): byte order of the words in a binary image.
+        vectorized (bool): if this is True, the whole program is classified
+            first and then encoded and written at once by BatchEncoder.
+        optimizer (typing.Optional[PeepholeOptimizer]): if given, runs over
+            the parsed program before its labels are resolved (this implies
+            the single pass assembly).
+    """
+    if vectorized:
+        BatchEncoder(input_file, optimizer).write(output_file, output_format,
+                                                  byteorder)
+        return
+
+    if single_pass or optimizer is not None:
+        words, _, _ = assemble(input_file, optimizer)
+    else:
+        words = assemble_two_pass(input_file)
+
+    if output_format == RomImage.BINARY_FORMAT:
+        RomImage.write(words, output_file, byteorder)
+    else:
+        output_file.writelines(WORD_FORMAT.format(word) for word in words)
+
+
+def assemble_path(
+        input_path: str, single_pass: bool = False,
+        output_format: str = RomImage.TEXT_FORMAT,
+        byteorder: str = RomImage.LITTLE_ENDIAN,
+        cache_dir: typing.Optional[str] = None,
+        vectorized: bool = False,
+        optimize_rules: typing.Optional[typing.Sequence[str]] = None) -> \
+        typing.Tuple[str, str, float, int, int]:
+    """Assembles a single .asm file into the file next to it (.hack, or .bin
+    for a binary image). Errors are reported in the returned status instead
+    of being raised, so one bad file does not stop a batch.
+
+    Args:
+        input_path (str): path of the .asm file.
+        single_pass (bool): see assemble_file.
+        output_format (str): see assemble_file.
+        byteorder (str): see assemble_file.
+        cache_dir (typing.Optional[str]): if given, an AssemblyCache
+            directory: unchanged sources are restored from it without being
+            parsed, and new outputs are added to it (assemble_paths keeps
+            it within its size bound).
+        vectorized (bool): see assemble_file.
+        optimize_rules (typing.Optional[typing.Sequence[str]]): if given,
+            the PeepholeOptimizer rules to apply.
+
+    Returns:
+        typing.Tuple[str, str, float, int, int]: the input path, its status
+        ("ok", followed by the optimizer report when optimizing, "cached"
+        when restored from the cache, or "error: " and the reason), the time
+        it took in seconds, and the hits and misses of the C-command cache
+        while assembling it (counted in the process that assembled it, so
+        they can be summed over worker processes).
+    """
+    start_time = time.perf_counter()
+    cache_info = Code.cache_info()
+    filename, extension = os.path.splitext(input_path)
+    if output_format == RomImage.BINARY_FORMAT:
+        output_path, output_mode = filename + RomImage.EXTENSION, 'wb'
+    else:
+        output_path, output_mode = filename + TEXT_EXTENSION, 'w'
+    if vectorized:
+        output_mode = 'wb'
+    try:
+        cache, cache_key = None, None
+        if cache_dir is not None:
+            cache = AssemblyCache(cache_dir)
+            # the byte order only matters to binary images
+            options = f"{output_format},{optimize_rules}"
+            if output_format == RomImage.BINARY_FORMAT:
+                options += f",{byteorder}"
+            with open(input_path, 'rb') as input_file:
+                cache_key = cache.key(input_file.read(), options)
+            cached_output = cache.get(cache_key)
+            if cached_output is not None:
+                with open(output_path, 'wb') as output_file:
+                    output_file.write(cached_output)
+                return input_path, STATUS_CACHED, \
+                    time.perf_counter() - start_time, 0, 0
+
+        optimizer = None
+        if optimize_rules is not None:
+            optimizer = PeepholeOptimizer(optimize_rules)
+        with open(input_path, 'r') as input_file, \
+                open(output_path, output_mode) as output_file:
+            assemble_file(input_file, output_file, single_pass,
+                          output_format, byteorder, vectorized, optimizer)
+        if cache is not None:
+            with open(output_path, 'rb') as output_file:
+                cache.put(cache_key, output_file.read())
+        status = STATUS_OK
+        if optimizer is not None:
+            status += f" ({optimizer.report()})"
+    except Exception as error:
+        status = f"{STATUS_ERROR}: {type(error).__name__}: {error}"
+    new_cache_info = Code.cache_info()
+    return input_path, status, time.perf_counter() - start_time, \
+        new_cache_info.hits - cache_info.hits, \
+        new_cache_info.misses - cache_info.misses
+
+
+def assemble_paths(
+        input_paths: typing.Iterable[str], jobs: int = 1,
+        single_pass: bool = False, output_format: str = RomImage.TEXT_FORMAT,
+        byteorder: str = RomImage.LITTLE_ENDIAN,
+        cache_dir: typing.Optional[str] = None,
+        cache_size: int = AssemblyCache.DEFAULT_MAX_BYTES,
+        vectorized: bool = False,
+        optimize_rules: typing.Optional[typing.Sequence[str]] = None) -> \
+        typing.List[typing.Tuple[str, str, float, int, int]]:
+    """Assembles many .asm files, optionally spread over worker processes.
+    Every file is written to its own output path, and the summary is always
+    in sorted path order, so the results do not depend on scheduling. When
+    a cache is used, it is cut down to its size bound once, at the end.
+
+    Args:
+        input_paths (typing.Iterable[str]): paths of the .asm files.
+        jobs (int): number of worker processes, 1 assembles in this process.
+        single_pass (bool): see assemble_file.
+        output_format (str): see assemble_file.
+        byteorder (str): see assemble_file.
+        cache_dir (typing.Optional[str]): see assemble_path.
+        cache_size (int): the size bound of the cache, in bytes.
+        vectorized (bool): see assemble_file.
+        optimize_rules (typing.Optional[typing.Sequence[str]]): see
+            assemble_path.
+
+    Returns:
+        typing.List[typing.Tuple[str, str, float, int, int]]: the
+        assemble_path result of every file.
+    """
+    input_paths = sorted(input_paths)
+    assemble_one = functools.partial(
+        assemble_path, single_pass=single_pass, output_format=output_format,
+        byteorder=byteorder, cache_dir=cache_dir, vectorized=vectorized,
+        optimize_rules=optimize_rules)
+    if jobs <= 1 or len(input_paths) <= 1:
+        results = [assemble_one(input_path) for input_path in input_paths]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as \
+                executor:
+            results = list(executor.map(assemble_one, input_paths))
+    if cache_dir is not None:
+        AssemblyCache(cache_dir, cache_size).evict()
+    return results
+
+
+def assemble_two_pass(input_file: typing.TextIO) -> typing.Iterator[int]:
+    """Assembles a single file, reading it twice: once to collect the labels
+    and once to translate the commands. The words are produced lazily, as
+    the second pass advances.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble, must be seekable.
+
+    Returns:
+        typing.Iterator[int]: the machine words of the program.
     """
     # Initialization
     first_parser = Parser(input_file)
-    input_file.seek(0)
-    sec_parser = Parser(input_file)
     symbol_table = SymbolTable()
-    available_address_idx = INITIAL_ADDRESS
+    available_address_idx = SymbolTable.INITIAL_ADDRESS
 
     # First Pass
-    while first_parser.has_more_commands():
-        first_parser.advance()
-        if first_parser.command_type() == first_parser.L_COMMAND:
-            l_symbol = first_parser.symbol()
-            symbol_table.add_entry(l_symbol, first_parser.command_idx + 1)
+    for instruction in first_parser.instructions():
+        if instruction.command_type == first_parser.L_COMMAND:
+            symbol_table.add_entry(instruction.symbol, instruction.address)
 
-    # Second Pass
+    # Second Pass (the parser reads lazily, so only rewind once the first
+    # pass has consumed the input)
+    input_file.seek(0)
+    sec_parser = Parser(input_file)
     while sec_parser.has_more_commands():
         sec_parser.advance()
         # If the instruction is @ symbol
@@ -53,27 +230,83 @@ def assemble_file(
                                                        symbol_table)
             available_address_idx = address_idx
             # Translates the symbol to its binary value
-            output_file.write(
-                A_CODE + bin(int(cur_address))[2:].zfill(ZERO_FILL) + '\n')
+            yield get_a_command(cur_address)
 
         # If the instruction is dest =comp ; jump
         elif sec_parser.command_type() == sec_parser.C_COMMAND:
-            output_file.write(get_full_c_command(sec_parser))
+            yield get_full_c_command(sec_parser)
 
 
-def get_full_c_command(sec_parser: Parser) -> str:
+def assemble(source: typing.Union[str, typing.Iterable[str]],
+             optimizer: typing.Optional[PeepholeOptimizer] = None) -> \
+        typing.Tuple[array.array, SymbolTable, array.array]:
+    """Assembles a program in memory, in one pass over the input.
+    The sites of symbolic A-commands are recorded and patched once all the
+    labels of the program have been seen (a label may be declared after its
+    use, or even redeclared). Symbols that turn out not to be labels are
+    allocated as variables in order of first use, so the words are identical
+    to the ones of the two pass assembly.
+
+    Args:
+        source (typing.Union[str, typing.Iterable[str]]): the assembly text,
+            or an iterable of its lines (e.g. an open file).
+        optimizer (typing.Optional[PeepholeOptimizer]): if given, runs over
+            the parsed program before its labels are resolved.
+
+    Returns:
+        typing.Tuple[array.array, SymbolTable, array.array]: the ROM words
+        (typecode "H"), the resolved symbol table, and the source map: the
+        (1-based) input line of the command at each ROM address.
     """
-    This function returns the full binary command for type C_COMMAND
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    parser = Parser(source)
+    symbol_table = SymbolTable()
+    words = array.array(RomImage.TYPE_CODE)
+    source_map = array.array(SOURCE_MAP_TYPE_CODE)
+
+    instructions = parser.instructions()
+    if optimizer is not None:
+        instructions = optimizer.optimize(instructions)
+
+    for instruction in instructions:
+        c_type = instruction.command_type
+        if c_type == parser.L_COMMAND:
+            # the next command's address (the records keep the addresses of
+            # the program before optimization)
+            symbol_table.add_entry(instruction.symbol, len(words))
+            continue
+        source_map.append(instruction.line_number)
+        if c_type == parser.A_COMMAND:
+            # symbols are patched after the last label
+            words.append(symbol_table.a_command(instruction.symbol,
+                                                len(words)))
+        else:
+            words.append(Code.c_command(instruction.dest, instruction.comp,
+                                        instruction.jump))
+
+    # Backpatching
+    symbol_table.resolve(words)
+    return words, symbol_table, source_map
+
+
+def get_a_command(address: typing.Union[int, str]) -> int:
+    """
+    This function returns the machine word for type A_COMMAND
+    :param address: the address (or decimal constant) loaded by the command
+    :return: the 16-bit code of the A_COMMAND
+    """
+    return int(address)
+
+
+def get_full_c_command(sec_parser: Parser) -> int:
+    """
+    This function returns the machine word for type C_COMMAND
     :param sec_parser: current parser
-    :return: string represent the binary code of the current C_COMMAND
+    :return: the 16-bit code of the current C_COMMAND
     """
-    comp = sec_parser.comp()
-    full_command = Code.comp(comp) + Code.dest(sec_parser.dest()) + Code.jump(
-        sec_parser.jump()) + '\n'
-    if comp.find(LEFT_SHIFT) != NOT_FOUND or comp.find(
-            RIGHT_SHIFT) != NOT_FOUND:
-        return SHIFT_CODE + full_command
-    return C_CODE + full_command
+    return Code.c_command(sec_parser.dest(), sec_parser.comp(),
+                          sec_parser.jump())
 
 
 def get_cur_address(address_idx, sec_parser, symbol_table):
@@ -95,25 +328,93 @@ def get_cur_address(address_idx, sec_parser, symbol_table):
 
 
 if "__main__" == __name__:
-    # Parses the input path and calls assemble_file on each input file.
+    # Parses the input path and calls assemble_file on each input file
+    # (through assemble_paths, which may spread them over processes).
     # This opens both the input and the output files!
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: Assembler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    arg_parser = argparse.ArgumentParser(
+        prog="Assembler", description="Assembles Hack assembly files.")
+    arg_parser.add_argument("path", help="an .asm file or a directory")
+    arg_parser.add_argument(
+        "--single-pass", action="store_true",
+        help="read each file once and backpatch forward label references")
+    arg_parser.add_argument(
+        "--format", choices=(RomImage.TEXT_FORMAT, RomImage.BINARY_FORMAT),
+        default=RomImage.TEXT_FORMAT,
+        help="write .hack text or a packed uint16 image (.bin)")
+    arg_parser.add_argument(
+        "--byteorder", choices=RomImage.BYTE_ORDERS,
+        default=RomImage.LITTLE_ENDIAN,
+        help="byte order of the words in a binary image")
+    arg_parser.add_argument(
+        "--stats", action="store_true",
+        help="print per-file timings and the C-command cache hits and misses"
+             " when done")
+    arg_parser.add_argument(
+        "--jobs", type=int, default=1, metavar="N",
+        help="assemble the files of a directory in N worker processes")
+    arg_parser.add_argument(
+        "--cache", metavar="DIR",
+        help="reuse the outputs of unchanged sources from this directory")
+    arg_parser.add_argument(
+        "--cache-size", type=int, default=AssemblyCache.DEFAULT_MAX_BYTES,
+        metavar="BYTES", help="evict the least recently used cache entries "
+                              "beyond this size")
+    arg_parser.add_argument(
+        "--vectorized", action="store_true",
+        help="classify the whole program, then encode it with array "
+             "operations (NumPy when installed)")
+    arg_parser.add_argument(
+        "--optimize", nargs="?",
+        const=",".join(PeepholeOptimizer.DEFAULT_RULES), metavar="RULES",
+        help="run the peephole optimizer with these comma separated rules, "
+             f"of {', '.join(PeepholeOptimizer.ALL_RULES)} (default: "
+             f"{', '.join(PeepholeOptimizer.DEFAULT_RULES)}; reload is only "
+             f"sound for code from the VM translator)")
+    args = arg_parser.parse_args()
+    optimize_rules = None
+    if args.optimize is not None:
+        optimize_rules = tuple(rule for rule in args.optimize.split(",")
+                               if rule)
+    argument_path = os.path.abspath(args.path)
     if os.path.isdir(argument_path):
         files_to_assemble = [
             os.path.join(argument_path, filename)
             for filename in os.listdir(argument_path)]
     else:
         files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".asm":
-            continue
-        output_path = filename + ".hack"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            assemble_file(input_file, output_file)
+    files_to_assemble = [
+        input_path for input_path in files_to_assemble
+        if os.path.splitext(input_path)[1].lower() == INPUT_EXTENSION]
+    start_time = time.perf_counter()
+    results = assemble_paths(files_to_assemble, args.jobs, args.single_pass,
+                             args.format, args.byteorder, args.cache,
+                             args.cache_size, args.vectorized,
+                             optimize_rules)
+    if args.jobs > 1 or args.stats or optimize_rules is not None:
+        for input_path, status, seconds, _, _ in results:
+            print(f"{seconds:9.3f}s  {status}  {input_path}")
+        print(f"{len(results)} files in "
+              f"{time.perf_counter() - start_time:.3f}s using {args.jobs} "
+              f"job(s)")
+    if args.stats:
+        # summed over the files, since they may be assembled by workers
+        print(f"C-command cache: "
+              f"hits={sum(result[3] for result in results)}, "
+              f"misses={sum(result[4] for result in results)}")
+        if args.cache is not None:
+            assembly_cache = AssemblyCache(args.cache, args.cache_size)
+            cache_hits = sum(result[1] == STATUS_CACHED
+                             for result in results)
+            print(f"Assembly cache: hits={cache_hits}, "
+                  f"misses={len(results) - cache_hits}, "
+                  f"entries={len(assembly_cache.entries())}, "
+                  f"size={assembly_cache.size()}")
+    failures = [result for result in results
+                if result[1].startswith(STATUS_ERROR)]
+    for input_path, status, seconds, _, _ in failures:
+        print(f"{input_path}: {status}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
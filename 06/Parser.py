@@ -6,7 +6,7 @@ as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
-import re
+from Instruction import Instruction
 
 
 class Parser:
@@ -15,53 +15,69 @@ class Parser:
     and provides convenient access to the commands components (fields
     and symbols). In addition, removes all white space and comments.
     """
-    A_COMMAND = "A_COMMAND"
-    C_COMMAND = "C_COMMAND"
-    L_COMMAND = "L_COMMAND"
+    A_COMMAND = Instruction.A_COMMAND
+    C_COMMAND = Instruction.C_COMMAND
+    L_COMMAND = Instruction.L_COMMAND
     INITIAL_VAL = -1
     COMMENT = "//"
     NULL = "null"
     EMPTY = ""
     NOT_FOUND = -1
 
-    def __init__(self, input_file: typing.TextIO) -> None:
+    def __init__(self, input_file: typing.Iterable[str]) -> None:
         """Opens the input file and gets ready to parse it.
+        The input is read lazily, one buffered line at a time, so the memory
+        used by the parser does not grow with the size of the program.
 
         Args:
-            input_file (typing.TextIO): input file.
+            input_file (typing.Iterable[str]): input file, or any other
+            iterable of lines.
         """
-        self.input_lines = input_file.read().splitlines()
-        self.n = self.INITIAL_VAL
+        self.input_lines = enumerate(input_file, 1)
+        self.line_number = 0
         self.command_idx = self.INITIAL_VAL
         self.cur_instruction = self.EMPTY
+        self.instruction = None
 
     def has_more_commands(self) -> bool:
         """Are there more commands in the input?
+        After it returns True, line_number holds the (1-based) line of the
+        input on which the next command was found.
 
         Returns:
             bool: True if there are more commands, False otherwise.
         """
-        while len(self.input_lines) - 1 != self.n:
-            self.n += 1
-            self.cur_instruction = self.input_lines[self.n].strip(). \
-                replace(" ", "")
-            if self.cur_instruction != self.EMPTY and self.cur_instruction[
-                                                      0:2] != self.COMMENT:
+        for line_number, line in self.input_lines:
+            self.line_number = line_number
+            # removes all white space and comments
+            self.cur_instruction = Instruction.clean(line)
+            if self.cur_instruction != self.EMPTY:
                 return True
         return False
 
     def advance(self) -> None:
         """Reads the next command from the input and makes it the current command.
         Should be called only if has_more_commands() is true.
+        The command is parsed once, into the Instruction record
+        self.instruction, which the other methods read.
         """
         if self.cur_instruction[0] != "(":  # not L_COMMAND
             self.command_idx += 1
-        # remove inline comments:
-        inline_comment_idx = self.cur_instruction.find(self.COMMENT)
-        if inline_comment_idx != self.NOT_FOUND:
-            self.cur_instruction = self.cur_instruction[0:inline_comment_idx]
-        # remove all additional tags:
-        self.cur_instruction = ''.join(self.cur_instruction.split())
+        text = self.cur_instruction
+        address = self.command_idx + 1 if text[0] == "(" else \
+            self.command_idx
+        self.instruction = Instruction.parse(text, address, self.line_number)
+
+    def instructions(self) -> typing.Iterator[Instruction]:
+        """Parses the rest of the input.
+
+        Returns:
+            typing.Iterator[Instruction]: the instruction record of every
+            remaining command, in order.
+        """
+        while self.has_more_commands():
+            self.advance()
+            yield self.instruction
 
     def command_type(self) -> str:
         """
@@ -71,12 +87,7 @@ class Parser:
             "C_COMMAND" for dest=comp;jump
             "L_COMMAND" (actually, pseudo-command) for (Xxx) where Xxx is a symbol
         """
-        first_param = self.cur_instruction[0]
-        if first_param == "(":
-            return self.L_COMMAND
-        elif first_param == "@":
-            return self.A_COMMAND
-        return self.C_COMMAND
+        return self.instruction.command_type
 
     def symbol(self) -> str:
         """
@@ -85,11 +96,7 @@ class Parser:
             (Xxx). Should be called only when command_type() is "A_COMMAND" or 
             "L_COMMAND".
         """
-        command_type = self.cur_instruction[0]
-        symbol = self.cur_instruction[1:]
-        if command_type == "@":  # A_COMMAND symbol
-            return symbol
-        return symbol[:-1]  # L_COMMAND symbol
+        return self.instruction.symbol
 
     def dest(self) -> str:
         """
@@ -97,10 +104,7 @@ class Parser:
             str: the dest mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-        dest_idx = self.cur_instruction.find("=")
-        if dest_idx == self.NOT_FOUND:
-            return self.NULL
-        return self.cur_instruction[0:dest_idx]
+        return self.instruction.dest
 
     def comp(self) -> str:
         """
@@ -108,7 +112,7 @@ class Parser:
             str: the comp mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-        return re.split(';', re.split('=', self.cur_instruction)[-1])[0]
+        return self.instruction.comp
 
     def jump(self) -> str:
         """
@@ -116,7 +120,4 @@ class Parser:
             str: the jump mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-        jump_idx = self.cur_instruction.find(";")
-        if jump_idx == self.NOT_FOUND or self.cur_instruction[jump_idx + 1:] == '':
-            return self.NULL
-        return self.cur_instruction[jump_idx + 1:]
+        return self.instruction.jump
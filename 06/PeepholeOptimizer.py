@@ -0,0 +1,209 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from Instruction import Instruction
+from Parser import Parser
+
+
+class PeepholeOptimizer:
+    """Removes redundant instructions from a parsed assembly program, before
+    its labels are resolved. Every rule only looks at straight-line code: a
+    label ends the window, since it can be reached from elsewhere.
+
+    Rules:
+    - "stack": "@X, M=M+1, @X, M=M-1" (or the other way around) leaves X
+      unchanged, so only the first "@X" is kept.
+    - "address": "@X" is dropped when A is already known to hold X.
+    - "reload": "@X, A=<comp of M>" is dropped when A already holds the
+      result of the same reload (e.g. repeated "@SP, A=M-1") and the cell X
+      was not written since. Writes through the reloaded pointer are
+      assumed not to change X, i.e. a pointer loaded from X never points
+      back at X itself. The VM translator guarantees this for SP, LCL, ARG,
+      THIS and THAT, but hand-written code need not: with RAM[5] = 5,
+      "@R5, A=M, M=0, @R5, A=M" must load 0 the second time. So this rule
+      is not in DEFAULT_RULES and only runs when asked for by name.
+    - "jump": "@L, 0;JMP" (or a conditional jump without dest) directly
+      before "(L)" is dropped.
+    """
+    STACK = "stack"
+    ADDRESS = "address"
+    RELOAD = "reload"
+    JUMP = "jump"
+    ALL_RULES = (STACK, ADDRESS, RELOAD, JUMP)
+    # the rules that are sound for any program
+    DEFAULT_RULES = (STACK, ADDRESS, JUMP)
+    MAX_ROUNDS = 8
+
+    INCREMENT = "M=M+1"
+    DECREMENT = "M=M-1"
+    NULL = "null"
+    A_REGISTER = "A"
+    D_REGISTER = "D"
+    M_REGISTER = "M"
+
+    def __init__(self, rules: typing.Iterable[str] = DEFAULT_RULES) -> None:
+        """Creates an optimizer.
+
+        Args:
+            rules (typing.Iterable[str]): the names of the rules to apply.
+        """
+        self.rules = tuple(rules)
+        for rule in self.rules:
+            if rule not in self.ALL_RULES:
+                raise ValueError(f"unknown peephole rule: {rule}")
+        self.removed = dict.fromkeys(self.rules, 0)
+
+    def optimize(self, instructions: typing.Iterable[Instruction]) -> \
+            typing.List[Instruction]:
+        """Applies the rules until none of them removes anything.
+
+        Args:
+            instructions (typing.Iterable[Instruction]): the program.
+
+        Returns:
+            typing.List[Instruction]: the optimized program. The address
+            fields of the records are not updated.
+        """
+        instructions = list(instructions)
+        for _ in range(self.MAX_ROUNDS):
+            total_size = len(instructions)
+            for rule in self.rules:
+                rule_size = len(instructions)
+                instructions = getattr(self, f"_PeepholeOptimizer__{rule}")(
+                    instructions)
+                self.removed[rule] += rule_size - len(instructions)
+            if len(instructions) == total_size:
+                break
+        return instructions
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: how many instructions each rule removed.
+        """
+        return ", ".join(f"{rule}: -{count}"
+                         for rule, count in self.removed.items())
+
+    @staticmethod
+    def __is_a(instruction: Instruction, symbol: str = None) -> bool:
+        return instruction.command_type == Parser.A_COMMAND and \
+            (symbol is None or instruction.symbol == symbol)
+
+    def __stack(self, instructions: typing.List[Instruction]) -> \
+            typing.List[Instruction]:
+        """
+        removes "@X, M=M+1, @X, M=M-1" and "@X, M=M-1, @X, M=M+1" windows,
+        keeping the first "@X"
+        :param instructions: the program
+        :return: the optimized program
+        """
+        optimized = []
+        idx = 0
+        while idx < len(instructions):
+            window = instructions[idx:idx + 4]
+            if len(window) == 4 and self.__is_a(window[0]) and \
+                    self.__is_a(window[2], window[0].symbol) and \
+                    {window[1].text, window[3].text} == \
+                    {self.INCREMENT, self.DECREMENT}:
+                optimized.append(window[0])
+                idx += 4
+                continue
+            optimized.append(instructions[idx])
+            idx += 1
+        return optimized
+
+    def __address(self, instructions: typing.List[Instruction]) -> \
+            typing.List[Instruction]:
+        """
+        removes A-commands that load the value A already holds
+        :param instructions: the program
+        :return: the optimized program
+        """
+        optimized = []
+        known_symbol = None
+        for instruction in instructions:
+            if instruction.command_type == Parser.L_COMMAND:
+                known_symbol = None
+            elif instruction.command_type == Parser.A_COMMAND:
+                if instruction.symbol == known_symbol:
+                    continue
+                known_symbol = instruction.symbol
+            elif self.A_REGISTER in instruction.dest:
+                known_symbol = None
+            optimized.append(instruction)
+        return optimized
+
+    def __reload(self, instructions: typing.List[Instruction]) -> \
+            typing.List[Instruction]:
+        """
+        removes "@X, A=<comp of M>" pairs that recompute the pointer A
+        already holds
+        :param instructions: the program
+        :return: the optimized program
+        """
+        optimized = []
+        # (X, comp) when A holds comp applied to RAM[X]
+        known_reload = None
+        idx = 0
+        while idx < len(instructions):
+            instruction = instructions[idx]
+            if instruction.command_type == Parser.A_COMMAND and \
+                    idx + 1 < len(instructions):
+                next_instruction = instructions[idx + 1]
+                if next_instruction.command_type == Parser.C_COMMAND and \
+                        next_instruction.dest == self.A_REGISTER and \
+                        next_instruction.jump == self.NULL and \
+                        self.M_REGISTER in next_instruction.comp and \
+                        self.A_REGISTER not in next_instruction.comp and \
+                        self.D_REGISTER not in next_instruction.comp:
+                    reload = (instruction.symbol, next_instruction.comp)
+                    if reload == known_reload:
+                        idx += 2
+                        continue
+                    optimized.extend((instruction, next_instruction))
+                    known_reload = reload
+                    idx += 2
+                    continue
+            if instruction.command_type != Parser.C_COMMAND or \
+                    self.A_REGISTER in instruction.dest:
+                known_reload = None
+            optimized.append(instruction)
+            idx += 1
+        return optimized
+
+    def __jump(self, instructions: typing.List[Instruction]) -> \
+            typing.List[Instruction]:
+        """
+        removes jumps to the label that directly follows them
+        :param instructions: the program
+        :return: the optimized program
+        """
+        optimized = []
+        idx = 0
+        while idx < len(instructions):
+            instruction = instructions[idx]
+            if self.__is_a(instruction) and idx + 1 < len(instructions):
+                jump = instructions[idx + 1]
+                if jump.command_type == Parser.C_COMMAND and \
+                        jump.jump != self.NULL and jump.dest == self.NULL:
+                    label_idx = idx + 2
+                    while label_idx < len(instructions) and \
+                            instructions[label_idx].command_type == \
+                            Parser.L_COMMAND:
+                        if instructions[label_idx].symbol == \
+                                instruction.symbol:
+                            idx += 2
+                            break
+                        label_idx += 1
+                    else:
+                        optimized.append(instruction)
+                        idx += 1
+                    continue
+            optimized.append(instruction)
+            idx += 1
+        return optimized
@@ -0,0 +1,74 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import mmap
+import os
+import sys
+import typing
+
+
+class RomImage:
+    """Reads and writes packed Hack ROM images: every 16-bit machine word is
+    stored as a raw uint16 in the chosen byte order, with no header and no
+    separators (2 bytes per word instead of 17 for a .hack text line).
+    """
+    EXTENSION = ".bin"
+    # the output formats of the assembler: .hack text, or a packed image
+    TEXT_FORMAT = "hack"
+    BINARY_FORMAT = "binary"
+    LITTLE_ENDIAN = "little"
+    BIG_ENDIAN = "big"
+    BYTE_ORDERS = (LITTLE_ENDIAN, BIG_ENDIAN)
+    TYPE_CODE = "H"
+    WORD_SIZE = 2
+
+    @staticmethod
+    def write(words: typing.Iterable[int], output_file: typing.BinaryIO,
+              byteorder: str = LITTLE_ENDIAN) -> None:
+        """Writes the given machine words as a packed image.
+
+        Args:
+            words (typing.Iterable[int]): the ROM words, in address order.
+            output_file (typing.BinaryIO): a file opened for binary writing.
+            byteorder (str): "little" or "big".
+        """
+        if byteorder != sys.byteorder:
+            words = array.array(RomImage.TYPE_CODE, words)
+            words.byteswap()
+        elif not isinstance(words, array.array) or \
+                words.typecode != RomImage.TYPE_CODE:
+            words = array.array(RomImage.TYPE_CODE, words)
+        words.tofile(output_file)
+
+    @staticmethod
+    def load(path: str, byteorder: str = LITTLE_ENDIAN) -> memoryview:
+        """Maps a packed image into memory.
+        When the image byte order is the native one, no copy is made: the
+        returned view reads the words straight from the mapped file.
+
+        Args:
+            path (str): path of the image file.
+            byteorder (str): the byte order the image was written with.
+
+        Returns:
+            memoryview: a read-only view of the ROM words (format "H").
+        """
+        with open(path, 'rb') as rom_file:
+            size = os.fstat(rom_file.fileno()).st_size
+            if size % RomImage.WORD_SIZE:
+                raise ValueError(f"{path}: image size {size} is not a "
+                                 f"whole number of 16-bit words")
+            if size == 0:
+                return memoryview(array.array(RomImage.TYPE_CODE))
+            rom_map = mmap.mmap(rom_file.fileno(), 0, access=mmap.ACCESS_READ)
+        words = memoryview(rom_map).cast(RomImage.TYPE_CODE)
+        if byteorder != sys.byteorder:
+            swapped = array.array(RomImage.TYPE_CODE, words)
+            swapped.byteswap()
+            return memoryview(swapped)
+        return words
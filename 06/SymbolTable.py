@@ -5,6 +5,7 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import typing
 
 
 class SymbolTable:
@@ -12,6 +13,10 @@ class SymbolTable:
     A symbol table that keeps a correspondence between symbolic labels and 
     numeric addresses.
     """
+    # the address of the first variable
+    INITIAL_ADDRESS = 16
+    # the placeholder word of an A-command whose symbol is not resolved yet
+    UNRESOLVED = 0
 
     def __init__(self) -> None:
         """Creates a new symbol table initialized with all the predefined symbols
@@ -36,6 +41,9 @@ class SymbolTable:
                              "R14": 14,
                              "R15": 15,
                              "SCREEN": 16384, "KBD": 24576}
+        # symbol -> the addresses of the A-commands that use it, in order of
+        # first use
+        self.unresolved_sites = {}
 
     def add_entry(self, symbol: str, address: int) -> None:
         """Adds the pair (symbol, address) to the table.
@@ -67,3 +75,37 @@ class SymbolTable:
             int: the address associated with the symbol.
         """
         return self.symbol_table[symbol]
+
+    def a_command(self, symbol: str, site: int) -> int:
+        """Returns the machine word of an A-command. A symbol may be a label
+        declared later, so its word is UNRESOLVED until resolve() patches it.
+
+        Args:
+            symbol (str): the symbol or decimal of the command.
+            site (int): the index of the command's word.
+
+        Returns:
+            int: the value of a decimal, UNRESOLVED for a symbol.
+        """
+        if symbol.isnumeric():
+            return int(symbol)
+        self.unresolved_sites.setdefault(symbol, []).append(site)
+        return self.UNRESOLVED
+
+    def resolve(self, words: typing.MutableSequence[int]) -> None:
+        """Patches the words of the A-commands of a_command(), once all the
+        labels have been added. The symbols that are not in the table are
+        variables, allocated from INITIAL_ADDRESS in order of first use.
+
+        Args:
+            words (typing.MutableSequence[int]): the words of the program.
+        """
+        available_address_idx = self.INITIAL_ADDRESS
+        for symbol, sites in self.unresolved_sites.items():
+            if not self.contains(symbol):
+                self.add_entry(symbol, available_address_idx)
+                available_address_idx += 1
+            address = self.get_address(symbol)
+            for site in sites:
+                words[site] = address
+        self.unresolved_sites = {}
@@ -0,0 +1,243 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import re
+import sys
+import typing
+from BlockTranslator import BlockTranslator
+from HackEmulator import HackEmulator
+
+
+class TestScript:
+    """Runs a CPU emulator test script (.tst) of the course on the
+    BlockTranslator emulator, writes its output file and compares it to the
+    compare file, like the CPU emulator of the course does.
+
+    Supported commands: load, output-file, compare-to, output-list, set,
+    repeat N { ... }, ticktock, output, echo and clear-echo. Output columns
+    and set targets are RAM[address], A, D and PC, and the output formats
+    are %D (decimal), %X (hexadecimal), %B (binary) and %S (string).
+    The bare "repeat { ... }" of the interactive scripts, e.g. Fill.tst,
+    repeats until the user stops it, and is not supported.
+    """
+    COMMENTS = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+    TOKENS = re.compile(r'"[^"]*"|[{}]|[,;]|[^\s,;{}]+')
+    RAM = re.compile(r"RAM\[(\d+)\]$")
+    COLUMN = re.compile(r"(.+?)%([DXBS])(\d+)\.(\d+)\.(\d+)$")
+    SEPARATORS = {",", ";"}
+    REGISTERS = {"A": "a", "D": "d", "PC": "pc"}
+    DEFAULT_FORMAT = ("D", 1, 6, 1)
+
+    def __init__(self, script_path: str) -> None:
+        """Reads a test script.
+
+        Args:
+            script_path (str): the .tst file. The files it names are
+                relative to its directory.
+        """
+        self.script_path = script_path
+        self.directory = os.path.dirname(os.path.abspath(script_path))
+        with open(script_path, 'r') as script_file:
+            text = self.COMMENTS.sub(" ", script_file.read())
+        self.tokens = self.TOKENS.findall(text)
+        self.emulator = BlockTranslator()
+        # (name, format, left pad, width, right pad) of the output columns
+        self.columns = []
+        self.output_lines = []
+        self.compare_lines = None
+        self.output_path = None
+        # the first output line that differs from the compare file
+        self.failure_line = None
+
+    def run(self) -> bool:
+        """Runs the script.
+
+        Returns:
+            bool: True if the output lines matched every line of the compare
+            file (or there is no compare file).
+        """
+        commands = self.__parse(iter(self.tokens))
+        try:
+            self.__execute(commands)
+            if self.compare_lines is not None and \
+                    self.failure_line is None and \
+                    len(self.output_lines) < len(self.compare_lines):
+                # the first compare line that was never written
+                self.failure_line = len(self.output_lines) + 1
+        finally:
+            if self.output_path is not None:
+                with open(self.output_path, 'w') as output_file:
+                    output_file.writelines(line + "\n"
+                                           for line in self.output_lines)
+        return self.failure_line is None
+
+    def __parse(self, tokens: typing.Iterator[str]) -> typing.List[
+            typing.Union[typing.List[str], tuple]]:
+        """
+        groups the tokens into commands, and repeat blocks into nested lists
+        :param tokens: the tokens of the script, after the opening brace of
+            a block
+        :return: a list of commands: lists of words, or ("repeat", count,
+            commands) tuples
+        """
+        commands = []
+        words = []
+        for token in tokens:
+            if token in self.SEPARATORS or token == "}":
+                if words:
+                    commands.append(words)
+                    words = []
+                if token == "}":
+                    return commands
+            elif token == "{":
+                if not words or words[0] != "repeat":
+                    raise ValueError(f"{self.script_path}: unexpected block")
+                if len(words) < 2:
+                    raise ValueError(f"{self.script_path}: repeat without a "
+                                     f"count runs until stopped by hand, "
+                                     f"and is not supported")
+                commands.append(("repeat", int(words[1]),
+                                 self.__parse(tokens)))
+                words = []
+            else:
+                words.append(token)
+        if words:
+            commands.append(words)
+        return commands
+
+    def __execute(self, commands: typing.List[
+            typing.Union[typing.List[str], tuple]]) -> None:
+        """
+        executes commands
+        :param commands: commands, as returned by __parse
+        """
+        emulator = self.emulator
+        for command in commands:
+            if isinstance(command, tuple):
+                repeat, count, body = command
+                if body == [["ticktock"]]:
+                    emulator.run(count, stop_at_halt=False)
+                else:
+                    for _ in range(count):
+                        self.__execute(body)
+                continue
+            name, args = command[0], command[1:]
+            if name == "ticktock":
+                emulator.run(1, stop_at_halt=False)
+            elif name == "set":
+                self.__set(args[0], int(args[1]))
+            elif name == "output":
+                self.__output()
+            elif name == "load":
+                emulator.load_file(os.path.join(self.directory, args[0]))
+            elif name == "output-file":
+                self.output_path = os.path.join(self.directory, args[0])
+            elif name == "compare-to":
+                with open(os.path.join(self.directory, args[0]), 'r') as \
+                        compare_file:
+                    self.compare_lines = \
+                        compare_file.read().rstrip().splitlines()
+            elif name == "output-list":
+                self.columns = [self.__column(arg) for arg in args]
+                self.__output(header=True)
+            elif name not in {"echo", "clear-echo"}:
+                raise ValueError(f"{self.script_path}: unsupported command: "
+                                 f"{name}")
+
+    def __column(self, spec: str) -> typing.Tuple[str, str, int, int, int]:
+        """
+        :param spec: an output-list item, e.g. "RAM[0]%D2.6.2"
+        :return: its name, format, left pad, width and right pad
+        """
+        match = self.COLUMN.match(spec)
+        if match is None:
+            return (spec,) + self.DEFAULT_FORMAT
+        name, output_format, left, width, right = match.groups()
+        return name, output_format, int(left), int(width), int(right)
+
+    def __value(self, name: str) -> int:
+        """
+        :param name: RAM[address], A, D or PC
+        :return: its unsigned value
+        """
+        match = self.RAM.match(name)
+        if match is not None:
+            return self.emulator.ram[int(match.group(1))]
+        if name in self.REGISTERS:
+            return getattr(self.emulator, self.REGISTERS[name])
+        raise ValueError(f"{self.script_path}: unsupported variable: {name}")
+
+    def __set(self, name: str, value: int) -> None:
+        """
+        :param name: RAM[address], A, D or PC
+        :param value: the value to set
+        """
+        match = self.RAM.match(name)
+        if match is not None:
+            self.emulator.write(int(match.group(1)), value)
+        elif name in self.REGISTERS:
+            setattr(self.emulator, self.REGISTERS[name],
+                    value & HackEmulator.WORD_MASK)
+        else:
+            raise ValueError(f"{self.script_path}: unsupported variable: "
+                             f"{name}")
+
+    def __output(self, header: bool = False) -> None:
+        """
+        writes an output line: the column names, or their values, and
+        compares it to the compare file
+        :param header: if True, writes the column names
+        """
+        cells = []
+        for name, output_format, left, width, right in self.columns:
+            size = left + width + right
+            if header:
+                padding = size - len(name)
+                cells.append(" " * (padding // 2) + name +
+                             " " * (padding - padding // 2))
+                continue
+            value = self.__value(name)
+            if output_format == "B":
+                text = f"{value:016b}"[-width:]
+            elif output_format == "X":
+                text = f"{value:04X}"[-width:]
+            elif output_format == "S":
+                text = chr(value)
+            else:
+                text = str(value - ((value & HackEmulator.SIGN_BIT) << 1))
+            cells.append(" " * left + text.rjust(width) + " " * right)
+        line = "|" + "|".join(cells) + "|"
+        self.output_lines.append(line)
+        if self.compare_lines is not None and self.failure_line is None:
+            line_idx = len(self.output_lines) - 1
+            if line_idx >= len(self.compare_lines) or \
+                    self.compare_lines[line_idx].strip() != line.strip():
+                self.failure_line = len(self.output_lines)
+
+
+if "__main__" == __name__:
+    # Runs the test scripts given as arguments and exits with a failure
+    # status if any of them does not match its compare file.
+    if len(sys.argv) < 2:
+        sys.exit("Invalid usage, please use: TestScript <script.tst>...")
+    failed = False
+    for path in sys.argv[1:]:
+        test_script = TestScript(path)
+        try:
+            passed = test_script.run()
+        except ValueError as error:
+            print(error)
+            failed = True
+            continue
+        if passed:
+            print(f"{path}: End of script - Comparison ended successfully")
+        else:
+            print(f"{path}: Comparison failure at line "
+                  f"{test_script.failure_line}")
+            failed = True
+    sys.exit(1 if failed else 0)
@@ -6,6 +6,7 @@ as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
+from VMInstruction import Opcode, VMInstruction
 
 
 class Parser:
@@ -15,7 +16,8 @@ class Parser:
     Handles the parsing of a single .vm file, and encapsulates access to the
     input code. It reads VM commands, parses them, and provides convenient 
     access to their components. 
-    In addition, it removes all white space and comments.
+    In addition, it removes all white space and comments. The file is parsed
+    once, into VMInstruction records.
 
     ## VM Language Specification
 
@@ -55,15 +57,13 @@ class Parser:
     C_FUNCTION = "C_FUNCTION"
     C_RETURN = "C_RETURN"
     C_CALL = "C_CALL"
-    command_table = {"push": C_PUSH, "pop": C_POP, "label": C_LABEL,
-                     "goto": C_GOTO, "if-goto": C_IF, "function": C_FUNCTION,
-                     "return": C_RETURN, "call": C_CALL}
+    # opcode -> command type, for the commands that are not arithmetic
+    type_table = {Opcode.PUSH: C_PUSH, Opcode.POP: C_POP,
+                  Opcode.LABEL: C_LABEL, Opcode.GOTO: C_GOTO,
+                  Opcode.IF_GOTO: C_IF, Opcode.FUNCTION: C_FUNCTION,
+                  Opcode.RETURN: C_RETURN, Opcode.CALL: C_CALL}
     INITIAL_VAL = -1
-    COMMENT = "//"
-    NULL = "null"
-    EMPTY_LST = []
     EMPTY = ""
-    NOT_FOUND = -1
 
     def __init__(self, input_file: typing.TextIO) -> None:
         """Gets ready to parse the input file.
@@ -71,9 +71,22 @@ class Parser:
         Args:
             input_file (typing.TextIO): input file.
         """
-        self.input_lines = input_file.read().splitlines()
+        self.instructions = self.read(input_file)
         self.n = self.INITIAL_VAL
-        self.cur_command_lst = self.EMPTY_LST
+        self.current = None
+
+    @staticmethod
+    def read(input_file: typing.TextIO) -> typing.List[VMInstruction]:
+        """Parses the input file. A subclass may override this to read other
+        formats of VM code.
+
+        Args:
+            input_file (typing.TextIO): input file.
+
+        Returns:
+            typing.List[VMInstruction]: the commands, in order.
+        """
+        return VMInstruction.parse(input_file)
 
     def has_more_commands(self) -> bool:
         """Are there more commands in the input?
@@ -81,26 +94,15 @@ class Parser:
         Returns:
             bool: True if there are more commands, False otherwise.
         """
-        while len(self.input_lines) - 1 != self.n:
-            self.n += 1
-            cur_command = self.input_lines[self.n].strip()
-            if cur_command != self.EMPTY and cur_command[
-                                             0:2] != self.COMMENT:
-                return True
-        return False
+        return self.n + 1 < len(self.instructions)
 
     def advance(self) -> None:
         """Reads the next command from the input and makes it the current 
         command. Should be called only if has_more_commands() is true.
         Initially there is no current command.
         """
-        # remove inline comments:
-        cur_command = self.input_lines[self.n].strip()
-        inline_comment_idx = cur_command.find(self.COMMENT)
-        if inline_comment_idx != self.NOT_FOUND:
-            cur_command = cur_command[0:inline_comment_idx]
-
-        self.cur_command_lst = cur_command.split()
+        self.n += 1
+        self.current = self.instructions[self.n]
 
     def command_type(self) -> str:
         """
@@ -111,9 +113,7 @@ class Parser:
             "C_PUSH", "C_POP", "C_LABEL", "C_GOTO", "C_IF", "C_FUNCTION",
             "C_RETURN", "C_CALL".
         """
-        if self.cur_command_lst[0] not in self.command_table:
-            return self.C_ARITHMETIC
-        return self.command_table[self.cur_command_lst[0]]
+        return self.type_table.get(self.current.opcode, self.C_ARITHMETIC)
 
     def arg1(self) -> str:
         """
@@ -122,9 +122,12 @@ class Parser:
             "C_ARITHMETIC", the command itself (add, sub, etc.) is returned. 
             Should not be called if the current command is "C_RETURN".
         """
-        if self.command_type() == self.C_ARITHMETIC:
-            return self.cur_command_lst[0]
-        return self.cur_command_lst[1]
+        current = self.current
+        if current.segment is not None:
+            return current.segment_name()
+        if current.name is not None:
+            return current.name
+        return current.keyword()
 
     def arg2(self) -> int:
         """
@@ -133,4 +136,4 @@ class Parser:
             called only if the current command is "C_PUSH", "C_POP", 
             "C_FUNCTION" or "C_CALL".
         """
-        return int(self.cur_command_lst[2])
+        return self.current.arg
@@ -0,0 +1,260 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import io
+import mmap
+import os
+import sys
+import typing
+from VMInstruction import Opcode, Segment, VMInstruction
+
+
+class VMBytecode:
+    """Encodes VM programs in the compact .vmb format, and reads them back
+    as VMInstruction records without tokenizing any text.
+
+    Format:
+    - the magic bytes "VMB1";
+    - the string table: the number of strings, then every string as its
+      length in bytes and its UTF-8 bytes;
+    - the code, up to the end of the file: every command is its opcode byte
+      (an Opcode value) followed by its operands:
+      - push, pop: the segment byte (a Segment value) and the index;
+      - label, goto, if-goto: the string id of the label;
+      - function, call: the string id of the function and the number of
+        locals or arguments;
+      - arithmetic commands and return: no operands.
+    Counts, lengths, indices and string ids are unsigned LEB128 varints: a
+    value below 128 is a single byte.
+
+    The format does not store source lines. The line_number of a read
+    instruction is the index of its record, counted from 1, and it is not
+    the line of the command in the .vm file the program came from (that
+    file may have comments and blank lines).
+    """
+    EXTENSION = ".vmb"
+    MAGIC = b"VMB1"
+    VARINT_BITS = 7
+    VARINT_MASK = 0x7F
+    VARINT_MORE = 0x80
+    ENCODING = "utf-8"
+    # the operands that follow each opcode
+    NO_OPERANDS = 0
+    SEGMENT_OPERANDS = 1
+    NAME_OPERANDS = 2
+    FUNCTION_OPERANDS = 3
+    operands = {Opcode.PUSH: SEGMENT_OPERANDS, Opcode.POP: SEGMENT_OPERANDS,
+                Opcode.LABEL: NAME_OPERANDS, Opcode.GOTO: NAME_OPERANDS,
+                Opcode.IF_GOTO: NAME_OPERANDS,
+                Opcode.FUNCTION: FUNCTION_OPERANDS,
+                Opcode.CALL: FUNCTION_OPERANDS}
+    # opcode byte -> opcode (the commands of the VM language), segment
+    # byte -> segment
+    opcode_list = list(VMInstruction.keywords)
+    segment_list = list(Segment)
+
+    def __init__(self) -> None:
+        """Creates an empty program."""
+        # string -> its id in the string table
+        self.strings = {}
+        self.code = bytearray()
+
+    def add(self, instruction: VMInstruction) -> None:
+        """Encodes a command at the end of the program.
+
+        Args:
+            instruction (VMInstruction): the command.
+        """
+        opcode = instruction.opcode
+        kind = self.operands.get(opcode, self.NO_OPERANDS)
+        self.code.append(opcode)
+        if kind == self.SEGMENT_OPERANDS:
+            self.code.append(instruction.segment)
+            self.__add_varint(self.code, instruction.arg)
+        elif kind == self.NAME_OPERANDS:
+            self.__add_varint(self.code, self.__intern(instruction.name))
+        elif kind == self.FUNCTION_OPERANDS:
+            self.__add_varint(self.code, self.__intern(instruction.name))
+            self.__add_varint(self.code, instruction.arg)
+
+    def __intern(self, string: str) -> int:
+        """
+        :param string: a label or function name
+        :return: its id in the string table, added if it is new
+        """
+        string_id = self.strings.get(string)
+        if string_id is None:
+            string_id = self.strings[string] = len(self.strings)
+        return string_id
+
+    @staticmethod
+    def __add_varint(data: bytearray, value: int) -> None:
+        """
+        appends an unsigned LEB128 varint
+        :param data: the encoded bytes
+        :param value: a non-negative number
+        """
+        if value < 0:
+            raise ValueError(f"negative VM operand: {value}")
+        while value > VMBytecode.VARINT_MASK:
+            data.append((value & VMBytecode.VARINT_MASK) |
+                        VMBytecode.VARINT_MORE)
+            value >>= VMBytecode.VARINT_BITS
+        data.append(value)
+
+    def write(self, output_file: typing.BinaryIO) -> None:
+        """Writes the program.
+
+        Args:
+            output_file (typing.BinaryIO): a file opened for binary writing.
+        """
+        header = bytearray(self.MAGIC)
+        self.__add_varint(header, len(self.strings))
+        for string in self.strings:
+            encoded = string.encode(self.ENCODING)
+            self.__add_varint(header, len(encoded))
+            header += encoded
+        output_file.write(header)
+        output_file.write(self.code)
+
+    @staticmethod
+    def is_bytecode(input_file: typing.IO) -> bool:
+        """
+        Args:
+            input_file (typing.IO): an open file.
+
+        Returns:
+            bool: True if the file is opened in binary mode, to be read by
+            read() instead of parsed as text.
+        """
+        return isinstance(input_file, (io.RawIOBase, io.BufferedIOBase))
+
+    @staticmethod
+    def read(input_file: typing.BinaryIO) -> typing.List[VMInstruction]:
+        """Reads a program. A file on disk is mapped into memory, and the
+        code is decoded straight from the mapping.
+
+        Args:
+            input_file (typing.BinaryIO): a file opened for binary reading.
+
+        Returns:
+            typing.List[VMInstruction]: the commands, in order, numbered
+            by record index.
+
+        Raises:
+            ValueError: if the file is not a valid .vmb program.
+        """
+        try:
+            data = memoryview(mmap.mmap(input_file.fileno(), 0,
+                                        access=mmap.ACCESS_READ))
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            # not a file on disk, or an empty one
+            data = memoryview(input_file.read())
+        return VMBytecode.decode(data)
+
+    @staticmethod
+    def decode(data: memoryview) -> typing.List[VMInstruction]:
+        """Decodes a program.
+
+        Args:
+            data (memoryview): the bytes of a .vmb program.
+
+        Returns:
+            typing.List[VMInstruction]: the commands, in order, numbered
+            by record index.
+
+        Raises:
+            ValueError: if the data is not a valid .vmb program.
+        """
+        magic_size = len(VMBytecode.MAGIC)
+        if data[:magic_size] != VMBytecode.MAGIC:
+            raise ValueError("not a VM bytecode program")
+        read_varint = VMBytecode.__read_varint
+        count, pos = read_varint(data, magic_size)
+        strings = []
+        for _ in range(count):
+            length, pos = read_varint(data, pos)
+            strings.append(str(data[pos:pos + length], VMBytecode.ENCODING))
+            pos += length
+        opcode_list, segment_list = VMBytecode.opcode_list, \
+            VMBytecode.segment_list
+        operands = VMBytecode.operands
+        instructions = []
+        append = instructions.append
+        size = len(data)
+        line_number = 0
+        try:
+            while pos < size:
+                opcode = opcode_list[data[pos]]
+                kind = operands.get(opcode, VMBytecode.NO_OPERANDS)
+                pos += 1
+                line_number += 1
+                if kind == VMBytecode.NO_OPERANDS:
+                    append(VMInstruction(opcode, None, None, None,
+                                         line_number))
+                elif kind == VMBytecode.SEGMENT_OPERANDS:
+                    segment = segment_list[data[pos]]
+                    arg = data[pos + 1]
+                    pos += 2
+                    if arg & VMBytecode.VARINT_MORE:
+                        arg, pos = read_varint(data, pos - 1)
+                    append(VMInstruction(opcode, segment, arg, None,
+                                         line_number))
+                elif kind == VMBytecode.NAME_OPERANDS:
+                    string_id, pos = read_varint(data, pos)
+                    append(VMInstruction(opcode, None, None,
+                                         strings[string_id], line_number))
+                else:
+                    string_id, pos = read_varint(data, pos)
+                    arg, pos = read_varint(data, pos)
+                    append(VMInstruction(opcode, None, arg,
+                                         strings[string_id], line_number))
+        except IndexError:
+            raise ValueError(f"command {line_number}: invalid VM bytecode") \
+                from None
+        return instructions
+
+    @staticmethod
+    def __read_varint(data: memoryview, pos: int) -> typing.Tuple[int, int]:
+        """
+        :param data: the encoded bytes
+        :param pos: the position of an unsigned LEB128 varint
+        :return: its value and the position after it
+        """
+        value = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & VMBytecode.VARINT_MASK) << shift
+            if not byte & VMBytecode.VARINT_MORE:
+                return value, pos
+            shift += VMBytecode.VARINT_BITS
+
+
+if "__main__" == __name__:
+    # Converts .vm files, or the .vm files of a directory, to .vmb files
+    # next to them.
+    if not len(sys.argv) == 2:
+        sys.exit("Invalid usage, please use: VMBytecode <input path>")
+    argument_path = os.path.abspath(sys.argv[1])
+    if os.path.isdir(argument_path):
+        files_to_convert = [
+            os.path.join(argument_path, filename)
+            for filename in os.listdir(argument_path)]
+    else:
+        files_to_convert = [argument_path]
+    for input_path in files_to_convert:
+        filename, extension = os.path.splitext(input_path)
+        if extension.lower() != ".vm":
+            continue
+        bytecode = VMBytecode()
+        with open(input_path, 'r') as input_file:
+            for instruction in VMInstruction.parse(input_file):
+                bytecode.add(instruction)
+        with open(filename + VMBytecode.EXTENSION, 'wb') as output_file:
+            bytecode.write(output_file)
@@ -0,0 +1,197 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import enum
+import typing
+
+
+class Opcode(enum.IntEnum):
+    """The VM commands. The arithmetic commands come first."""
+    ADD = 0
+    SUB = 1
+    NEG = 2
+    EQ = 3
+    GT = 4
+    LT = 5
+    AND = 6
+    OR = 7
+    NOT = 8
+    SHIFTLEFT = 9
+    SHIFTRIGHT = 10
+    PUSH = 11
+    POP = 12
+    LABEL = 13
+    GOTO = 14
+    IF_GOTO = 15
+    FUNCTION = 16
+    CALL = 17
+    RETURN = 18
+    # a push fused with the pop that follows it, made by the VM optimizer of
+    # project 8. It is not a command of the VM language.
+    MOVE = 19
+
+
+class Segment(enum.IntEnum):
+    """The memory segments of push and pop."""
+    ARGUMENT = 0
+    LOCAL = 1
+    STATIC = 2
+    CONSTANT = 3
+    THIS = 4
+    THAT = 5
+    POINTER = 6
+    TEMP = 7
+
+
+class VMInstruction:
+    """A parsed VM command: its opcode, the segment and index of push and
+    pop, the name and count of function and call, the label of the
+    branching commands, and the line of the source it was read from. A
+    MOVE also has the segment and index that it pops into.
+
+    This is the one parser of VM code, shared by the translators of
+    projects 7 and 8: a line is split once, and the keywords become enum
+    members, so the consumers never handle the text again.
+    """
+    __slots__ = ("opcode", "segment", "arg", "name", "line_number",
+                 "dest_segment", "dest_arg")
+
+    COMMENT = "//"
+    # keyword -> opcode
+    opcodes = {opcode.name.lower().replace("_", "-"): opcode
+               for opcode in Opcode if opcode != Opcode.MOVE}
+    # opcode -> keyword
+    keywords = {opcode: keyword for keyword, opcode in opcodes.items()}
+    # keyword -> segment
+    segments = {segment.name.lower(): segment for segment in Segment}
+    # segment -> keyword
+    segment_names = {segment: keyword for keyword, segment in segments.items()}
+    LAST_ARITHMETIC = Opcode.SHIFTRIGHT
+    segment_opcodes = {Opcode.PUSH, Opcode.POP}
+    function_opcodes = {Opcode.FUNCTION, Opcode.CALL}
+    # opcode -> number of operands, for the commands that have any
+    operand_counts = {Opcode.PUSH: 2, Opcode.POP: 2, Opcode.FUNCTION: 2,
+                      Opcode.CALL: 2, Opcode.LABEL: 1, Opcode.GOTO: 1,
+                      Opcode.IF_GOTO: 1}
+
+    def __init__(self, opcode: Opcode,
+                 segment: typing.Optional[Segment] = None,
+                 arg: typing.Optional[int] = None,
+                 name: typing.Optional[str] = None,
+                 line_number: int = 0,
+                 dest_segment: typing.Optional[Segment] = None,
+                 dest_arg: typing.Optional[int] = None) -> None:
+        """Creates an instruction.
+
+        Args:
+            opcode (Opcode): the command.
+            segment (typing.Optional[Segment]): the segment of push and pop.
+            arg (typing.Optional[int]): the index of push and pop, or the
+                number of arguments or locals of call and function.
+            name (typing.Optional[str]): the label of label, goto and
+                if-goto, or the function of function and call. For push and
+                pop, the file whose static segment they use, if it is not
+                the file being translated (code inlined from another file).
+            line_number (int): the line of the source, counted from 1. For
+                a command read from bytecode, the index of its record.
+            dest_segment (typing.Optional[Segment]): the segment a MOVE pops
+                into.
+            dest_arg (typing.Optional[int]): the index a MOVE pops into.
+        """
+        self.opcode = opcode
+        self.segment = segment
+        self.arg = arg
+        self.name = name
+        self.line_number = line_number
+        self.dest_segment = dest_segment
+        self.dest_arg = dest_arg
+
+    def __repr__(self) -> str:
+        return f"VMInstruction({self.opcode.name}, {self.segment!r}, " \
+               f"{self.arg!r}, {self.name!r}, {self.line_number})"
+
+    def is_arithmetic(self) -> bool:
+        """
+        Returns:
+            bool: True for the arithmetic and logical commands.
+        """
+        return self.opcode <= self.LAST_ARITHMETIC
+
+    def keyword(self) -> str:
+        """
+        Returns:
+            str: the command, as written in VM code.
+        """
+        return self.keywords[self.opcode]
+
+    def segment_name(self) -> str:
+        """
+        Returns:
+            str: the segment of push and pop, as written in VM code.
+        """
+        return self.segment_names[self.segment]
+
+    def dest_segment_name(self) -> str:
+        """
+        Returns:
+            str: the segment a MOVE pops into, as written in VM code.
+        """
+        return self.segment_names[self.dest_segment]
+
+    @classmethod
+    def parse(cls, input_file: typing.TextIO) -> \
+            typing.List["VMInstruction"]:
+        """Parses a VM file. Whitespace and comments are ignored.
+
+        Args:
+            input_file (typing.TextIO): the VM code.
+
+        Returns:
+            typing.List[VMInstruction]: the commands, in order.
+
+        Raises:
+            ValueError: for an unknown command or segment, or a missing or
+                invalid operand.
+        """
+        opcodes, segments = cls.opcodes, cls.segments
+        instructions = []
+        append = instructions.append
+        for line_number, line in enumerate(input_file.read().splitlines(),
+                                           1):
+            comment_idx = line.find(cls.COMMENT)
+            if comment_idx != -1:
+                line = line[:comment_idx]
+            words = line.split()
+            if not words:
+                continue
+            opcode = opcodes.get(words[0])
+            if opcode is None:
+                raise ValueError(f"line {line_number}: unknown VM command: "
+                                 f"{words[0]}")
+            if len(words) <= cls.operand_counts.get(opcode, 0):
+                raise ValueError(f"line {line_number}: missing operand of "
+                                 f"{words[0]}")
+            if opcode in cls.segment_opcodes or \
+                    opcode in cls.function_opcodes:
+                try:
+                    arg = int(words[2])
+                except ValueError:
+                    raise ValueError(f"line {line_number}: invalid operand "
+                                     f"of {words[0]}: {words[2]}") from None
+            if opcode in cls.segment_opcodes:
+                segment = segments.get(words[1])
+                if segment is None:
+                    raise ValueError(f"line {line_number}: unknown segment: "
+                                     f"{words[1]}")
+                append(cls(opcode, segment, arg, None, line_number))
+            elif opcode in cls.function_opcodes:
+                append(cls(opcode, None, arg, words[1], line_number))
+            elif len(words) > 1:
+                append(cls(opcode, None, None, words[1], line_number))
+            else:
+                append(cls(opcode, None, None, None, line_number))
+        return instructions
@@ -0,0 +1,262 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import inspect
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import typing
+from Parser import Parser
+from CodeWriter import CodeWriter
+from Main import translate_file
+
+SCHEMA_VERSION = 1
+DEFAULT_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "11", "Pong")
+# runs this script with another translator directory first on sys.path:
+# python -c BASELINE_RUNNER <this script> <translator directory> <options>
+BASELINE_RUNNER = ("import runpy, sys; sys.argv = sys.argv[1:]; "
+                   "sys.path[0] = sys.argv.pop(1); "
+                   "runpy.run_path(sys.argv[0], run_name='__main__')")
+
+# name -> CodeWriter keyword arguments
+MODES = {
+    "default": {},
+    "compact-compare": {"compact_compare": True},
+    "shared-call": {"shared_call": True},
+    "cache-top": {"cache_top": True},
+}
+# the parameters of the translator being timed, which is an older one when
+# this script runs for run_baseline()
+WRITER_PARAMETERS = inspect.signature(CodeWriter.__init__).parameters
+TRANSLATE_PARAMETERS = inspect.signature(translate_file).parameters
+
+
+def read_program(input_path: str) -> typing.Dict[str, str]:
+    """Reads the VM files of a program into memory, so the benchmark does
+    not time the disk.
+
+    Args:
+        input_path (str): a .vm file or a directory.
+
+    Returns:
+        typing.Dict[str, str]: file path -> VM code, in translation order.
+    """
+    if os.path.isdir(input_path):
+        paths = [os.path.join(input_path, filename)
+                 for filename in sorted(os.listdir(input_path))]
+    else:
+        paths = [input_path]
+    program = {}
+    for path in paths:
+        if os.path.splitext(path)[1].lower() == ".vm":
+            with open(path, 'r') as input_file:
+                program[path] = input_file.read()
+    return program
+
+
+def open_program(program: typing.Dict[str, str]) -> \
+        typing.List[io.StringIO]:
+    """
+    opens the in-memory files of a program
+    :param program: file path -> VM code
+    :return: a named input stream for every file
+    """
+    input_files = []
+    for path, text in program.items():
+        input_file = io.StringIO(text)
+        input_file.name = path
+        input_files.append(input_file)
+    return input_files
+
+
+def run_mode(mode: str, program: typing.Dict[str, str]) -> int:
+    """
+    translates the program once in the given mode
+    :param mode: a key of MODES
+    :param program: file path -> VM code
+    :return: the size of the assembly code, in characters
+    """
+    output_file = io.StringIO()
+    bootstrap = True
+    if "code_writer" not in TRANSLATE_PARAMETERS:
+        # the original translator, which has a CodeWriter(output_file) per
+        # file and no shared routines
+        for input_file in open_program(program):
+            translate_file(input_file, output_file, bootstrap)
+            bootstrap = False
+        return len(output_file.getvalue())
+    code_writer = CodeWriter(output_file, **MODES[mode])
+    for input_file in open_program(program):
+        translate_file(input_file, output_file, bootstrap, code_writer)
+        bootstrap = False
+    code_writer.write_shared_routines()
+    return len(output_file.getvalue())
+
+
+def count_commands(program: typing.Dict[str, str]) -> int:
+    """
+    counts the VM commands of a program, with the has_more_commands and
+    advance methods that every version of the Parser has
+    :param program: file path -> VM code
+    :return: the number of commands
+    """
+    commands = 0
+    for input_file in open_program(program):
+        parser = Parser(input_file)
+        while parser.has_more_commands():
+            parser.advance()
+            commands += 1
+    return commands
+
+
+def supported_modes(modes: typing.Iterable[str]) -> typing.List[str]:
+    """
+    :param modes: names of MODES
+    :return: the modes whose CodeWriter arguments the translator has (only
+        "default" for the original translator)
+    """
+    if "code_writer" not in TRANSLATE_PARAMETERS:
+        return [mode for mode in modes if not MODES[mode]]
+    return [mode for mode in modes
+            if all(name in WRITER_PARAMETERS for name in MODES[mode])]
+
+
+def benchmark(program: typing.Dict[str, str], modes: typing.Iterable[str],
+              repeat: int = 5) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Times the given modes on one program.
+
+    Args:
+        program (typing.Dict[str, str]): file path -> VM code.
+        modes (typing.Iterable[str]): names of MODES to run.
+        repeat (int): timed runs per mode, the best one is reported.
+
+    Returns:
+        typing.List[typing.Dict[str, typing.Any]]: per mode: the best time,
+        the VM commands per second, and the size of the output.
+    """
+    commands = count_commands(program)
+    results = []
+    for mode in modes:
+        times = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            output_chars = run_mode(mode, program)
+            times.append(time.perf_counter() - start_time)
+        best_time = min(times)
+        results.append({"mode": mode, "seconds": best_time,
+                        "commands_per_second": commands / best_time,
+                        "output_chars": output_chars})
+    return results
+
+
+def run_baseline(translator_path: str, input_path: str,
+                 modes: typing.Iterable[str], repeat: int = 5) -> \
+        typing.Dict[str, typing.Any]:
+    """Runs this benchmark on the VM translator of another checkout, in a
+    new process, since its modules have the same names as the ones here.
+    The modes that translator does not support are skipped.
+
+    Args:
+        translator_path (str): the 08 directory of the other checkout.
+        input_path (str): a .vm file or a directory.
+        modes (typing.Iterable[str]): names of MODES to run.
+        repeat (int): timed runs per mode, the best one is reported.
+
+    Returns:
+        typing.Dict[str, typing.Any]: the report of the benchmark.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-c", BASELINE_RUNNER, os.path.abspath(__file__),
+         os.path.abspath(translator_path), "--input", input_path,
+         "--modes", ",".join(modes), "--repeat", str(repeat)],
+        stdout=subprocess.PIPE, check=True, text=True)
+    return json.loads(completed.stdout)
+
+
+def compare(results: typing.List[typing.Dict[str, typing.Any]],
+            baseline_results: typing.List[typing.Dict[str, typing.Any]]) \
+        -> None:
+    """Adds to every result its speedup over the baseline: the time of the
+    baseline divided by its time. Modes the baseline did not run get none.
+
+    Args:
+        results (typing.List[typing.Dict[str, typing.Any]]): the results of
+            benchmark().
+        baseline_results (typing.List[typing.Dict[str, typing.Any]]): the
+            results of the baseline, in the same format.
+    """
+    baseline_seconds = {result["mode"]: result["seconds"]
+                        for result in baseline_results}
+    for result in results:
+        if result["mode"] in baseline_seconds:
+            result["speedup"] = baseline_seconds[result["mode"]] / \
+                result["seconds"]
+
+
+if "__main__" == __name__:
+    arg_parser = argparse.ArgumentParser(
+        description="Benchmarks the VM translator on a program and prints "
+                    "the results as JSON.")
+    arg_parser.add_argument("--input", default=DEFAULT_INPUT,
+                            help="a .vm file or a directory (default: "
+                                 "11/Pong)")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--modes", default=",".join(MODES),
+                            help="comma separated modes to run")
+    arg_parser.add_argument("--output", help="write the JSON here")
+    baseline_group = arg_parser.add_mutually_exclusive_group()
+    baseline_group.add_argument(
+        "--baseline", metavar="DIR",
+        help="also time the translator in this directory, the 08 directory "
+             "of another checkout (e.g. made with git worktree add), and "
+             "report the speedup of every mode over it")
+    baseline_group.add_argument(
+        "--reference", metavar="JSON",
+        help="report the speedup of every mode over a report written "
+             "earlier with --output, on the same program")
+    args = arg_parser.parse_args()
+
+    modes = args.modes.split(",")
+    program = read_program(os.path.abspath(args.input))
+    report = {"schema": SCHEMA_VERSION,
+              "python": platform.python_version(),
+              "program": {"input": args.input, "files": len(program),
+                          "bytes": sum(map(len, program.values()))}}
+    baseline = None
+    if args.baseline:
+        # timed first, so both runs see the same machine state
+        baseline = run_baseline(args.baseline, os.path.abspath(args.input),
+                                modes, args.repeat)
+        baseline["source"] = args.baseline
+    elif args.reference:
+        with open(args.reference, 'r') as reference_file:
+            baseline = json.load(reference_file)
+        if baseline["program"]["bytes"] != report["program"]["bytes"]:
+            sys.exit(f"{args.reference} was made on another program")
+        baseline["source"] = args.reference
+    run_modes = supported_modes(modes)
+    report["skipped_modes"] = [mode for mode in modes
+                               if mode not in run_modes]
+    report["results"] = benchmark(program, run_modes, args.repeat)
+    if baseline is not None:
+        compare(report["results"], baseline["results"])
+        report["baseline"] = {
+            "source": baseline["source"], "python": baseline["python"],
+            "skipped_modes": baseline.get("skipped_modes", []),
+            "results": baseline["results"]}
+    report_text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report_text + "\n")
+    else:
+        sys.stdout.write(report_text + "\n")
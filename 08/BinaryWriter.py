@@ -0,0 +1,129 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import os
+import sys
+import typing
+from Template import AsmCode, Template
+
+# the symbol table and ROM image format of the assembler (project 6)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "06"))
+from RomImage import RomImage  # noqa: E402
+from SymbolTable import SymbolTable  # noqa: E402
+
+
+class BinaryWriter:
+    """An output stream for the CodeWriter that assembles the code in
+    process, as it is written: the commands of every template are encoded
+    once (see Template), so writing a command only appends their words,
+    records its labels, and passes the symbols of its A-commands to the
+    assembler's SymbolTable. No assembly text is rendered or parsed, so
+    a VM program becomes a ROM image without an .asm file and a separate
+    assembler run. Labels and variables are resolved when the image is
+    written, by SymbolTable.resolve, exactly as the assembler resolves them.
+    The assembly text can still be rendered to a listing file.
+    """
+    TEXT_FORMAT = RomImage.TEXT_FORMAT
+    BINARY_FORMAT = RomImage.BINARY_FORMAT
+    WORD_FORMAT = "{:016b}\n"
+    COMMENT = "// "
+
+    def __init__(self, listing: typing.Optional[typing.TextIO] = None) -> \
+            None:
+        """Creates an empty program.
+
+        Args:
+            listing (typing.Optional[typing.TextIO]): if given, the assembly
+                text is also written to this file.
+        """
+        self.listing = listing
+        self.words = array.array(RomImage.TYPE_CODE)
+        self.symbol_table = SymbolTable()
+        # label -> the address of the command that follows it
+        self.labels = {}
+
+    def write_code(self, code: AsmCode) -> None:
+        """Assembles code, as the CodeWriter writes it.
+
+        Args:
+            code (AsmCode): assembly code.
+        """
+        words = self.words
+        for template, fields in code:
+            if self.listing is not None:
+                self.listing.write(template.render(fields))
+            address = len(words)
+            words.extend(template.words)
+            for kind, index, symbol in template.symbols:
+                symbol = Template.join(symbol, fields)
+                if kind == Template.LABEL:
+                    self.labels[symbol] = address + index
+                else:
+                    words[address + index] = self.symbol_table.a_command(
+                        symbol, address + index)
+
+    def write_comment(self, comment: str) -> None:
+        """Writes a comment to the listing, if there is one.
+
+        Args:
+            comment (str): the comment, without "// ".
+        """
+        if self.listing is not None:
+            self.listing.write(self.COMMENT + comment)
+
+    def link(self, fragment: "BinaryWriter") -> None:
+        """Appends a program assembled by another BinaryWriter (e.g. in a
+        worker process), moving its labels and the sites of its symbols to
+        the end of this program. The symbols of the fragment must not have
+        been resolved.
+
+        Args:
+            fragment (BinaryWriter): the program to append. Its listing, if
+                any, is an io.StringIO.
+        """
+        offset = len(self.words)
+        if self.listing is not None:
+            self.listing.write(fragment.listing.getvalue())
+        self.words.extend(fragment.words)
+        for label, address in fragment.labels.items():
+            self.labels[label] = address + offset
+        for symbol, sites in fragment.symbol_table.unresolved_sites.items():
+            for site in sites:
+                self.symbol_table.a_command(symbol, site + offset)
+
+    def resolve(self) -> array.array:
+        """Resolves the symbols used by the A-commands, see
+        SymbolTable.resolve.
+
+        Returns:
+            array.array: the words of the program.
+        """
+        for label, address in self.labels.items():
+            self.symbol_table.add_entry(label, address)
+        self.labels = {}
+        self.symbol_table.resolve(self.words)
+        return self.words
+
+    def write_rom(self, output_file: typing.IO,
+                  output_format: str = TEXT_FORMAT,
+                  byteorder: str = RomImage.LITTLE_ENDIAN) -> None:
+        """Writes the ROM image of the program.
+
+        Args:
+            output_file (typing.IO): the output file, opened in text mode for
+                "hack" and in binary mode for "binary".
+            output_format (str): "hack" for text, or "binary" for a packed
+                uint16 image.
+            byteorder (str): byte order of the words in a binary image.
+        """
+        words = self.resolve()
+        if output_format == self.BINARY_FORMAT:
+            RomImage.write(words, output_file, byteorder)
+        else:
+            output_file.write("".join(map(self.WORD_FORMAT.format, words)))
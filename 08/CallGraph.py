@@ -0,0 +1,90 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from Parser import Opcode, VMInstruction
+
+
+class CallGraph:
+    """The call graph of a whole program, used to translate only the
+    functions that can be reached from Sys.init. The VM language has no
+    indirect calls, so the "call" commands give the complete graph.
+    """
+    ROOT = "Sys.init"
+
+    def __init__(self) -> None:
+        """Creates an empty call graph."""
+        # function name -> names of the functions it calls
+        self.callees = {}
+        self.reachable = None
+        # function name -> number of VM commands, of the stripped functions
+        self.stripped = {}
+
+    def add_file(self, commands: typing.Iterable[VMInstruction]) -> None:
+        """Adds the functions of a VM file to the graph.
+
+        Args:
+            commands (typing.Iterable[VMInstruction]): the commands of the
+                file.
+        """
+        callees = None
+        for command in commands:
+            if command.opcode == Opcode.FUNCTION:
+                callees = self.callees.setdefault(command.name, set())
+            elif command.opcode == Opcode.CALL and callees is not None:
+                callees.add(command.name)
+
+    def resolve(self) -> None:
+        """Marks the functions reachable from Sys.init. If the program has no
+        Sys.init, every function is kept."""
+        if self.ROOT not in self.callees:
+            self.reachable = set(self.callees)
+            return
+        self.reachable = set()
+        to_visit = [self.ROOT]
+        while to_visit:
+            function_name = to_visit.pop()
+            if function_name in self.reachable:
+                continue
+            self.reachable.add(function_name)
+            to_visit.extend(self.callees.get(function_name, ()))
+
+    def strip(self, commands: typing.Iterable[VMInstruction]) -> \
+            typing.Iterator[VMInstruction]:
+        """Drops the functions that can not be reached. Commands that come
+        before the first function of a file are always kept.
+
+        Args:
+            commands (typing.Iterable[VMInstruction]): the commands of a
+                file.
+
+        Returns:
+            typing.Iterator[VMInstruction]: the commands of the reachable
+            functions.
+        """
+        if self.reachable is None:
+            self.resolve()
+        function_name = None
+        for command in commands:
+            if command.opcode == Opcode.FUNCTION:
+                function_name = command.name
+                if function_name not in self.reachable:
+                    self.stripped[function_name] = 0
+            if function_name in self.stripped:
+                self.stripped[function_name] += 1
+                continue
+            yield command
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: the stripped functions and their number of VM commands.
+        """
+        return f"stripped {len(self.stripped)} unused functions " \
+               f"({sum(self.stripped.values())} VM commands)" + "".join(
+                f"\n  {function_name} ({count} commands)"
+                for function_name, count in sorted(self.stripped.items()))
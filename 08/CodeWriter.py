@@ -6,8 +6,9 @@ as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
-import textwrap
 import os
+from BinaryWriter import BinaryWriter
+from Template import AsmCode, Template
 
 
 class CodeWriter:
@@ -16,18 +17,503 @@ class CodeWriter:
     STATIC_ADDR = 16
     TEMP_ADDR = 5
     EMPTY = ""
+    ROUTINE_PREFIX = "$"
+    GUARD_LABEL = "$END"
+    CALL_LABEL = "$CALL"
+    RETURN_LABEL = "$RETURN"
+    MAX_POINTER_STEPS = 10
+    BUFFER_SIZE = 4096
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
+    # the templates of the code, one per command shape
+    SUB_ADD = Template.variants("""
+        @SP
+        M=M-1
+        A=M
+        D=M
+        A=A-1
+        D=M{operator}D
+        M=D
+        """, "operator", {"add": "+", "sub": "-"})
+    NEG_NOT = Template.variants("""
+        @SP
+        A=M-1
+        M={operator}M
+        """, "operator", {"neg": "-", "not": "!"})
+    # the internal labels are prefix + name + suffix
+    COMPARE = Template.variants("""
+        @SP
+        M=M-1
+        A=M
+        D=M
+        @{prefix}NEG{suffix}
+        D;JLT
+        @SP
+        A=M-1
+        D=M
+        @{prefix}POS_NEG{suffix}
+        D;JLT
+        @{prefix}SAME_SIGN{suffix}
+        0;JMP
+        ({prefix}NEG{suffix})
+        @SP
+        A=M-1
+        D=M
+        @{prefix}SAME_SIGN{suffix}
+        D;JLT
+        D=1
+        @{prefix}CHECK_COMMAND{suffix}
+        0;JMP
+        ({prefix}POS_NEG{suffix})
+        D=-1
+        @{prefix}CHECK_COMMAND{suffix}
+        0;JMP
+        ({prefix}SAME_SIGN{suffix})
+        @SP
+        A=M
+        D=M
+        @SP
+        A=M-1
+        D=M-D
+        ({prefix}CHECK_COMMAND{suffix})
+        @{prefix}TRUE{suffix}
+        D;{command_jmp}
+        @SP
+        A=M-1
+        M=0
+        @{end}
+        0;JMP
+        ({prefix}TRUE{suffix})
+        @SP
+        A=M-1
+        M=-1
+        ({end})
+        """, "command_jmp", {"eq": "JEQ", "gt": "JGT", "lt": "JLT"})
+    COMPARE_ENTRY = Template("""
+        ({routine})
+        @R15
+        M=D""")
+    COMPARE_CALL = Template("""
+        @{end_label}
+        D=A
+        @{routine}
+        0;JMP
+        ({end_label})
+        """)
+    GUARD = Template("""
+        ({label})
+        @{label}
+        0;JMP
+        """)
+    SHIFT = Template.variants("""
+        @SP
+        A=M-1
+        M=M{operator}
+        """, "operator", {"shiftleft": "<<", "shiftright": ">>"})
+    AND_OR = Template.variants("""
+        @SP
+        M=M-1
+        A=M
+        D=M
+        A=A-1
+        M=D{operator}M
+        """, "operator", {"and": "&", "or": "|"})
+    FLUSH_TOP = Template("""
+        @SP
+        M=M+1
+        A=M-1
+        M=D
+        """)
+    LOAD_TOP = Template("""
+        @SP
+        AM=M-1
+        D=M""")
+    CACHED_NEG_NOT = Template.variants("""
+        D={operator}D
+        """, "operator", {"neg": "-", "not": "!"})
+    CACHED_SHIFT = Template.variants("""
+        D=D{operator}
+        """, "operator", {"shiftleft": "<<", "shiftright": ">>"})
+    # x is at RAM[SP-1] and y in D, the result replaces x
+    CACHED_BINARY = Template.variants("""
+        @SP
+        AM=M-1
+        D={comp}
+        """, "comp", {"add": "D+M", "sub": "M-D", "and": "D&M", "or": "D|M"})
+    SPILL_TOP = Template("""
+        @SP
+        M=M+1
+        A=M-1
+        M=D""")
+    LOAD_CONSTANT = Template("""
+        @{i}
+        D=A
+        """)
+    LOAD_SEGMENT = Template("""
+        @{segmentPointer}
+        D=M
+        @{i}
+        A=D+A
+        D=M
+        """)
+    LOAD_DIRECT = Template("""
+        @{address}
+        D=M
+        """)
+    STORE_DIRECT = Template("""
+        @{address}
+        M=D
+        """)
+    LOAD_POINTER = Template("""
+        @{segmentPointer}
+        A=M""")
+    POINTER_STEP = Template("""
+        A=A+1""")
+    STORE = Template("""
+        M=D
+        """)
+    STORE_INDIRECT = Template("""
+        @R13
+        M=D
+        @{segmentPointer}
+        D=M
+        @{i}
+        D=D+A
+        @R14
+        M=D
+        @R13
+        D=M
+        @R14
+        A=M
+        M=D
+        """)
+    # the base of temp is an address, the others are pointers
+    PUSH_SEGMENT = Template.variants("""
+        @{segmentPointer}
+        D={is_temp}
+        @{i}
+        A=D+A
+        D=M
+        @SP
+        A=M
+        M=D
+        @SP
+        M=M+1
+        """, "is_temp", {True: "A", False: "M"})
+    POP_SEGMENT = Template.variants("""
+        @{segmentPointer}
+        D={is_temp}
+        @{i}
+        D=D+A
+        @R13
+        M=D
+        @SP
+        M=M-1
+        A=M
+        D=M
+        @R13
+        A=M
+        M=D
+        """, "is_temp", {True: "A", False: "M"})
+    PUSH_STATIC = Template("""
+        @{file_name}.{i}
+        D=M
+        @SP
+        A=M
+        M=D
+        @SP
+        M=M+1
+        """)
+    POP_STATIC = Template("""
+        @SP
+        M=M-1
+        A=M
+        D=M
+        @{file_name}.{i}
+        M=D
+        """)
+    PUSH_CONSTANT = Template("""
+        @{i}
+        D=A
+        @SP
+        A=M
+        M=D
+        @SP
+        M=M+1
+        """)
+    PUSH_POINTER = Template("""
+        @THIS
+        D=A
+        @{i}
+        A=D+A
+        D=M
+        @SP
+        A=M
+        M=D
+        @SP
+        M=M+1
+        """)
+    POP_POINTER = Template("""
+        @THIS
+        D=A
+        @{i}
+        D=D+A
+        @R13
+        M=D
+        @SP
+        M=M-1
+        A=M
+        D=M
+        @R13
+        A=M
+        M=D
+        """)
+    LABEL = Template("""
+        ({label})
+        """)
+    GOTO = Template("""
+        @{label}
+        0;JMP
+        """)
+    IF_CACHED = Template("""
+        @{label}
+        D;JNE
+        """)
+    IF = Template("""
+        @SP
+        M=M-1
+        A=M
+        D=M
+        @{label}
+        D;JNE
+        """)
+    PUSH_ZERO = Template("""
+        @SP
+        A=M
+        M=0
+        @SP
+        M=M+1
+        """)
+    TAIL_CALL_CHECK = Template("""
+        @LCL
+        D=M
+        @ARG
+        D=D-M
+        @{frame_end}
+        D=D-A
+        @{tail_label}$move_frame
+        D;JLT""")
+    TAIL_CALL_ARGUMENT = Template("""
+        @SP
+        D=M
+        @{offset}
+        A=D-A
+        D=M
+        @ARG
+        A=M""")
+    TAIL_CALL_STORE = Template("""
+        M=D""")
+    TAIL_CALL_JUMP = Template("""
+        @LCL
+        D=M
+        @SP
+        M=D
+        @{label}
+        0;JMP
+        ({tail_label}$move_frame)""")
+    TAIL_CALL_SAVE = Template("""
+        @LCL
+        D=M
+        @{offset}
+        A=D-A
+        D=M
+        @SP
+        A=M
+        M=D
+        @SP
+        M=M+1""")
+    TAIL_CALL_MOVE = Template("""
+        @{size}
+        D=A
+        @R15
+        M=D
+        @SP
+        D=M-D
+        @R13
+        M=D
+        @ARG
+        D=M
+        @R14
+        M=D
+        ({tail_label}$move)
+        @R13
+        M=M+1
+        A=M-1
+        D=M
+        @R14
+        M=M+1
+        A=M-1
+        M=D
+        @R15
+        MD=M-1
+        @{tail_label}$move
+        D;JGT
+        @R14
+        D=M
+        @LCL
+        M=D
+        @SP
+        M=D
+        @{label}
+        0;JMP
+        """)
+    CALL = Template("""
+        @{nArgs}
+        D=A     
+        @5
+        D=D+A
+        @SP
+        D=M-D 
+        @ARG
+        M=D      
+        @SP
+        D=M
+        @LCL
+        M=D
+        @{label}
+        0;JMP
+        ({return_label})
+        """)
+    CALL_ENTRY = Template("""
+        ({routine})
+        @SP
+        A=M
+        M=D
+        @SP
+        M=M+1""")
+    CALL_EXIT = Template("""
+        @R13
+        D=M
+        @5
+        D=D+A
+        @SP
+        D=M-D
+        @ARG
+        M=D
+        @SP
+        D=M
+        @LCL
+        M=D
+        @R14
+        A=M
+        0;JMP
+        """)
+    SHARED_CALL = Template("""
+        @{nArgs}
+        D=A
+        @R13
+        M=D
+        @{label}
+        D=A
+        @R14
+        M=D
+        @{return_label}
+        D=A
+        @{routine}
+        0;JMP
+        ({return_label})
+        """)
+    # a label is pushed as an address, a segment as a pointer
+    CALL_PUSH = Template.variants("""
+        @{segmentPointer}
+        D={is_label}
+        @SP
+        A=M
+        M=D
+        @SP
+        M=M+1""", "is_label", {True: "A", False: "M"})
+    RETURN = Template("""
+        @LCL
+        D=M
+        @R14
+        M=D
+        @5
+        A=D-A
+        D=M
+        @R15
+        M=D
+        @SP
+        A=M-1
+        D=M
+        @ARG
+        A=M
+        M=D
+        @ARG
+        D=M
+        @SP
+        M=D+1""")
+    RETURN_RESTORE = Template("""
+        @R14
+        M=M-1
+        A=M
+        D=M
+        @{segmentPointer}
+        M=D""")
+    # the shared routines and return jump to the address in R15
+    JUMP_R15 = Template("""
+        @R15
+        A=M
+        0;JMP
+        """)
+    RETURN_ENTRY = Template("""
+        ({routine})""")
+    BOOTSTRAP = Template("""
+        @256
+        D=A
+        @SP
+        M=D
+        """)
+
+    def __init__(self, output_stream: typing.Union[typing.TextIO,
+                                                   BinaryWriter],
+                 compact_compare: bool = False,
+                 shared_call: bool = False,
+                 cache_top: bool = False,
+                 tail_calls: bool = False) -> None:
         """Initializes the CodeWriter.
 
         Args:
-            output_stream (typing.TextIO): output stream.
+            output_stream (typing.Union[typing.TextIO, BinaryWriter]):
+                output stream, or a BinaryWriter that assembles the code
+                without rendering it.
+            compact_compare (bool): if True, eq, gt and lt jump to one shared
+                comparison routine per operator instead of inlining it.
+            shared_call (bool): if True, call and return jump to the shared
+                $CALL and $RETURN routines instead of inlining the frame
+                save and restore.
+            cache_top (bool): if True, the top of the stack is kept in D
+                across push, pop and arithmetic commands, and written back
+                to memory only at labels, jumps, calls and other boundaries.
+            tail_calls (bool): if True, a call directly followed by return
+                is written by write_tail_call, reusing the current frame.
         """
         self.output_file = output_stream
+        self.encoded = isinstance(output_stream, BinaryWriter)
+        # rendered code, joined and written to output_file by flush()
+        self.buffer = []
+        self.compact_compare = compact_compare
+        self.shared_call = shared_call
+        self.cache_top = cache_top
+        self.tail_calls = tail_calls
+        # True when the top of the stack is in D instead of at RAM[SP]
+        self.top_cached = False
         self.filename = self.EMPTY
         self.function = self.EMPTY
         self.return_idx = 0
         self.counter = 0
+        # shared routines, by label, written once by write_shared_routines()
+        self.routines = {}
+        # ROM words saved by the shared routines, compared to inlining
+        self.saved_words = 0
         self.segment_table = {"local": "LCL", "argument": "ARG",
                               "this": "THIS", "that": "THAT",
                               "static": self.STATIC_ADDR,
@@ -35,16 +521,36 @@ class CodeWriter:
 
         self.jmp_table = {"eq": "JEQ", "gt": "JGT", "lt": "JLT"}
 
-        self.operator_table = {"add": "+", "sub": "-", "neg": "-", "not": "!",
-                               "shiftright": ">>", "shiftleft": "<<",
-                               "and": "&", "or": "|"}
+    def __write(self, code: AsmCode) -> None:
+        """
+        renders assembly code into the buffer, or has the BinaryWriter
+        assemble it
+        :param code: assembly code
+        """
+        if self.encoded:
+            self.output_file.write_code(code)
+            return
+        buffer = self.buffer
+        buffer.extend([template.render(fields) for template, fields in code])
+        if len(buffer) >= self.BUFFER_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered assembly code to the output stream."""
+        if self.encoded:
+            return
+        self.output_file.write("".join(self.buffer))
+        self.buffer.clear()
 
     def write_command_comment(self, command: str) -> None:
         """
         write a command comment before its assembly code
         :param command: a command
         """
-        self.output_file.write("// " + command)
+        if self.encoded:
+            self.output_file.write_comment(command)
+        else:
+            self.buffer.append("// " + command)
 
     def set_file_name(self, filename: str) -> None:
         """Informs the code writer that the translation of a new VM file is 
@@ -53,6 +559,11 @@ class CodeWriter:
         Args:
             filename (str): The name of the VM file.
         """
+        if self.filename != self.EMPTY:
+            # labels restart per file, as if each file had its own writer
+            self.function = self.EMPTY
+            self.return_idx = 0
+            self.counter = 0
         self.filename, input_extension = \
             os.path.splitext(os.path.basename(filename))
 
@@ -65,133 +576,172 @@ class CodeWriter:
         Args:
             command (str): an arithmetic command.
         """
+        if self.cache_top and command not in self.jmp_table:
+            self.write_command_comment(command)
+            self.__write(
+                self.__cached_arithmetic(command))
+            return
+        self.flush_stack_top()
         self.write_command_comment(command)
-        text = ""
+        code = []
         if command in {"sub", "add"}:
-            text = self.__sub_add_commands(command)
+            code = self.__sub_add_commands(command)
         elif command in {"neg", "not"}:
-            text = self.__neg_not_commands(command)
+            code = self.__neg_not_commands(command)
         elif command in {"eq", "lt", "gt"}:
-            text = self.__boolean_commands(command)
+            code = self.__boolean_commands(command)
         elif command in {"shiftleft", "shiftright"}:
-            text = self.__shift_commands(command)
+            code = self.__shift_commands(command)
         elif command in {"and", "or"}:
-            text = self.__and_or_commands(command)
-        self.output_file.write(textwrap.dedent(text))
+            code = self.__and_or_commands(command)
+        self.__write(code)
 
-    def __sub_add_commands(self, command: str) -> str:
+    def __sub_add_commands(self, command: str) -> AsmCode:
         """
         returns the assembly code for sub or add VM command.
         :param command: (str) an sub or add command.
         :return: assembly code translation of the command
         """
-        return """
-        @SP
-        M=M-1
-        A=M
-        D=M
-        A=A-1
-        D=M{operator}D
-        M=D
-        """.format(operator=self.operator_table[command])
+        return self.SUB_ADD[command].code()
 
-    def __neg_not_commands(self, command: str) -> str:
+    def __neg_not_commands(self, command: str) -> AsmCode:
         """
         returns the assembly code for neg or not VM command.
         :param command: (str) an neg or not command.
         :return: assembly code translation of the command
         """
-        return """
-        @SP
-        A=M-1
-        M={operator}M
-        """.format(operator=self.operator_table[command])
+        return self.NEG_NOT[command].code()
 
-    def __boolean_commands(self, command: str) -> str:
+    def __boolean_commands(self, command: str) -> AsmCode:
         """
         returns the assembly code for lt,gt or eq VM command.
         :param command: (str) an lt,gt or eq command.
         :return: assembly code translation of the command
         """
         self.counter += 1
-        return """
-        @SP
-        M=M-1
-        A=M
-        D=M
-        @{file_name}.NEG_{command}_{i}
-        D;JLT
-        @SP
-        A=M-1
-        D=M
-        @{file_name}.POS_NEG_{command}_{i}
-        D;JLT
-        @{file_name}.SAME_SIGN_{command}_{i}
-        0;JMP
-        ({file_name}.NEG_{command}_{i})
-        @SP
-        A=M-1
-        D=M
-        @{file_name}.SAME_SIGN_{command}_{i}
-        D;JLT
-        D=1
-        @{file_name}.CHECK_COMMAND_{command}_{i}
-        0;JMP
-        ({file_name}.POS_NEG_{command}_{i})
-        D=-1
-        @{file_name}.CHECK_COMMAND_{command}_{i}
-        0;JMP
-        ({file_name}.SAME_SIGN_{command}_{i})
-        @SP
-        A=M
-        D=M
-        @SP
-        A=M-1
-        D=M-D
-        ({file_name}.CHECK_COMMAND_{command}_{i})
-        @{file_name}.TRUE_{command}_{i}
-        D;{command_jmp}
-        @SP
-        A=M-1
-        M=0
-        @{file_name}.{command}_{i}
-        0;JMP
-        ({file_name}.TRUE_{command}_{i})
-        @SP
-        A=M-1
-        M=-1
-        ({file_name}.{command}_{i})
-        """.format(file_name=self.filename, sub=self.__sub_add_commands("sub"), command=command.upper(),
-                   command_jmp=self.jmp_table[command], i=self.counter)
+        command_name = command.upper()
+        end_label = f"{self.filename}.{command_name}_{self.counter}"
+        if not self.compact_compare:
+            return self.COMPARE[command].code(
+                prefix=f"{self.filename}.",
+                suffix=f"_{command_name}_{self.counter}", end=end_label)
+
+        routine_label = f"{self.ROUTINE_PREFIX}COMPARE_{command_name}"
+        if routine_label not in self.routines:
+            self.add_routine(
+                routine_label,
+                self.COMPARE_ENTRY.code(routine=routine_label) +
+                self.COMPARE[command].code(prefix=routine_label + "$",
+                                           suffix=self.EMPTY,
+                                           end=routine_label + "$END") +
+                self.JUMP_R15.code())
+        call_site = self.COMPARE_CALL.code(end_label=end_label,
+                                           routine=routine_label)
+        self.saved_words += len(self.COMPARE[command].words) - \
+            self.count_words(call_site)
+        return call_site
+
+    @staticmethod
+    def count_words(code: AsmCode) -> int:
+        """
+        Args:
+            code (AsmCode): assembly code.
+
+        Returns:
+            int: the number of ROM words the code assembles to.
+        """
+        return sum(len(template.words) for template, fields in code)
+
+    def add_routine(self, label: str, code: AsmCode) -> None:
+        """Registers a shared routine, written once at the end of the output
+        by write_shared_routines(). Its words are subtracted from saved_words.
+
+        Args:
+            label (str): the entry label of the routine.
+            code (AsmCode): the assembly code of the routine.
+        """
+        if not self.routines:
+            self.saved_words -= len(self.GUARD.words)
+        self.routines[label] = code
+        self.saved_words -= self.count_words(code)
+
+    def detach_fragment(self) -> typing.Tuple[typing.Dict[str, AsmCode],
+                                              int]:
+        """Hands the shared routines used by the code written so far over to
+        another CodeWriter, which links the code with write_fragment(). The
+        routines and the saved words are forgotten by this writer.
+
+        Returns:
+            typing.Tuple[typing.Dict[str, AsmCode], int]: the shared
+            routines, by label, and the ROM words saved at the call sites,
+            before the routines themselves are subtracted.
+        """
+        routines = self.routines
+        saved_words = self.saved_words + sum(
+            self.count_words(code) for code in routines.values())
+        if routines:
+            saved_words += len(self.GUARD.words)
+        self.routines = {}
+        self.saved_words = 0
+        return routines, saved_words
+
+    def write_fragment(self, fragment: typing.Union[str, BinaryWriter],
+                       routines: typing.Dict[str, AsmCode],
+                       saved_words: int) -> None:
+        """Links code translated by another CodeWriter, as returned by its
+        detach_fragment(). The shared routines it uses are added after the
+        ones already registered, so linking the fragments of the files in
+        order gives the same output as translating them with this writer.
 
-    def __shift_commands(self, command: str) -> str:
+        Args:
+            fragment (typing.Union[str, BinaryWriter]): the assembly code
+                of the fragment, or the program assembled from it, as this
+                writer renders or assembles its code.
+            routines (typing.Dict[str, AsmCode]): the shared routines it
+                uses.
+            saved_words (int): the ROM words saved at its call sites.
+        """
+        self.flush_stack_top()
+        if self.encoded:
+            self.output_file.link(fragment)
+        else:
+            self.buffer.append(fragment)
+        for label, routine in routines.items():
+            if label not in self.routines:
+                self.add_routine(label, routine)
+        self.saved_words += saved_words
+
+    def write_shared_routines(self) -> None:
+        """Writes the shared routines used by the translated code, if any.
+        Should be called once, after the last VM file was translated."""
+        self.flush_stack_top()
+        if self.routines:
+            self.write_command_comment("shared routines")
+            # keeps the execution from falling from the last translated
+            # command into the shared routines
+            self.__write(self.GUARD.code(label=self.GUARD_LABEL))
+            for code in self.routines.values():
+                self.__write(code)
+        self.flush()
+
+    def __shift_commands(self, command: str) -> AsmCode:
         """
         returns the assembly code for shiftleft or shiftright VM command.
         :param command: (str) an shiftleft or shiftright command.
         :return: assembly code translation of the command
         """
-        return """
-        @SP
-        A=M-1
-        M=M{operator}
-        """.format(operator=self.operator_table[command])
+        return self.SHIFT[command].code()
 
-    def __and_or_commands(self, command: str) -> str:
+    def __and_or_commands(self, command: str) -> AsmCode:
         """
         returns the assembly code for and or or VM command.
         :param command: (str) an and or or command.
         :return: assembly code translation of the command
         """
-        return """
-        @SP
-        M=M-1
-        A=M
-        D=M
-        A=A-1
-        M=D{operator}M
-        """.format(operator=self.operator_table[command])
+        return self.AND_OR[command].code()
 
-    def write_push_pop(self, command: str, segment: str, index: int) -> None:
+    def write_push_pop(self, command: str, segment: str, index: int,
+                       filename: typing.Optional[str] = None) -> None:
         """Writes assembly code that is the translation of the given 
         command, where command is either C_PUSH or C_POP.
 
@@ -199,47 +749,200 @@ class CodeWriter:
             command (str): "C_PUSH" or "C_POP".
             segment (str): the memory segment to operate on.
             index (int): the index in the memory segment.
+            filename (typing.Optional[str]): the file whose static segment
+                is used, if not the file being translated (inlined code).
         """
         self.write_command_comment(
             f"{command[2:].lower()} {segment} {index}")
-        text = ""
-        if command == "C_PUSH":
-            text = self.__get_push_command(segment, index)
+        code = []
+        if self.cache_top:
+            if command == "C_PUSH":
+                code = self.__cached_push(segment, index, filename)
+            elif command == "C_POP":
+                code = self.__cached_pop(segment, index, filename)
+        elif command == "C_PUSH":
+            code = self.__get_push_command(segment, index, filename)
         elif command == "C_POP":
-            text = self.__get_pop_command(segment, index)
-        self.output_file.write(textwrap.dedent(text))
+            code = self.__get_pop_command(segment, index, filename)
+        self.__write(code)
+
+    def flush_stack_top(self) -> None:
+        """Writes the top of the stack back to memory, if it is kept in D.
+        Called before every command that may be reached by a jump or that
+        reads the stack from memory, and at the end of every file."""
+        if not self.top_cached:
+            return
+        self.top_cached = False
+        self.write_command_comment("flush stack top")
+        self.__write(self.FLUSH_TOP.code())
+
+    def __load_top(self) -> AsmCode:
+        """
+        returns the code that moves the top of the stack to D, if it is not
+        there already.
+        :return: assembly code that caches the top of the stack
+        """
+        if self.top_cached:
+            return []
+        self.top_cached = True
+        return self.LOAD_TOP.code()
+
+    def __cached_arithmetic(self, command: str) -> AsmCode:
+        """
+        returns the assembly code for an arithmetic VM command other than
+        eq, gt and lt, leaving the result in D.
+        :param command: (str) an arithmetic command.
+        :return: assembly code translation of the command
+        """
+        code = self.__load_top()
+        if command in {"neg", "not"}:
+            return code + self.CACHED_NEG_NOT[command].code()
+        if command in {"shiftleft", "shiftright"}:
+            return code + self.CACHED_SHIFT[command].code()
+        return code + self.CACHED_BINARY[command].code()
+
+    def __cached_push(self, segment: str, index: int,
+                      filename: typing.Optional[str] = None) -> AsmCode:
+        """
+        returns the assembly code for the given push command, which leaves
+        the pushed value in D.
+        :param segment: the memory segment to operate on.
+        :param index: the index in the memory segment.
+        :param filename: the file of the static segment, if not the
+            file being translated.
+        :return: assembly code translation of the command
+        """
+        code = []
+        if self.top_cached:
+            code = self.SPILL_TOP.code()
+        self.top_cached = True
+        return code + self.__load_code(segment, index, filename)
+
+    def __cached_pop(self, segment: str, index: int,
+                     filename: typing.Optional[str] = None) -> AsmCode:
+        """
+        returns the assembly code for the given pop command, which stores
+        the top of the stack from D.
+        :param segment: the memory segment to operate on.
+        :param index: the index in the memory segment.
+        :param filename: the file of the static segment, if not the
+            file being translated.
+        :return: assembly code translation of the command
+        """
+        code = self.__load_top()
+        self.top_cached = False
+        return code + self.__store_code(segment, index, filename)
+
+    def __load_code(self, segment: str, index: int,
+                    filename: typing.Optional[str] = None) -> AsmCode:
+        """
+        returns the code that loads a segment cell into D
+        :param segment: the memory segment to read.
+        :param index: the index in the memory segment.
+        :param filename: the file of the static segment, if not the
+            file being translated.
+        :return: assembly code of the load
+        """
+        if segment == "constant":
+            return self.LOAD_CONSTANT.code(i=index)
+        if segment in {"local", "argument", "this", "that"}:
+            return self.LOAD_SEGMENT.code(
+                segmentPointer=self.segment_table[segment], i=index)
+        return self.LOAD_DIRECT.code(
+            address=self.__direct_address(segment, index, filename))
+
+    def __store_code(self, segment: str, index: int,
+                     filename: typing.Optional[str] = None) -> AsmCode:
+        """
+        returns the code that stores D into a segment cell
+        :param segment: the memory segment to write.
+        :param index: the index in the memory segment.
+        :param filename: the file of the static segment, if not the
+            file being translated.
+        :return: assembly code of the store
+        """
+        if segment not in {"local", "argument", "this", "that"}:
+            return self.STORE_DIRECT.code(
+                address=self.__direct_address(segment, index, filename))
+        if index <= self.MAX_POINTER_STEPS:
+            return self.LOAD_POINTER.code(
+                segmentPointer=self.segment_table[segment]) + \
+                self.POINTER_STEP.code() * index + self.STORE.code()
+        return self.STORE_INDIRECT.code(
+            segmentPointer=self.segment_table[segment], i=index)
+
+    def write_move(self, src_segment: str, src_index: int,
+                   dest_segment: str, dest_index: int) -> None:
+        """Writes assembly code that copies a segment cell to another one,
+        the translation of "push src_segment src_index" directly followed
+        by "pop dest_segment dest_index", without touching the stack.
+
+        Args:
+            src_segment (str): the memory segment to read.
+            src_index (int): the index in the memory segment to read.
+            dest_segment (str): the memory segment to write.
+            dest_index (int): the index in the memory segment to write.
+        """
+        self.flush_stack_top()
+        self.write_command_comment(f"move {src_segment} {src_index} "
+                                   f"{dest_segment} {dest_index}")
+        self.__write(
+            self.__load_code(src_segment, src_index) +
+            self.__store_code(dest_segment, dest_index))
+
+    def __direct_address(self, segment: str, index: int,
+                         filename: typing.Optional[str] = None) -> str:
+        """
+        :param segment: static, temp or pointer.
+        :param index: the index in the memory segment.
+        :param filename: the file of the static segment, if not the
+            file being translated.
+        :return: the symbol or address of the cell
+        """
+        if segment == "static":
+            return f"{filename or self.filename}.{index}"
+        if segment == "temp":
+            return str(self.TEMP_ADDR + index)
+        return "THAT" if index else "THIS"
 
-    def __get_push_command(self, segment: str, index: int) -> str:
+    def __get_push_command(self, segment: str, index: int,
+                           filename: typing.Optional[str] = None) -> AsmCode:
         """
         returns the assembly code for the given push command
         :param segment: the memory segment to operate on.
         :param index: the index in the memory segment.
+        :param filename: the file of the static segment, if not the
+            file being translated.
         :return: assembly code translation of the command
         """
         if segment in {"local", "argument", "this", "that", "temp"}:
             return self.__lcl_arg_this_that_temp_push(segment, index)
         elif segment == "static":
-            return self.__static_push(index)
+            return self.__static_push(index, filename)
         elif segment == "constant":
             return self.__constent_push(index)
         elif segment == "pointer":
             return self.__pointer_push(index)
 
-    def __get_pop_command(self, segment: str, index: int) -> str:
+    def __get_pop_command(self, segment: str, index: int,
+                          filename: typing.Optional[str] = None) -> AsmCode:
         """
         returns the assembly code for the given pop command
         :param segment: the memory segment to operate on.
         :param index: the index in the memory segment.
+        :param filename: the file of the static segment, if not the
+            file being translated.
         :return: assembly code translation of the command
         """
         if segment in {"local", "argument", "this", "that", "temp"}:
             return self.__lcl_arg_this_that_temp_pop(segment, index)
         elif segment == "static":
-            return self.__static_pop(index)
+            return self.__static_pop(index, filename)
         elif segment == "pointer":
             return self.__pointer_pop(index)
 
-    def __lcl_arg_this_that_temp_push(self, segment: str, index: int) -> str:
+    def __lcl_arg_this_that_temp_push(self, segment: str,
+                                      index: int) -> AsmCode:
         """
         returns the assembly code for push local, argument, this, that,
         temp VM command.
@@ -247,21 +950,11 @@ class CodeWriter:
         :param index:  the index in the memory segment.
         :return: assembly code translation of the command
         """
-        return """
-        @{segmentPointer}
-        D={is_temp}
-        @{i}
-        A=D+A
-        D=M
-        @SP
-        A=M
-        M=D
-        @SP
-        M=M+1
-        """.format(segmentPointer=self.segment_table[segment], i=index,
-                   is_temp=(lambda x: "A" if x == "temp" else "M")(segment))
+        return self.PUSH_SEGMENT[segment == "temp"].code(
+            segmentPointer=self.segment_table[segment], i=index)
 
-    def __lcl_arg_this_that_temp_pop(self, segment: str, index: int) -> str:
+    def __lcl_arg_this_that_temp_pop(self, segment: str,
+                                     index: int) -> AsmCode:
         """
         returns the assembly code for pop local, argument, this, that,
         temp VM command.
@@ -269,112 +962,58 @@ class CodeWriter:
         :param index:  the index in the memory segment.
         :return: assembly code translation of the command
         """
-        return """
-        @{segmentPointer}
-        D={is_temp}
-        @{i}
-        D=D+A
-        @R13
-        M=D
-        @SP
-        M=M-1
-        A=M
-        D=M
-        @R13
-        A=M
-        M=D
-        """.format(segmentPointer=self.segment_table[segment], i=index,
-                   is_temp=(lambda x: "A" if x == "temp" else "M")(segment))
+        return self.POP_SEGMENT[segment == "temp"].code(
+            segmentPointer=self.segment_table[segment], i=index)
 
-    def __static_push(self, index: int) -> str:
+    def __static_push(self, index: int,
+                      filename: typing.Optional[str] = None) -> AsmCode:
         """
         returns the assembly code for push static VM command.
         :param index:  the index in the memory segment.
+        :param filename: the file of the static segment, if not the
+            file being translated.
         :return: assembly code translation of the command
         """
-        return """
-        @{file_name}.{i}
-        D=M
-        @SP
-        A=M
-        M=D
-        @SP
-        M=M+1
-        """.format(file_name=self.filename, i=index)
+        return self.PUSH_STATIC.code(file_name=filename or self.filename,
+                                     i=index)
 
-    def __static_pop(self, index: int) -> str:
+    def __static_pop(self, index: int,
+                     filename: typing.Optional[str] = None) -> AsmCode:
         """
         returns the assembly code for pop static VM command.
         :param index: the index in the memory segment.
+        :param filename: the file of the static segment, if not the
+            file being translated.
         :return: assembly code translation of the command
         """
-        return """
-        @SP
-        M=M-1
-        A=M
-        D=M
-        @{file_name}.{i}
-        M=D
-        """.format(file_name=self.filename, i=index)
+        return self.POP_STATIC.code(file_name=filename or self.filename,
+                                    i=index)
 
-    def __constent_push(self, index: int) -> str:
+    def __constent_push(self, index: int) -> AsmCode:
         """
         returns the assembly code for push constant VM command.
         :param index:  the index in the memory segment.
         :return: assembly code translation of the command
         """
-        return """
-        @{i}
-        D=A
-        @SP
-        A=M
-        M=D
-        @SP
-        M=M+1
-        """.format(i=index)
+        return self.PUSH_CONSTANT.code(i=index)
 
-    def __pointer_push(self, index: int) -> str:
+    def __pointer_push(self, index: int) -> AsmCode:
         """
         returns the assembly code for push pointer (0/1 == THIS/THAT)
         VM command.
         :param index: the index in the memory segment.
         :return: assembly code translation of the command
         """
-        return """
-        @THIS
-        D=A
-        @{i}
-        A=D+A
-        D=M
-        @SP
-        A=M
-        M=D
-        @SP
-        M=M+1
-        """.format(i=index)
+        return self.PUSH_POINTER.code(i=index)
 
-    def __pointer_pop(self, index: int) -> str:
+    def __pointer_pop(self, index: int) -> AsmCode:
         """
         returns the assembly code for pop pointer (0/1 == THIS/THAT)
         VM command.
         :param index: the index in the memory segment.
         :return: assembly code translation of the command
         """
-        return """
-        @THIS
-        D=A
-        @{i}
-        D=D+A
-        @R13
-        M=D
-        @SP
-        M=M-1
-        A=M
-        D=M
-        @R13
-        A=M
-        M=D
-        """.format(i=index)
+        return self.POP_POINTER.code(i=index)
 
     def write_label(self, label: str) -> None:
         """Writes assembly code that affects the label command. 
@@ -387,10 +1026,10 @@ class CodeWriter:
         Args:
             label (str): the label to write.
         """
+        self.flush_stack_top()
         self.write_command_comment(f'label {label}')
-        self.output_file.write(textwrap.dedent("""
-        ({label})
-        """.format(label=f'{self.filename}.{self.function}${label}')))
+        self.__write(self.LABEL.code(
+            label=f'{self.filename}.{self.function}${label}'))
 
     def write_goto(self, label: str) -> None:
         """Writes assembly code that affects the goto command.
@@ -398,11 +1037,10 @@ class CodeWriter:
         Args:
             label (str): the label to go to.
         """
+        self.flush_stack_top()
         self.write_command_comment(f'goto {label}')
-        self.output_file.write(textwrap.dedent("""
-        @{label}
-        0;JMP
-        """).format(label=f'{self.filename}.{self.function}${label}'))
+        self.__write(self.GOTO.code(
+            label=f'{self.filename}.{self.function}${label}'))
 
     def write_if(self, label: str) -> None:
         """Writes assembly code that affects the if-goto command. 
@@ -411,14 +1049,13 @@ class CodeWriter:
             label (str): the label to go to.
         """
         self.write_command_comment(f'if-goto {label}')
-        self.output_file.write(textwrap.dedent("""
-        @SP
-        M=M-1
-        A=M
-        D=M
-        @{label}
-        D;JNE
-        """).format(label=f'{self.filename}.{self.function}${label}'))
+        if self.top_cached:
+            self.top_cached = False
+            self.__write(self.IF_CACHED.code(
+                label=f'{self.filename}.{self.function}${label}'))
+            return
+        self.__write(self.IF.code(
+            label=f'{self.filename}.{self.function}${label}'))
 
     def write_function(self, function_name: str, n_vars: int) -> None:
         """Writes assembly code that affects the function command. 
@@ -432,19 +1069,43 @@ class CodeWriter:
             function_name (str): the name of the function.
             n_vars (int): the number of local variables of the function.
         """
+        self.flush_stack_top()
         self.function = function_name
         self.write_command_comment(f'function {function_name} {n_vars}')
-        self.output_file.write(textwrap.dedent("""
-        ({label})
-        """.format(label=function_name)))
-        for i in range(n_vars):
-            self.output_file.write(textwrap.dedent("""
-        @SP
-        A=M
-        M=0
-        @SP
-        M=M+1
-        """))
+        self.__write(self.LABEL.code(label=function_name) +
+                     self.PUSH_ZERO.code() * n_vars)
+
+    def write_tail_call(self, function_name: str, n_args: int) -> None:
+        """Writes assembly code that affects a call command directly followed
+        by a return command, reusing the frame of the current function, so
+        that the callee returns directly to the caller of the current
+        function.
+        If the current function got at least n_args arguments, the arguments
+        are moved down to ARG and the callee keeps the saved frame (and LCL)
+        of the current function. Otherwise the arguments would overwrite the
+        saved frame, so the saved frame is pushed above the arguments and
+        both are moved down to ARG together.
+
+        Args:
+            function_name (str): the name of the function to call.
+            n_args (int): the number of arguments of the function.
+        """
+        tail_label = f'{self.filename}.{self.function}$tail.{self.return_idx}'
+        self.return_idx += 1
+        self.flush_stack_top()
+        self.write_command_comment(f'call {function_name} {n_args} (tail)')
+        code = self.TAIL_CALL_CHECK.code(frame_end=n_args + 5,
+                                         tail_label=tail_label)
+        for i in range(n_args):
+            code += self.TAIL_CALL_ARGUMENT.code(offset=n_args - i) + \
+                self.POINTER_STEP.code() * i + self.TAIL_CALL_STORE.code()
+        code += self.TAIL_CALL_JUMP.code(label=function_name,
+                                         tail_label=tail_label)
+        # the saved return address, LCL, ARG, THIS and THAT
+        for offset in range(5, 0, -1):
+            code += self.TAIL_CALL_SAVE.code(offset=offset)
+        self.__write(code + self.TAIL_CALL_MOVE.code(
+            size=n_args + 5, tail_label=tail_label, label=function_name))
 
     def write_call(self, function_name: str, n_args: int) -> None:
         """Writes assembly code that affects the call command. 
@@ -464,86 +1125,81 @@ class CodeWriter:
         """
         return_label = f'{self.filename}.{function_name}$ret.{self.return_idx}'
         self.return_idx += 1
+        self.flush_stack_top()
         self.write_command_comment(f'call {function_name} {n_args}')
-        self.output_file.write(
-            textwrap.dedent(self.__set_call_saved_params(return_label) + """
-        @{nArgs}
-        D=A     
-        @5
-        D=D+A
-        @SP
-        D=M-D 
-        @ARG
-        M=D      
-        @SP
-        D=M
-        @LCL
-        M=D
-        @{label}
-        0;JMP
-        ({return_label})
-        """.format(nArgs=n_args, label=function_name,
-                   return_label=return_label)))
+        code = self.__set_call_saved_params(return_label) + self.CALL.code(
+            nArgs=n_args, label=function_name, return_label=return_label)
+        if self.shared_call:
+            code = self.__shared_call(function_name, n_args, return_label,
+                                      code)
+        self.__write(code)
 
-    def __set_call_saved_params(self, return_label: str) -> str:
+    def __shared_call(self, function_name: str, n_args: int,
+                      return_label: str, inline_code: AsmCode) -> AsmCode:
+        """
+        returns the call site of the shared $CALL routine, which gets the
+        number of arguments in R13, the callee in R14 and the return address
+        in D.
+        :param function_name: the name of the function to call.
+        :param n_args: the number of arguments of the function.
+        :param return_label: return label of the call
+        :param inline_code: the inlined call, to count the saved words
+        :return: asm code of the call site
+        """
+        if self.CALL_LABEL not in self.routines:
+            self.add_routine(
+                self.CALL_LABEL,
+                self.CALL_ENTRY.code(routine=self.CALL_LABEL) +
+                self.__get_call_push_code("local", False) +
+                self.__get_call_push_code("argument", False) +
+                self.__get_call_push_code("this", False) +
+                self.__get_call_push_code("that", False) +
+                self.CALL_EXIT.code())
+        call_site = self.SHARED_CALL.code(
+            nArgs=n_args, label=function_name, return_label=return_label,
+            routine=self.CALL_LABEL)
+        self.saved_words += self.count_words(inline_code) - \
+            self.count_words(call_site)
+        return call_site
+
+    def __set_call_saved_params(self, return_label: str) -> AsmCode:
         """
         this function set call command parameters at the saved places
         :param return_label: return label of the call
         :return: asm code for the saved params
         """
-        return \
-            """{r_address}{save_lcl}{save_arg}{save_this}{save_that}""".format(
-                r_address=self.__get_call_push_code(return_label, True),
-                save_lcl=self.__get_call_push_code("local", False),
-                save_arg=self.__get_call_push_code("argument", False),
-                save_this=self.__get_call_push_code("this", False),
-                save_that=self.__get_call_push_code("that", False))
+        return self.__get_call_push_code(return_label, True) + \
+            self.__get_call_push_code("local", False) + \
+            self.__get_call_push_code("argument", False) + \
+            self.__get_call_push_code("this", False) + \
+            self.__get_call_push_code("that", False)
 
-    def __get_call_push_code(self, segment: str, is_label: bool) -> str:
+    def __get_call_push_code(self, segment: str, is_label: bool) -> AsmCode:
         """
         this function gets call command push asm code
         :param segment: call segment
         :param is_label: true if label, false otherwise
         :return: asm code
         """
-        return """
-        @{segmentPointer}
-        D={is_label}
-        @SP
-        A=M
-        M=D
-        @SP
-        M=M+1""".format(segmentPointer=(
-            lambda x: segment if x else self.segment_table[segment])(is_label),
-                        is_label=(lambda x: "A" if x else "M")(is_label))
+        return self.CALL_PUSH[is_label].code(
+            segmentPointer=segment if is_label else
+            self.segment_table[segment])
 
     def write_return(self) -> None:
         """Writes assembly code that affects the return command."""
+        self.flush_stack_top()
         self.write_command_comment('return')
-        self.output_file.write(textwrap.dedent("""
-        @LCL
-        D=M
-        @R14
-        M=D
-        @5
-        A=D-A
-        D=M
-        @R15
-        M=D
-        @SP
-        A=M-1
-        D=M
-        @ARG
-        A=M
-        M=D
-        @ARG
-        D=M
-        @SP
-        M=D+1""" + self.__set_return_params() + """
-        @R15
-        A=M
-        0;JMP
-        """))
+        code = self.RETURN.code() + self.__set_return_params() + \
+            self.JUMP_R15.code()
+        if self.shared_call:
+            if self.RETURN_LABEL not in self.routines:
+                self.add_routine(self.RETURN_LABEL, self.RETURN_ENTRY.code(
+                    routine=self.RETURN_LABEL) + code)
+            call_site = self.GOTO.code(label=self.RETURN_LABEL)
+            self.saved_words += self.count_words(code) - \
+                self.count_words(call_site)
+            code = call_site
+        self.__write(code)
 
     # def write_return(self) -> None:
     #     """Writes assembly code that affects the return command."""
@@ -607,30 +1263,24 @@ class CodeWriter:
     #     A=M
     #     0;JMP"""))
 
-    def __set_return_params(self) -> str:
+    def __set_return_params(self) -> AsmCode:
         """
         this function sets the return parameters
         :return: asm code of the return params
         """
-        return """{save_that}{save_this}{save_arg}{save_local}""".format(
-            save_that=self.__get_return_params("that"),
-            save_this=self.__get_return_params("this"),
-            save_arg=self.__get_return_params("argument"),
-            save_local=self.__get_return_params("local"))
+        return self.__get_return_params("that") + \
+            self.__get_return_params("this") + \
+            self.__get_return_params("argument") + \
+            self.__get_return_params("local")
 
-    def __get_return_params(self, segment: str) -> str:
+    def __get_return_params(self, segment: str) -> AsmCode:
         """
         this function gets the return parameters
         @segment: the return segment
         :return: asm code of the return params
         """
-        return """
-        @R14
-        M=M-1
-        A=M
-        D=M
-        @{segmentPointer}
-        M=D""".format(segmentPointer=self.segment_table[segment])
+        return self.RETURN_RESTORE.code(
+            segmentPointer=self.segment_table[segment])
 
     def bootstrap_init(self) -> None:
         """
@@ -638,16 +1288,12 @@ class CodeWriter:
         :return: asm code of the bootstrap initializer
         """
         self.write_command_comment(f'bootstrap initialize')
-        self.output_file.write(textwrap.dedent("""
-        @256
-        D=A
-        @SP
-        M=D
-        """))
+        self.__write(self.BOOTSTRAP.code())
         self.write_call("Sys.init", 0)
 
     def close(self) -> None:
         """
         close the open file
         """
+        self.flush()
         self.output_file.close()
@@ -0,0 +1,281 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import collections
+import os
+import typing
+from Parser import Opcode, Segment, VMInstruction
+
+
+class Inliner:
+    """Replaces calls to small functions with the body of the callee, over
+    the whole program.
+
+    The inlined body runs on the caller's stack: the arguments are popped
+    into static cells of the callee's file (after the statics the file
+    already uses), one per argument up to the highest one the body reads,
+    so call sites may pass different numbers of arguments (the ones the
+    body never reads are all popped into the cell of argument 0, which is
+    popped last). The locals are cleared in further static cells, and the
+    body's argument and local references are remapped to these cells. Its
+    static references keep pointing at the callee's file, its labels get a
+    unique suffix, and a return in the middle of the body becomes a goto to
+    the end. If the body writes THIS or THAT, the caller's pointer is saved
+    before and restored after it, as a return would.
+
+    A function is inlined when:
+    - its body has at most max_size commands;
+    - its stack depth is the same on every path, never drops below the
+      popped arguments, and is exactly the returned value at every return;
+    - every function it calls is inlined in turn. This is the recursion
+      guard: a function on a call cycle is never inlined, so an inlined
+      body never runs twice at once and its static cells are never shared.
+    """
+    DEFAULT_MAX_SIZE = 16
+    INLINED = "inlined"
+    LABEL_SUFFIX = "$inline."
+    END_LABEL = "END"
+    unary_opcodes = {Opcode.NEG, Opcode.NOT, Opcode.SHIFTLEFT,
+                     Opcode.SHIFTRIGHT}
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        """Creates an inliner.
+
+        Args:
+            max_size (int): the largest body, in VM commands, to inline.
+        """
+        self.max_size = max_size
+        # function name -> (file name, number of locals, body commands)
+        self.functions = {}
+        # file name -> the next unused static index of the file
+        self.next_static = {}
+        # function name -> INLINED, or the reason it was not inlined
+        self.decisions = {}
+        # function name -> first static cell of its arguments and locals, and
+        # the number of argument cells
+        self.scratch = {}
+        self.called = set()
+        self.sites = collections.Counter()
+        self.site_idx = 0
+
+    def add_file(self, filename: str,
+                 commands: typing.Iterable[VMInstruction]) -> None:
+        """Adds the functions of a VM file.
+
+        Args:
+            filename (str): the path of the VM file.
+            commands (typing.Iterable[VMInstruction]): the commands of the
+                file.
+        """
+        filename = os.path.splitext(os.path.basename(filename))[0]
+        next_static = self.next_static.get(filename, 0)
+        body = None
+        for command in commands:
+            if command.opcode == Opcode.FUNCTION:
+                body = []
+                self.functions[command.name] = (filename, command.arg, body)
+                continue
+            if command.opcode in {Opcode.PUSH, Opcode.POP} and \
+                    command.segment == Segment.STATIC:
+                next_static = max(next_static, command.arg + 1)
+            elif command.opcode == Opcode.CALL:
+                self.called.add(command.name)
+            if body is not None:
+                body.append(command)
+        self.next_static[filename] = next_static
+
+    def resolve(self) -> None:
+        """Decides which functions are inlined."""
+        for function_name in sorted(self.called):
+            self.__decide(function_name, [])
+
+    def __decide(self, function_name: str, visiting: typing.List[str]) -> \
+            bool:
+        """
+        decides if a function is inlined
+        :param function_name: the function
+        :param visiting: the functions whose decision waits for this one
+        :return: True if the function is inlined
+        """
+        if function_name in self.decisions:
+            return self.decisions[function_name] == self.INLINED
+        if function_name in visiting:
+            self.decisions[function_name] = "recursive"
+            return False
+        if function_name not in self.functions:
+            self.decisions[function_name] = "not defined"
+            return False
+        filename, n_locals, body = self.functions[function_name]
+        decision = self.INLINED
+        if len(body) > self.max_size:
+            decision = f"{len(body)} commands > {self.max_size}"
+        elif not self.__is_balanced(body):
+            decision = "unbalanced stack"
+        else:
+            for command in body:
+                if command.opcode == Opcode.CALL and \
+                        not self.__decide(command.name,
+                                          visiting + [function_name]):
+                    decision = f"calls {command.name}"
+                    break
+        if function_name in self.decisions:  # decided on a call cycle
+            return False
+        self.decisions[function_name] = decision
+        return decision == self.INLINED
+
+    @staticmethod
+    def __is_balanced(body: typing.List[VMInstruction]) -> bool:
+        """
+        checks that the stack depth of a body is known everywhere
+        :param body: the commands of a function, without the function command
+        :return: True if the depth never drops below zero, is the same at a
+            label from every path, and is one at every return
+        """
+        label_depths = {}
+        depth = 0
+        reachable = True
+        for command in body:
+            opcode = command.opcode
+            if opcode == Opcode.LABEL:
+                known_depth = label_depths.setdefault(
+                    command.name, depth if reachable else 0)
+                if reachable and known_depth != depth:
+                    return False
+                depth, reachable = known_depth, True
+                continue
+            if not reachable:
+                continue
+            if opcode == Opcode.PUSH:
+                depth += 1
+            elif opcode in {Opcode.POP, Opcode.IF_GOTO}:
+                depth -= 1
+            elif command.is_arithmetic() and \
+                    opcode not in Inliner.unary_opcodes:
+                depth -= 1
+            elif opcode == Opcode.CALL:
+                depth += 1 - command.arg
+            if depth < 0:
+                return False
+            if opcode in {Opcode.GOTO, Opcode.IF_GOTO}:
+                if label_depths.setdefault(command.name, depth) != depth:
+                    return False
+                reachable = opcode == Opcode.IF_GOTO
+            elif opcode == Opcode.RETURN:
+                if depth != 1:
+                    return False
+                reachable = False
+        return True
+
+    def inline(self, commands: typing.Iterable[VMInstruction],
+               record: bool = True) -> typing.Iterator[VMInstruction]:
+        """Replaces the calls to inlined functions with their bodies.
+
+        Args:
+            commands (typing.Iterable[VMInstruction]): the commands of a file.
+            record (bool): if True, the replaced calls are counted in the
+                report.
+
+        Returns:
+            typing.Iterator[VMInstruction]: the commands of the file.
+        """
+        for command in commands:
+            if command.opcode == Opcode.CALL and \
+                    self.decisions.get(command.name) == self.INLINED:
+                if record:
+                    self.sites[command.name] += 1
+                yield from self.__expand(command)
+            else:
+                yield command
+
+    def __expand(self, call: VMInstruction) -> \
+            typing.Iterator[VMInstruction]:
+        """
+        returns the body of the callee of a call, remapped to run in place
+        :param call: a call to an inlined function
+        :return: the commands that replace the call
+        """
+        filename, n_locals, body = self.functions[call.name]
+        if call.name not in self.scratch:
+            # at least one cell, where unread arguments are popped
+            arg_cells = 1 + max((
+                command.arg for command in body
+                if command.opcode in {Opcode.PUSH, Opcode.POP} and
+                command.segment == Segment.ARGUMENT and command.name is None),
+                default=0)
+            self.scratch[call.name] = (self.next_static[filename], arg_cells)
+            # arguments, locals, and a saved cell for THIS and for THAT
+            self.next_static[filename] += arg_cells + n_locals + 2
+        args_base, arg_cells = self.scratch[call.name]
+        locals_base = args_base + arg_cells
+        pointer_base = locals_base + n_locals
+        self.site_idx += 1
+        suffix = f"{self.LABEL_SUFFIX}{self.site_idx}"
+        line_number = call.line_number
+
+        def static(opcode: Opcode, index: int) -> VMInstruction:
+            return VMInstruction(opcode, Segment.STATIC, index, filename,
+                                 line_number)
+
+        written_pointers = sorted({
+            command.arg for command in body
+            if command.opcode == Opcode.POP and
+            command.segment == Segment.POINTER})
+        for idx in reversed(range(call.arg)):
+            yield static(Opcode.POP,
+                         args_base + (idx if idx < arg_cells else 0))
+        for idx in range(n_locals):
+            yield VMInstruction(Opcode.PUSH, Segment.CONSTANT, 0,
+                                line_number=line_number)
+            yield static(Opcode.POP, locals_base + idx)
+        for idx in written_pointers:
+            yield VMInstruction(Opcode.PUSH, Segment.POINTER, idx,
+                                line_number=line_number)
+            yield static(Opcode.POP, pointer_base + idx)
+
+        returns = sum(command.opcode == Opcode.RETURN for command in body)
+        ends_with_return = body and body[-1].opcode == Opcode.RETURN
+        renamed = []
+        for command in body:
+            opcode = command.opcode
+            if opcode in {Opcode.PUSH, Opcode.POP} and command.name is None:
+                if command.segment == Segment.ARGUMENT:
+                    command = static(opcode, args_base + command.arg)
+                elif command.segment == Segment.LOCAL:
+                    command = static(opcode, locals_base + command.arg)
+                elif command.segment == Segment.STATIC:
+                    command = static(opcode, command.arg)
+            elif opcode in {Opcode.LABEL, Opcode.GOTO, Opcode.IF_GOTO}:
+                command = VMInstruction(opcode, None, None,
+                                        command.name + suffix,
+                                        command.line_number)
+            elif opcode == Opcode.RETURN:
+                if command is body[-1]:
+                    continue
+                command = VMInstruction(Opcode.GOTO, None, None,
+                                        self.END_LABEL + suffix,
+                                        command.line_number)
+            renamed.append(command)
+        yield from self.inline(renamed, record=False)
+        if returns > 1 or not ends_with_return:
+            yield VMInstruction(Opcode.LABEL, None, None,
+                                self.END_LABEL + suffix, line_number)
+
+        for idx in written_pointers:
+            yield static(Opcode.PUSH, pointer_base + idx)
+            yield VMInstruction(Opcode.POP, Segment.POINTER, idx,
+                                line_number=line_number)
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: the decision made for every called function.
+        """
+        return "\n".join(
+            f"  {function_name}: inlined at {self.sites[function_name]} "
+            f"call sites" if decision == self.INLINED else
+            f"  {function_name}: kept, {decision}"
+            for function_name, decision in sorted(self.decisions.items()))
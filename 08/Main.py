@@ -5,26 +5,90 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import io
 import os
-import sys
+import pickle
 import typing
-from Parser import Parser
+from Parser import Opcode, Parser, VMBytecode, VMInstruction
 from CodeWriter import CodeWriter
+from BinaryWriter import BinaryWriter, RomImage
+from CallGraph import CallGraph
+from Inliner import Inliner
+from VMOptimizer import VMOptimizer
+
+ASM_FORMAT = "asm"
+VM_EXTENSION = ".vm"
+
+
+def select_vm_files(paths: typing.Iterable[str]) -> typing.List[str]:
+    """Selects the VM files to translate. When a file exists both as .vm
+    and as .vmb bytecode, the bytecode is used.
+
+    Args:
+        paths (typing.Iterable[str]): paths of files.
+
+    Returns:
+        typing.List[str]: the .vm and .vmb files, in the given order.
+    """
+    paths = list(paths)
+    bytecode_names = {
+        os.path.splitext(path)[0] for path in paths
+        if os.path.splitext(path)[1].lower() == VMBytecode.EXTENSION}
+    selected = []
+    for path in paths:
+        name, extension = os.path.splitext(path)
+        extension = extension.lower()
+        if extension == VMBytecode.EXTENSION or \
+                extension == VM_EXTENSION and name not in bytecode_names:
+            selected.append(path)
+    return selected
+
+
+def open_vm_file(input_path: str) -> typing.IO:
+    """Opens a VM file for the Parser.
+
+    Args:
+        input_path (str): a .vm or .vmb file.
+
+    Returns:
+        typing.IO: the file, opened in binary mode if it is bytecode.
+    """
+    if os.path.splitext(input_path)[1].lower() == VMBytecode.EXTENSION:
+        return open(input_path, 'rb')
+    return open(input_path, 'r')
 
 
 def translate_file(
-        input_file: typing.TextIO, output_file: typing.TextIO,
-        bootstrap: bool) -> None:
+        input_file: typing.IO, output_file: typing.TextIO,
+        bootstrap: bool,
+        code_writer: typing.Optional[CodeWriter] = None,
+        optimizer: typing.Optional[VMOptimizer] = None,
+        call_graph: typing.Optional[CallGraph] = None,
+        inliner: typing.Optional[Inliner] = None) -> None:
     """Translates a single file.
 
     Args:
-        input_file (typing.TextIO): the file to translate.
+        input_file (typing.IO): the file to translate, as opened by
+            open_vm_file.
         output_file (typing.TextIO): writes all output to this file.
         bootstrap (bool): if this is True, the current file is the 
             first file we are translating.
+        code_writer (typing.Optional[CodeWriter]): the writer to use, shared
+            by all the files of a program. A new one is created if None.
+        optimizer (typing.Optional[VMOptimizer]): if given, rewrites the
+            commands of the file before they are translated.
+        call_graph (typing.Optional[CallGraph]): if given, the functions it
+            can not reach from Sys.init are not translated.
+        inliner (typing.Optional[Inliner]): if given, replaces the calls to
+            small functions with their bodies.
     """
     parser = Parser(input_file)
-    code_writer = CodeWriter(output_file)
+    if code_writer is None:
+        code_writer = CodeWriter(output_file)
 
     # the current file is the first file (remove before passing a single file)
     if bootstrap:
@@ -32,36 +96,190 @@ def translate_file(
 
     code_writer.set_file_name(input_file.name)
 
-    while parser.has_more_commands():
-        parser.advance()
-        c_type = parser.command_type()
-        # return
-        if c_type == parser.C_RETURN:
-            code_writer.write_return()
+    commands = parser.commands()
+    if inliner is not None:
+        commands = inliner.inline(commands)
+    if call_graph is not None:
+        commands = call_graph.strip(commands)
+    if optimizer is not None:
+        commands = optimizer.optimize(commands)
+    pending_call = None
+    for command in commands:
+        if pending_call is not None:
+            if command.opcode == Opcode.RETURN:
+                code_writer.write_tail_call(pending_call.name,
+                                            pending_call.arg)
+                pending_call = None
+                continue
+            write_command(code_writer, pending_call)
+            pending_call = None
+        if code_writer.tail_calls and command.opcode == Opcode.CALL:
+            # a tail call if the next command is a return
+            pending_call = command
             continue
+        write_command(code_writer, command)
+    if pending_call is not None:
+        write_command(code_writer, pending_call)
+    code_writer.flush_stack_top()
+    code_writer.flush()
+
 
-        arg1 = parser.arg1()
-        # arithmetic
-        if c_type == parser.C_ARITHMETIC:
-            code_writer.write_arithmetic(arg1)
-        # push pop
-        elif c_type in {parser.C_POP, parser.C_PUSH}:
-            code_writer.write_push_pop(c_type, arg1, parser.arg2())
-        # label
-        elif c_type == parser.C_LABEL:
-            code_writer.write_label(arg1)
-        # goto
-        elif c_type == parser.C_GOTO:
-            code_writer.write_goto(arg1)
-        # if-goto
-        elif c_type == parser.C_IF:
-            code_writer.write_if(arg1)
-        # function
-        elif c_type == parser.C_FUNCTION:
-            code_writer.write_function(arg1, parser.arg2())
-        # call
-        elif c_type == parser.C_CALL:
-            code_writer.write_call(arg1, parser.arg2())
+def translate_fragment(
+        input_path: str, bootstrap: bool,
+        writer_options: typing.Dict[str, bool],
+        passes: typing.Optional[typing.Sequence[str]] = None,
+        call_graph: typing.Optional[CallGraph] = None,
+        inliner_state: typing.Optional[bytes] = None,
+        encoded: bool = False, listing: bool = False) -> tuple:
+    """Translates a single file into a relocatable fragment: its assembly
+    code, whose labels and statics are all named after the file, and the
+    shared routines it uses. Runs in a worker process.
+
+    Args:
+        input_path (str): the file to translate.
+        bootstrap (bool): if this is True, the fragment starts with the
+            bootstrap code.
+        writer_options (typing.Dict[str, bool]): CodeWriter keyword
+            arguments.
+        passes (typing.Optional[typing.Sequence[str]]): if given, the
+            VMOptimizer passes to run.
+        call_graph (typing.Optional[CallGraph]): if given, a resolved call
+            graph, used to strip the unreachable functions.
+        inliner_state (typing.Optional[bytes]): if given, the pickled
+            Inliner, as it is before the file is translated.
+        encoded (bool): if True, the code is assembled by a BinaryWriter
+            instead of rendered.
+        listing (bool): if True, the BinaryWriter also renders the code.
+
+    Returns:
+        tuple: the assembly code (or its BinaryWriter), the shared routines
+        and saved words from CodeWriter.detach_fragment(), then the commands
+        removed by each optimizer pass, the stripped functions and the
+        inlined call sites, or None for each stage that did not run.
+    """
+    if encoded:
+        output_file = BinaryWriter(io.StringIO() if listing else None)
+    else:
+        output_file = io.StringIO()
+    code_writer = CodeWriter(output_file, **writer_options)
+    optimizer = None if passes is None else VMOptimizer(passes)
+    inliner = None if inliner_state is None else pickle.loads(inliner_state)
+    with open_vm_file(input_path) as input_file:
+        translate_file(input_file, output_file, bootstrap, code_writer,
+                       optimizer, call_graph, inliner)
+    routines, saved_words = code_writer.detach_fragment()
+    return (output_file if encoded else output_file.getvalue(),
+            routines, saved_words,
+            None if optimizer is None else optimizer.removed,
+            None if call_graph is None else call_graph.stripped,
+            None if inliner is None else inliner.sites)
+
+
+def translate_parallel(
+        files_to_translate: typing.List[str], code_writer: CodeWriter,
+        writer_options: typing.Dict[str, bool],
+        optimizer: typing.Optional[VMOptimizer] = None,
+        call_graph: typing.Optional[CallGraph] = None,
+        inliner: typing.Optional[Inliner] = None,
+        jobs: typing.Optional[int] = None, bootstrap: bool = True) -> None:
+    """Translates the files in worker processes, then links the fragments
+    in the order of the files, the bootstrap first. The output is the same
+    as translating the files one after another with translate_file.
+
+    Args:
+        files_to_translate (typing.List[str]): the paths of the files.
+        code_writer (CodeWriter): links the fragments.
+        writer_options (typing.Dict[str, bool]): CodeWriter keyword
+            arguments for the workers.
+        optimizer (typing.Optional[VMOptimizer]): if given, its passes run
+            in the workers, and its report counts them.
+        call_graph (typing.Optional[CallGraph]): if given, the functions it
+            can not reach from Sys.init are not translated.
+        inliner (typing.Optional[Inliner]): if given, replaces the calls to
+            small functions with their bodies.
+        jobs (typing.Optional[int]): the number of worker processes, one per
+            CPU if None.
+        bootstrap (bool): if this is True, the first fragment starts with
+            the bootstrap code.
+    """
+    if call_graph is not None:
+        call_graph.resolve()
+    inliner_states = []
+    for input_path in files_to_translate:
+        if inliner is None:
+            inliner_states.append(None)
+            continue
+        inliner_states.append(pickle.dumps(inliner))
+        # inlining allocates labels and static cells across the files, so
+        # the state for the next file is the one after this file
+        with open_vm_file(input_path) as input_file:
+            collections.deque(inliner.inline(Parser(input_file).commands(),
+                                             record=False), maxlen=0)
+    passes = None if optimizer is None else optimizer.passes
+    encoded = code_writer.encoded
+    listing = encoded and code_writer.output_file.listing is not None
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        futures = [
+            executor.submit(translate_fragment, input_path,
+                            bootstrap and idx == 0,
+                            writer_options, passes, call_graph, inliner_state,
+                            encoded, listing)
+            for idx, (input_path, inliner_state) in enumerate(
+                zip(files_to_translate, inliner_states))]
+        for future in futures:
+            fragment, routines, saved_words, removed, stripped, sites = \
+                future.result()
+            code_writer.write_fragment(fragment, routines, saved_words)
+            if optimizer is not None:
+                for name, count in removed.items():
+                    optimizer.removed[name] += count
+            if call_graph is not None:
+                call_graph.stripped.update(stripped)
+            if inliner is not None:
+                inliner.sites.update(sites)
+
+
+def write_command(code_writer: CodeWriter,
+                  instruction: VMInstruction) -> None:
+    """Translates a single command.
+
+    Args:
+        code_writer (CodeWriter): writes the translation.
+        instruction (VMInstruction): the command to translate.
+    """
+    opcode = instruction.opcode
+    name = instruction.name
+    # return
+    if opcode == Opcode.RETURN:
+        code_writer.write_return()
+    # arithmetic
+    elif instruction.is_arithmetic():
+        code_writer.write_arithmetic(instruction.keyword())
+    # push pop
+    elif opcode in {Opcode.POP, Opcode.PUSH}:
+        code_writer.write_push_pop(Parser.type_table[opcode],
+                                   instruction.segment_name(),
+                                   instruction.arg, name)
+    # push directly followed by pop
+    elif opcode == Opcode.MOVE:
+        code_writer.write_move(instruction.segment_name(), instruction.arg,
+                               instruction.dest_segment_name(),
+                               instruction.dest_arg)
+    # label
+    elif opcode == Opcode.LABEL:
+        code_writer.write_label(name)
+    # goto
+    elif opcode == Opcode.GOTO:
+        code_writer.write_goto(name)
+    # if-goto
+    elif opcode == Opcode.IF_GOTO:
+        code_writer.write_if(name)
+    # function
+    elif opcode == Opcode.FUNCTION:
+        code_writer.write_function(name, instruction.arg)
+    # call
+    elif opcode == Opcode.CALL:
+        code_writer.write_call(name, instruction.arg)
 
 
 if "__main__" == __name__:
@@ -70,9 +288,65 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: VMtranslator <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    arg_parser = argparse.ArgumentParser(
+        prog="VMtranslator", description="Translates VM code to assembly.")
+    arg_parser.add_argument(
+        "path", help="a .vm or .vmb file or a directory, where a .vmb file "
+                     "replaces the .vm file of the same name")
+    arg_parser.add_argument(
+        "--compact-compare", action="store_true",
+        help="use one shared routine per comparison operator instead of "
+             "inlining eq, gt and lt")
+    arg_parser.add_argument(
+        "--shared-call", action="store_true",
+        help="use shared $CALL and $RETURN routines instead of inlining the "
+             "frame save and restore at every call and return")
+    arg_parser.add_argument(
+        "--cache-top", action="store_true",
+        help="keep the top of the stack in D between consecutive push, pop "
+             "and arithmetic commands")
+    arg_parser.add_argument(
+        "--optimize", nargs="?", const=",".join(VMOptimizer.ALL_PASSES),
+        metavar="PASSES",
+        help="run the VM optimizer with these comma separated passes "
+             "(default: all of %(const)s)")
+    arg_parser.add_argument(
+        "--strip-unused", action="store_true",
+        help="translate only the functions that can be reached from "
+             "Sys.init")
+    arg_parser.add_argument(
+        "--inline", nargs="?", type=int, const=Inliner.DEFAULT_MAX_SIZE,
+        metavar="MAX_SIZE",
+        help="inline the functions of at most MAX_SIZE commands (default: "
+             "%(const)s) that only call inlined functions")
+    arg_parser.add_argument(
+        "--tail-calls", action="store_true",
+        help="reuse the current frame for a call directly followed by a "
+             "return")
+    arg_parser.add_argument(
+        "--format", choices=(ASM_FORMAT, BinaryWriter.TEXT_FORMAT,
+                             BinaryWriter.BINARY_FORMAT), default=ASM_FORMAT,
+        help="write assembly (default), or assemble directly into a .hack "
+             "text image or a packed binary ROM image")
+    arg_parser.add_argument(
+        "--listing", action="store_true",
+        help="with a ROM image format, also write the assembly to the .asm "
+             "file")
+    arg_parser.add_argument(
+        "--jobs", nargs="?", type=int, const=os.cpu_count(), metavar="N",
+        help="translate the files in N worker processes (default: "
+             "%(const)s) and link them, with the same output as translating "
+             "them one after another")
+    arg_parser.add_argument(
+        "--no-bootstrap", action="store_true",
+        help="do not write the bootstrap code, for programs without Sys.init "
+             "that set up the stack themselves")
+    args = arg_parser.parse_args()
+    optimizer = None
+    if args.optimize is not None:
+        optimizer = VMOptimizer(name for name in args.optimize.split(",")
+                                if name)
+    argument_path = os.path.abspath(args.path)
     if os.path.isdir(argument_path):
         files_to_translate = [
             os.path.join(argument_path, filename)
@@ -82,13 +356,63 @@ if "__main__" == __name__:
     else:
         files_to_translate = [argument_path]
         output_path, extension = os.path.splitext(argument_path)
-    output_path += ".asm"
-    bootstrap = True
-    with open(output_path, 'w') as output_file:
+    files_to_translate = select_vm_files(files_to_translate)
+    inliner = None
+    if args.inline is not None:
+        inliner = Inliner(args.inline)
         for input_path in files_to_translate:
-            filename, extension = os.path.splitext(input_path)
-            if extension.lower() != ".vm":
-                continue
-            with open(input_path, 'r') as input_file:
-                translate_file(input_file, output_file, bootstrap)
-            bootstrap = False
+            with open_vm_file(input_path) as input_file:
+                inliner.add_file(input_path, Parser(input_file).commands())
+        inliner.resolve()
+    call_graph = None
+    if args.strip_unused:
+        call_graph = CallGraph()
+        for input_path in files_to_translate:
+            with open_vm_file(input_path) as input_file:
+                commands = Parser(input_file).commands()
+                if inliner is not None:
+                    # functions inlined at every call site are unreachable
+                    commands = inliner.inline(commands, record=False)
+                call_graph.add_file(commands)
+    bootstrap = not args.no_bootstrap
+    with contextlib.ExitStack() as exit_stack:
+        if args.format == ASM_FORMAT:
+            output_file = exit_stack.enter_context(
+                open(output_path + ".asm", 'w'))
+        else:
+            listing = None
+            if args.listing:
+                listing = exit_stack.enter_context(
+                    open(output_path + ".asm", 'w'))
+            output_file = BinaryWriter(listing)
+        writer_options = {"compact_compare": args.compact_compare,
+                          "shared_call": args.shared_call,
+                          "cache_top": args.cache_top,
+                          "tail_calls": args.tail_calls}
+        code_writer = CodeWriter(output_file, **writer_options)
+        if args.jobs is not None:
+            translate_parallel(files_to_translate, code_writer,
+                               writer_options, optimizer, call_graph,
+                               inliner, args.jobs, bootstrap)
+        else:
+            for input_path in files_to_translate:
+                with open_vm_file(input_path) as input_file:
+                    translate_file(input_file, output_file, bootstrap,
+                                   code_writer, optimizer, call_graph,
+                                   inliner)
+                bootstrap = False
+        code_writer.write_shared_routines()
+    if args.format == BinaryWriter.TEXT_FORMAT:
+        with open(output_path + ".hack", 'w') as rom_file:
+            output_file.write_rom(rom_file)
+    elif args.format == BinaryWriter.BINARY_FORMAT:
+        with open(output_path + RomImage.EXTENSION, 'wb') as rom_file:
+            output_file.write_rom(rom_file, args.format)
+    if args.compact_compare or args.shared_call:
+        print(f"Shared routines saved {code_writer.saved_words} ROM words")
+    if optimizer is not None:
+        print(f"VM optimizer removed commands: {optimizer.report()}")
+    if inliner is not None:
+        print(f"Inliner decisions:\n{inliner.report()}")
+    if call_graph is not None:
+        print(f"Call graph: {call_graph.report()}")
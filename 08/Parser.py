@@ -5,132 +5,53 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import importlib.util
+import os
+import sys
 import typing
 
+# the parser and the VM instruction records of project 7
+PROJECT_7 = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         os.pardir, "07")
+sys.path.append(PROJECT_7)
+from VMInstruction import Opcode, Segment, VMInstruction  # noqa: E402
+from VMBytecode import VMBytecode  # noqa: E402
 
-class Parser:
-    """
-    # Parser
-    
-    Handles the parsing of a single .vm file, and encapsulates access to the
-    input code. It reads VM commands, parses them, and provides convenient 
-    access to their components. 
-    In addition, it removes all white space and comments.
-
-    ## VM Language Specification
+# the module of the parser of project 7 is also named Parser, so it is
+# loaded from its path, under another name
+base_spec = importlib.util.spec_from_file_location(
+    "VMParser", os.path.join(PROJECT_7, "Parser.py"))
+base_module = importlib.util.module_from_spec(base_spec)
+base_spec.loader.exec_module(base_module)
 
-    A .vm file is a stream of characters. If the file represents a
-    valid program, it can be translated into a stream of valid assembly 
-    commands. VM commands may be separated by an arbitrary number of whitespace
-    characters and comments, which are ignored. Comments begin with "//" and
-    last until the line’s end.
-    The different parts of each VM command may also be separated by an
-    arbitrary number of non-newline whitespace characters.
 
-    - Arithmetic commands:
-      - add, sub, and, or, eq, gt, lt
-      - neg, not, shiftleft, shiftright
-    - Memory segment manipulation:
-      - push <segment> <number>
-      - pop <segment that is not constant> <number>
-      - <segment> can be any of: argument, local, static, constant, this, that, 
-                                 pointer, temp
-    - Branching (only relevant for project 8):
-      - label <label-name>
-      - if-goto <label-name>
-      - goto <label-name>
-      - <label-name> can be any combination of non-whitespace characters.
-    - Functions (only relevant for project 8):
-      - call <function-name> <n-args>
-      - function <function-name> <n-vars>
-      - return
+class Parser(base_module.Parser):
+    """The Parser of project 7, which also reads .vmb bytecode, and hands
+    the parsed VMInstruction records to the optimization passes.
     """
 
-    C_ARITHMETIC = "C_ARITHMETIC"
-    C_PUSH = "C_PUSH"
-    C_POP = "C_POP"
-    C_LABEL = "C_LABEL"
-    C_GOTO = "C_GOTO"
-    C_IF = "C_IF"
-    C_FUNCTION = "C_FUNCTION"
-    C_RETURN = "C_RETURN"
-    C_CALL = "C_CALL"
-    command_table = {"push": C_PUSH, "pop": C_POP, "label": C_LABEL,
-                     "goto": C_GOTO, "if-goto": C_IF, "function": C_FUNCTION,
-                     "return": C_RETURN, "call": C_CALL}
-    INITIAL_VAL = -1
-    COMMENT = "//"
-    NULL = "null"
-    EMPTY_LST = []
-    EMPTY = ""
-    NOT_FOUND = -1
-
-    def __init__(self, input_file: typing.TextIO) -> None:
-        """Gets ready to parse the input file.
+    @staticmethod
+    def read(input_file: typing.IO) -> typing.List[VMInstruction]:
+        """Parses the input file.
 
         Args:
-            input_file (typing.TextIO): input file.
-        """
-        self.input_lines = input_file.read().splitlines()
-        self.n = self.INITIAL_VAL
-        self.cur_command_lst = self.EMPTY_LST
-
-    def has_more_commands(self) -> bool:
-        """Are there more commands in the input?
-
-        Returns:
-            bool: True if there are more commands, False otherwise.
-        """
-        while len(self.input_lines) - 1 != self.n:
-            self.n += 1
-            cur_command = self.input_lines[self.n].strip()
-            if cur_command != self.EMPTY and cur_command[
-                                             0:2] != self.COMMENT:
-                return True
-        return False
+            input_file (typing.IO): input file, a .vm file opened in text
+                mode or a .vmb file opened in binary mode.
 
-    def advance(self) -> None:
-        """Reads the next command from the input and makes it the current 
-        command. Should be called only if has_more_commands() is true.
-        Initially there is no current command.
-        """
-        # remove inline comments:
-        cur_command = self.input_lines[self.n].strip()
-        inline_comment_idx = cur_command.find(self.COMMENT)
-        if inline_comment_idx != self.NOT_FOUND:
-            cur_command = cur_command[0:inline_comment_idx]
-
-        self.cur_command_lst = cur_command.split()
-
-    def command_type(self) -> str:
-        """
         Returns:
-            str: the type of the current VM command.
-            "C_ARITHMETIC" is returned for all arithmetic commands.
-            For other commands, can return:
-            "C_PUSH", "C_POP", "C_LABEL", "C_GOTO", "C_IF", "C_FUNCTION",
-            "C_RETURN", "C_CALL".
+            typing.List[VMInstruction]: the commands, in order.
         """
-        if self.cur_command_lst[0] not in self.command_table:
-            return self.C_ARITHMETIC
-        return self.command_table[self.cur_command_lst[0]]
+        if VMBytecode.is_bytecode(input_file):
+            return VMBytecode.read(input_file)
+        return VMInstruction.parse(input_file)
 
-    def arg1(self) -> str:
-        """
-        Returns:
-            str: the first argument of the current command. In case of 
-            "C_ARITHMETIC", the command itself (add, sub, etc.) is returned. 
-            Should not be called if the current command is "C_RETURN".
-        """
-        if self.command_type() == self.C_ARITHMETIC:
-            return self.cur_command_lst[0]
-        return self.cur_command_lst[1]
+    def commands(self) -> typing.Iterator[VMInstruction]:
+        """Parses the rest of the input.
 
-    def arg2(self) -> int:
-        """
         Returns:
-            int: the second argument of the current command. Should be
-            called only if the current command is "C_PUSH", "C_POP", 
-            "C_FUNCTION" or "C_CALL".
+            typing.Iterator[VMInstruction]: the record of every remaining
+            command, in order.
         """
-        return int(self.cur_command_lst[2])
+        while self.has_more_commands():
+            self.advance()
+            yield self.current
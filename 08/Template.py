@@ -0,0 +1,172 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import string
+import sys
+import textwrap
+import typing
+
+# the C-commands are encoded, and the predefined symbols resolved, by the
+# tables of the assembler (project 6)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "06"))
+from Code import Code  # noqa: E402
+from Instruction import Instruction  # noqa: E402
+from SymbolTable import SymbolTable  # noqa: E402
+
+
+class Template:
+    """The assembly code of one command shape, prepared once, when the
+    CodeWriter class is built: the text is dedented and split into a tuple
+    that alternates literal fragments and field names, so rendering a
+    command only joins the fragments with the field values. Code is passed
+    around as a list of (template, fields) pairs, see code(), and rendered
+    only when it is written.
+
+    The commands are also encoded here once, for the BinaryWriter, into a
+    tuple of words. Fields may only appear in the symbol of an A-command or
+    a label, which are left as (kind, index, fragments) records: a SYMBOL
+    is the A-command of the word at the index, whose word is resolved by
+    the SymbolTable, and a LABEL labels the word at the index. A-commands of
+    numbers and predefined symbols are encoded like the C-commands.
+    """
+    __slots__ = ("fragments", "words", "symbols")
+    SYMBOL = 0
+    LABEL = 1
+    # the predefined symbols of the assembler
+    PREDEFINED = SymbolTable()
+
+    def __init__(self, text: str) -> None:
+        """Prepares a template.
+
+        Args:
+            text (str): assembly code, indented as in the source, with
+                "{field}" placeholders.
+
+        Raises:
+            ValueError: if a C-command has a field.
+        """
+        text = textwrap.dedent(text)
+        self.fragments = self.__split(text)
+        words = []
+        symbols = []
+        for line in text.splitlines():
+            line = Instruction.clean(line)
+            if not line:
+                continue
+            if line[0] == "(":
+                symbols.append((self.LABEL, len(words),
+                                self.__split(line[1:-1])))
+                continue
+            word = self.__encode(line)
+            if word is None:
+                symbols.append((self.SYMBOL, len(words),
+                                self.__split(line[1:])))
+                word = SymbolTable.UNRESOLVED
+            words.append(word)
+        self.words = tuple(words)
+        self.symbols = tuple(symbols)
+
+    @staticmethod
+    def __split(text: str) -> typing.Tuple[str, ...]:
+        """
+        splits a text into literal fragments and field names
+        :param text: a text with "{field}" placeholders
+        :return: the literal fragments, alternating with the field names
+        """
+        fragments = []
+        for literal, field, format_spec, conversion in \
+                string.Formatter().parse(text):
+            fragments.append(literal)
+            if field is not None:
+                fragments.append(field)
+        if len(fragments) % 2 == 0:
+            fragments.append("")
+        return tuple(fragments)
+
+    def __encode(self, line: str) -> typing.Optional[int]:
+        """
+        encodes a command, unless it is an A-command that is resolved later
+        :param line: a command, without white space and comments
+        :return: the word of the command, or None
+        """
+        if line[0] == "@":
+            symbol = line[1:]
+            if symbol.isnumeric():
+                return int(symbol)
+            if self.PREDEFINED.contains(symbol):
+                return self.PREDEFINED.get_address(symbol)
+            return None
+        if "{" in line:
+            raise ValueError(f"a field in a C-command: {line}")
+        return Code.c_command(*Instruction.split_c_command(line))
+
+    @classmethod
+    def variants(cls, text: str, field: str,
+                 values: typing.Dict[typing.Any, str]) -> \
+            typing.Dict[typing.Any, "Template"]:
+        """Prepares a template per value of a field that is part of a
+        C-command, so every template has a single shape.
+
+        Args:
+            text (str): assembly code, indented as in the source.
+            field (str): the name of the field.
+            values (typing.Dict[typing.Any, str]): the value of the field, by
+                the key of its template.
+
+        Returns:
+            typing.Dict[typing.Any, Template]: the templates, by key.
+        """
+        placeholder = "{" + field + "}"
+        return {key: cls(text.replace(placeholder, value))
+                for key, value in values.items()}
+
+    def code(self, **fields: typing.Any) -> "AsmCode":
+        """
+        Args:
+            **fields (typing.Any): the value of every field.
+
+        Returns:
+            AsmCode: the code of a single command of this shape.
+        """
+        return [(self, fields)]
+
+    def render(self, fields: typing.Dict[str, typing.Any]) -> str:
+        """
+        Args:
+            fields (typing.Dict[str, typing.Any]): the value of every field.
+
+        Returns:
+            str: the assembly code.
+        """
+        return self.join(self.fragments, fields)
+
+    @staticmethod
+    def join(fragments: typing.Tuple[str, ...],
+             fields: typing.Dict[str, typing.Any]) -> str:
+        """
+        Args:
+            fragments (typing.Tuple[str, ...]): literal fragments,
+                alternating with field names, e.g. of a SYMBOL.
+            fields (typing.Dict[str, typing.Any]): the value of every field.
+
+        Returns:
+            str: the fragments, with the values of the fields.
+        """
+        if len(fragments) == 1:
+            return fragments[0]
+        if len(fragments) == 3:
+            return fragments[0] + str(fields[fragments[1]]) + fragments[2]
+        parts = list(fragments)
+        for idx in range(1, len(parts), 2):
+            parts[idx] = str(fields[parts[idx]])
+        return "".join(parts)
+
+
+# assembly code, as (template, fields) pairs
+AsmCode = typing.List[typing.Tuple[Template, typing.Dict[str, typing.Any]]]
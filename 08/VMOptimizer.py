@@ -0,0 +1,184 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from Parser import Opcode, Segment, VMInstruction
+
+
+class VMOptimizer:
+    """Rewrites the parsed instructions of a VM file before they are
+    translated.
+
+    Passes:
+    - "fold": "push constant a, push constant b, add" (and the other binary
+      and unary arithmetic commands) is replaced by "push constant c", when
+      c is a valid constant (0..32767). Chains fold in a single pass.
+    - "move": "push X, pop Y" is replaced by a single MOVE instruction,
+      which the CodeWriter translates into a direct copy through D. A push
+      popped back into the same place is dropped. Commands inlined from
+      another file are not fused.
+    - "dead": commands after "goto" or "return" are dropped up to the next
+      label or function, since nothing can reach them.
+    """
+    FOLD = "fold"
+    MOVE = "move"
+    DEAD = "dead"
+    ALL_PASSES = (FOLD, MOVE, DEAD)
+
+    MAX_CONSTANT = 32767
+    WORD_MASK = 0xFFFF
+    SIGN_BIT = 0x8000
+    TRUE = -1
+    FALSE = 0
+
+    binary_operators = {
+        Opcode.ADD: lambda x, y: x + y,
+        Opcode.SUB: lambda x, y: x - y,
+        Opcode.AND: lambda x, y: x & y,
+        Opcode.OR: lambda x, y: x | y,
+        Opcode.EQ: lambda x, y: VMOptimizer.TRUE if x == y else
+        VMOptimizer.FALSE,
+        Opcode.GT: lambda x, y: VMOptimizer.TRUE if x > y else
+        VMOptimizer.FALSE,
+        Opcode.LT: lambda x, y: VMOptimizer.TRUE if x < y else
+        VMOptimizer.FALSE}
+    unary_operators = {
+        Opcode.NEG: lambda x: -x,
+        Opcode.NOT: lambda x: ~x,
+        Opcode.SHIFTLEFT: lambda x: x << 1,
+        Opcode.SHIFTRIGHT: lambda x: x >> 1}
+
+    def __init__(self, passes: typing.Iterable[str] = ALL_PASSES) -> None:
+        """Creates an optimizer.
+
+        Args:
+            passes (typing.Iterable[str]): the names of the passes to run.
+        """
+        self.passes = tuple(passes)
+        for name in self.passes:
+            if name not in self.ALL_PASSES:
+                raise ValueError(f"unknown VM optimizer pass: {name}")
+        self.removed = dict.fromkeys(self.passes, 0)
+
+    def optimize(self, commands: typing.Iterable[VMInstruction]) -> \
+            typing.List[VMInstruction]:
+        """Runs the passes, in order.
+
+        Args:
+            commands (typing.Iterable[VMInstruction]): the commands of a
+                file.
+
+        Returns:
+            typing.List[VMInstruction]: the optimized commands.
+        """
+        commands = list(commands)
+        for name in self.passes:
+            size = len(commands)
+            commands = getattr(self, f"_VMOptimizer__{name}")(commands)
+            self.removed[name] += size - len(commands)
+        return commands
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: how many VM commands each pass removed.
+        """
+        return ", ".join(f"{name}: -{count}"
+                         for name, count in self.removed.items())
+
+    @staticmethod
+    def __to_word(value: int) -> int:
+        """
+        :param value: the result of an operation on signed words
+        :return: the value wrapped to a signed 16 bit word
+        """
+        value &= VMOptimizer.WORD_MASK
+        return value - (value & VMOptimizer.SIGN_BIT) * 2
+
+    def __is_constant(self, command: VMInstruction) -> bool:
+        return command.opcode == Opcode.PUSH and \
+            command.segment == Segment.CONSTANT
+
+    def __fold(self, commands: typing.List[VMInstruction]) -> \
+            typing.List[VMInstruction]:
+        """
+        replaces arithmetic on pushed constants with the pushed result
+        :param commands: the commands of a file
+        :return: the optimized commands
+        """
+        optimized = []
+        for command in commands:
+            if command.is_arithmetic():
+                result = None
+                if command.opcode in self.unary_operators and optimized and \
+                        self.__is_constant(optimized[-1]):
+                    result = self.unary_operators[command.opcode](
+                        optimized[-1].arg)
+                    operands = 1
+                elif command.opcode in self.binary_operators and \
+                        len(optimized) > 1 and \
+                        self.__is_constant(optimized[-1]) and \
+                        self.__is_constant(optimized[-2]):
+                    result = self.binary_operators[command.opcode](
+                        optimized[-2].arg, optimized[-1].arg)
+                    operands = 2
+                if result is not None:
+                    result = self.__to_word(result)
+                    if 0 <= result <= self.MAX_CONSTANT:
+                        del optimized[-operands:]
+                        optimized.append(VMInstruction(
+                            Opcode.PUSH, Segment.CONSTANT, result,
+                            line_number=command.line_number))
+                        continue
+            optimized.append(command)
+        return optimized
+
+    def __move(self, commands: typing.List[VMInstruction]) -> \
+            typing.List[VMInstruction]:
+        """
+        fuses every push that is directly popped into a single move
+        :param commands: the commands of a file
+        :return: the optimized commands
+        """
+        optimized = []
+        idx = 0
+        while idx < len(commands):
+            command = commands[idx]
+            if command.opcode == Opcode.PUSH and \
+                    idx + 1 < len(commands) and \
+                    commands[idx + 1].opcode == Opcode.POP and \
+                    command.name is None and \
+                    commands[idx + 1].name is None:
+                pop = commands[idx + 1]
+                if (command.segment, command.arg) != (pop.segment, pop.arg):
+                    optimized.append(VMInstruction(
+                        Opcode.MOVE, command.segment, command.arg, None,
+                        command.line_number, pop.segment, pop.arg))
+                idx += 2
+                continue
+            optimized.append(command)
+            idx += 1
+        return optimized
+
+    def __dead(self, commands: typing.List[VMInstruction]) -> \
+            typing.List[VMInstruction]:
+        """
+        removes the commands that follow goto or return and can not be
+        reached
+        :param commands: the commands of a file
+        :return: the optimized commands
+        """
+        optimized = []
+        reachable = True
+        for command in commands:
+            if command.opcode in {Opcode.LABEL, Opcode.FUNCTION}:
+                reachable = True
+            if reachable:
+                optimized.append(command)
+            if command.opcode in {Opcode.GOTO, Opcode.RETURN}:
+                reachable = False
+        return optimized
@@ -0,0 +1,118 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# the emulator assembles the .asm files with the assembler of project 6, so
+# its Main and Parser come before the translator's ones, which run in their
+# own process
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "06"))
+from TestScript import TestScript  # noqa: E402
+
+COMPARE_EXTENSION = '.cmp'
+SCRIPT_EXTENSION = '.tst'
+VM_EXTENSION = '.vm'
+# the tests without it set up the stack themselves, and need no bootstrap
+SYS_FILENAME = 'Sys.vm'
+NO_BOOTSTRAP = '--no-bootstrap'
+# scripts of the VM emulator, which runs the .vm files and not the .asm
+VM_EMULATOR_SUFFIX = 'VME'
+TRANSLATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'Main.py')
+# every translator option on its own, then all of them together
+FLAG_SETS = [
+    [],
+    ['--compact-compare'],
+    ['--shared-call'],
+    ['--cache-top'],
+    ['--optimize'],
+    ['--strip-unused'],
+    ['--inline'],
+    ['--tail-calls'],
+    ['--jobs', '2'],
+    ['--compact-compare', '--shared-call', '--cache-top', '--optimize',
+     '--strip-unused', '--inline', '--tail-calls', '--jobs', '2'],
+]
+
+
+def run_files_in_folder(folder_path):
+    assert os.path.isdir(folder_path)
+    print("Testing folder:", os.path.basename(folder_path), end=' ')
+
+    scripts = [
+        filename for filename in sorted(os.listdir(folder_path))
+        if filename.endswith(SCRIPT_EXTENSION) and not
+        filename.endswith(VM_EMULATOR_SUFFIX + SCRIPT_EXTENSION)]
+
+    counter = 0
+    all_true = True
+    has_sys = os.path.isfile(os.path.join(folder_path, SYS_FILENAME))
+
+    for flags in FLAG_SETS:
+        if not has_sys:
+            flags = flags + [NO_BOOTSTRAP]
+        with tempfile.TemporaryDirectory() as temp_path:
+            # the translator names the .asm file after the folder
+            test_path = os.path.join(temp_path,
+                                     os.path.basename(folder_path))
+            os.mkdir(test_path)
+            for filename in os.listdir(folder_path):
+                if os.path.splitext(filename)[1] in {
+                        VM_EXTENSION, SCRIPT_EXTENSION, COMPARE_EXTENSION}:
+                    shutil.copy(os.path.join(folder_path, filename),
+                                test_path)
+            try:
+                subprocess.run([sys.executable, TRANSLATOR, test_path] +
+                               flags, check=True, stdout=subprocess.DEVNULL)
+            except:
+                print("\n!!! Error while translating folder:", folder_path,
+                      *flags)
+                raise
+            for script in scripts:
+                counter += 1
+                this_true = run_script(os.path.join(test_path, script),
+                                       flags)
+                all_true = all_true and this_true
+
+    print(f"{counter} scripts run: Comparison is {all_true}")
+    return all_true
+
+
+def run_script(script_path, flags):
+    test_script = TestScript(script_path)
+    if not test_script.run():
+        print(f"\nDifference in script: {os.path.basename(script_path)} "
+              f"{' '.join(flags)} at line {test_script.failure_line}")
+        return False
+    return True
+
+
+if "__main__" == __name__:
+    # Parses the input path and translates and tests each test folder
+    if not len(sys.argv) == 3:
+        sys.exit("Invalid usage, please use: run_proj08_tests <d|f> "
+                 "<input path>")
+    assert sys.argv[1] in ['d', 'f']
+
+    argument_path = os.path.abspath(sys.argv[2])
+    assert os.path.isdir(argument_path)
+
+    if sys.argv[1] == 'f':
+        passed = run_files_in_folder(argument_path)
+    else:
+        passed = True
+        for dirpath in sorted(glob.glob(os.path.join(argument_path, '*'))):
+            if os.path.isdir(dirpath) and \
+                    os.path.basename(dirpath) not in ['.', '_']:
+                passed = run_files_in_folder(dirpath) and passed
+    sys.exit(0 if passed else 1)
@@ -5,30 +5,33 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
 import os
-import sys
 import typing
 from CompilationEngine import CompilationEngine
 from JackTokenizer import JackTokenizer
 from SymbolTable import SymbolTable
-from VMWriter import VMWriter
+from VMWriter import VMWriter, VMBytecode
 
 
 def compile_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+        input_file: typing.TextIO, output_file: typing.IO,
+        bytecode: bool = False) -> None:
     """Compiles a single file.
 
     Args:
         input_file (typing.TextIO): the file to compile.
-        output_file (typing.TextIO): writes all output to this file.
+        output_file (typing.IO): writes all output to this file, opened in
+            binary mode for bytecode.
+        bytecode (bool): if True, writes .vmb bytecode instead of .vm text.
     """
     tokenizer = JackTokenizer(input_file)
-    vm_writer = VMWriter(output_file)
+    vm_writer = VMWriter(output_file, bytecode)
     class_symbol_table = SymbolTable()
     engine = CompilationEngine(tokenizer, class_symbol_table, vm_writer, output_file)
     engine.compile_class()
 
-    output_file.close()
+    vm_writer.close()
 
 
 if "__main__" == __name__:
@@ -37,9 +40,14 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: JackCompiler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    arg_parser = argparse.ArgumentParser(
+        prog="JackCompiler", description="Compiles Jack code to VM code.")
+    arg_parser.add_argument("path", help="a .jack file or a directory")
+    arg_parser.add_argument(
+        "--bytecode", action="store_true",
+        help="write compact .vmb bytecode instead of .vm text")
+    args = arg_parser.parse_args()
+    argument_path = os.path.abspath(args.path)
     if os.path.isdir(argument_path):
         files_to_assemble = [
             os.path.join(argument_path, filename)
@@ -50,7 +58,10 @@ if "__main__" == __name__:
         filename, extension = os.path.splitext(input_path)
         if extension.lower() != ".jack":
             continue
-        output_path = filename + ".vm"
+        if args.bytecode:
+            output_path, output_mode = filename + VMBytecode.EXTENSION, 'wb'
+        else:
+            output_path, output_mode = filename + ".vm", 'w'
         with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            compile_file(input_file, output_file)
+                open(output_path, output_mode) as output_file:
+            compile_file(input_file, output_file, args.bytecode)
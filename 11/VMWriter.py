@@ -5,17 +5,35 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import os
+import sys
 import typing
 
+# the VM instruction records and the bytecode format (project 7)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "07"))
+from VMInstruction import Opcode, VMInstruction  # noqa: E402
+from VMBytecode import VMBytecode  # noqa: E402
+
 
 class VMWriter:
     """
     Writes VM commands into a file. Encapsulates the VM command syntax.
+    The commands are written as .vm text, or encoded as .vmb bytecode.
     """
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
-        """Creates a new file and prepares it for writing VM commands."""
+    def __init__(self, output_stream: typing.IO,
+                 bytecode: bool = False) -> None:
+        """Creates a new file and prepares it for writing VM commands.
+
+        Args:
+            output_stream (typing.IO): the output file, opened in binary
+                mode for bytecode.
+            bytecode (bool): if True, the commands are encoded as .vmb
+                bytecode, written when the writer is closed.
+        """
         self.output_file = output_stream
+        self.bytecode = VMBytecode() if bytecode else None
 
         self.segment_table = {"CONST": "constant", "ARG": "argument", "VAR": "local",
                               "STATIC": "static", "FIELD": "this", "THAT": "that",
@@ -29,6 +47,9 @@ class VMWriter:
             "LOCAL", "STATIC", "THIS", "THAT", "POINTER", "TEMP"
             index (int): the index to push to.
         """
+        if self.bytecode is not None:
+            self.__add(Opcode.PUSH, segment, index)
+            return
         self.output_file.write("""push {segment} {index}\n""".format(segment=self.segment_table[segment],
                                                                      index=index))
 
@@ -40,6 +61,9 @@ class VMWriter:
             "LOCAL", "STATIC", "THIS", "THAT", "POINTER", "TEMP".
             index (int): the index to pop from.
         """
+        if self.bytecode is not None:
+            self.__add(Opcode.POP, segment, index)
+            return
         self.output_file.write("""pop {segment} {index}\n""".format(segment=self.segment_table[segment],
                                                                     index=index))
 
@@ -51,7 +75,10 @@ class VMWriter:
             "EQ", "GT", "LT", "AND", "OR", "NOT", "SHIFTLEFT", "SHIFTRIGHT".
         """
         if command.split()[0] == "call":
-            self.output_file.write("""{command}\n""".format(command=command))
+            call, name, n_args = command.split()
+            self.write_call(name, int(n_args))
+        elif self.bytecode is not None:
+            self.__add(VMInstruction.opcodes[command.lower()])
         else:
             self.output_file.write("""{command}\n""".format(command=command.lower()))
 
@@ -61,6 +88,9 @@ class VMWriter:
         Args:
             label (str): the label to write.
         """
+        if self.bytecode is not None:
+            self.__add(Opcode.LABEL, name=label.upper())
+            return
         self.output_file.write("""label {label}\n""".format(label=label.upper()))
 
     def write_goto(self, label: str) -> None:
@@ -69,6 +99,9 @@ class VMWriter:
         Args:
             label (str): the label to go to.
         """
+        if self.bytecode is not None:
+            self.__add(Opcode.GOTO, name=label.upper())
+            return
         self.output_file.write("""goto {label}\n""".format(label=label.upper()))
 
     def write_if(self, label: str) -> None:
@@ -77,6 +110,9 @@ class VMWriter:
         Args:
             label (str): the label to go to.
         """
+        if self.bytecode is not None:
+            self.__add(Opcode.IF_GOTO, name=label.upper())
+            return
         self.output_file.write("""if-goto {label}\n""".format(label=label.upper()))
 
     def write_call(self, name: str, n_args: int) -> None:
@@ -86,6 +122,9 @@ class VMWriter:
             name (str): the name of the function to call.
             n_args (int): the number of arguments the function receives.
         """
+        if self.bytecode is not None:
+            self.__add(Opcode.CALL, arg=n_args, name=name)
+            return
         self.output_file.write("""call {name} {n_args}\n""".format(name=name, n_args=n_args))
 
     def write_function(self, name: str, n_locals: int) -> None:
@@ -95,11 +134,34 @@ class VMWriter:
             name (str): the name of the function.
             n_locals (int): the number of local variables the function uses.
         """
+        if self.bytecode is not None:
+            self.__add(Opcode.FUNCTION, arg=n_locals, name=name)
+            return
         self.output_file.write("""function {name} {n_locals}\n""".format(name=name, n_locals=n_locals))
 
     def write_return(self) -> None:
         """Writes a VM return command."""
+        if self.bytecode is not None:
+            self.__add(Opcode.RETURN)
+            return
         self.output_file.write("return\n")
 
+    def __add(self, opcode: Opcode, segment: typing.Optional[str] = None,
+              arg: typing.Optional[int] = None,
+              name: typing.Optional[str] = None) -> None:
+        """
+        encodes a command as bytecode
+        :param opcode: the command
+        :param segment: the segment of push and pop, as given to write_push
+        :param arg: the index, or the number of arguments or locals
+        :param name: the label or function name
+        """
+        if segment is not None:
+            segment = VMInstruction.segments[self.segment_table[segment]]
+        self.bytecode.add(VMInstruction(
+            opcode, segment, None if arg is None else int(arg), name))
+
     def close(self) -> None:
+        if self.bytecode is not None:
+            self.bytecode.write(self.output_file)
         self.output_file.close()